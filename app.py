@@ -1,19 +1,83 @@
-from flask import Flask, render_template, request, redirect, url_for
+import os
+import time
+from typing import Callable, Optional
 
-from application.models.base import Arena
-from application.models.classes import unit_classes
-from application.models.equipment import Equipment
-from application.models.unit import PlayerUnit, EnemyUnit
+from flask import Flask, request, redirect, url_for, session, abort, jsonify, g
+from flask import render_template as flask_render_template
+
+from application import metrics, streaming, views
+from application.game import battles, get_hero_choosing_page_context, get_matchups, load_shared_state
+from application.models.battle import Battle
+from application.pages import create_bytecode_cache, pages
+from application.streaming import BattleChannel, Subscription, format_event
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create application flask instance
+# Create application flask instance, the routes only adapt application.views to Flask
 app = Flask(__name__)
+app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(32)
+app.json.ensure_ascii = False
+app.jinja_options = {**app.jinja_options, "bytecode_cache": create_bytecode_cache()}
+app.jinja_env.globals["streaming"] = streaming.ENABLED
 
-# ----------------------------------------------------------------------------------------------------------------------
-# Create game settings
-heroes = {}
-arena = Arena()
-equipment = Equipment()
+
+def render_template(template_name: str, **context) -> str:
+    """
+    Render the template, timing it when metrics are enabled
+    """
+    with metrics.timer("template_render_duration_seconds", template=template_name):
+        return flask_render_template(template_name, **context)
+
+
+def render_cached_page(template_name: str, get_context: Callable[[], dict] = dict):
+    """
+    Render a page that is the same for every user once per catalog version and answer 304 if the browser has it
+    """
+    version, page = views.get_page(template_name)
+
+    if page is None:
+        page = pages.put(template_name, version, render_template(template_name, **get_context()))
+
+    return views.get_page_response(app.response_class, page, request.if_none_match)
+
+
+def preload() -> None:
+    """
+    Load everything requests read: the equipment catalog, the matchup table and the compiled templates.
+    The gunicorn master calls it once with preload_app, forked workers start with all of it in memory
+    """
+    load_shared_state()
+
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+
+
+if metrics.ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        views.observe_request(request.url_rule and request.url_rule.rule, request.method, g.get("request_started"))
+        return response
+
+
+@app.after_request
+def cache_built_assets(response):
+    """
+    Let browsers cache content-hashed assets forever
+    """
+    views.cache_built_assets(request.path, response)
+    return response
+
+
+def get_battle() -> Battle:
+    """
+    Get the battle of the current user session, creating a new one if needed
+
+    :return: Battle object
+    """
+    return battles.get(views.get_battle_id(session))
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -23,7 +87,31 @@ def menu_page():
     """
     Main start page
     """
-    return render_template("index.html")
+    return render_cached_page("index.html")
+
+
+@app.route("/metrics")
+def metrics_page():
+    """
+    Prometheus metrics aggregated across workers
+    """
+    return app.response_class(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/matchups")
+def matchups_page():
+    """
+    Expected damage per turn of every attacker and defender pairing, filtered by attacker, weapon, defender, armor
+    """
+    return jsonify(get_matchups(request.args))
+
+
+@app.route("/estimate")
+def estimate_page():
+    """
+    Win probability and expected battle length of two hero configurations
+    """
+    return jsonify(views.estimate(request.args))
 
 
 @app.route("/fight/")
@@ -31,47 +119,68 @@ def start_fight():
     """
     Arena start page
     """
-    arena.start_game(heroes.get("player"), heroes.get("enemy"))
+    heroes: Optional[dict] = views.start_fight(get_battle())
+
+    if heroes is None:
+        return redirect(url_for("choose_hero"))
+
     return render_template("fight.html", heroes=heroes)
 
 
-@app.route("/fight/hit")
-def hit():
+@app.route("/fight/<any('hit', 'use-skill', 'pass-turn'):action>")
+def fight_turn(action: str):
     """
-    Hit button with game logic
+    Hit, skill and pass turn buttons with game logic
     """
-    if arena.game_is_running:
-        result: str = arena.player_hit()
-    else:
-        result: str = arena.battle_result
-
-    return render_template('fight.html', heroes=heroes, result=result)
+    heroes, result = views.play_turn(get_battle(), action)
+    return render_template("fight.html", heroes=heroes, result=result)
 
 
-@app.route("/fight/use-skill")
-def use_skill():
+@app.route("/fight/api/<action>", methods=["POST"])
+def fight_api(action: str):
     """
-    Skills button with game logic
+    Perform a turn and return only the changed part of the fight page as JSON
     """
-    if arena.game_is_running:
-        result: str = arena.player_use_skill()
-    else:
-        result: str = arena.battle_result
+    return jsonify(views.play_api_turn(get_battle(), action))
 
-    return render_template('fight.html', heroes=heroes, result=result)
+
+@app.route("/fight/auto", methods=["POST"])
+def auto_fight():
+    """
+    Play the battle to the end with a player policy and return the final state and the compressed replay log
+    """
+    return jsonify(views.auto_fight(get_battle(), request.values))
 
 
-@app.route("/fight/pass-turn")
-def pass_turn():
+@app.route("/fight/events")
+def fight_events():
     """
-    Pass turn button with game logic
+    Stream turn events of the current battle as server-sent events, if the workers can hold open streams
     """
-    if arena.game_is_running:
-        result: str = arena.next_turn()
-    else:
-        result: str = arena.battle_result
+    if not streaming.ENABLED:
+        abort(404)
+
+    subscription: Subscription = Subscription()
+    channel: BattleChannel = views.subscribe(get_battle(), subscription)
+
+    def stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                yield format_event(subscription.get())
+        finally:
+            channel.unsubscribe(subscription)
 
-    return render_template('fight.html', heroes=heroes, result=result)
+    return app.response_class(stream(), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/fight/log")
+def fight_log():
+    """
+    Replay log of the current battle
+    """
+    return app.response_class(views.get_log(get_battle()), mimetype="application/json")
 
 
 @app.route("/fight/end-fight")
@@ -79,7 +188,8 @@ def end_fight():
     """
     End game button with game logic
     """
-    return render_template("index.html", heroes=heroes)
+    views.end_fight(session)
+    return render_cached_page("index.html")
 
 
 @app.route("/choose-hero/", methods=['POST', 'GET'])
@@ -88,59 +198,71 @@ def choose_hero():
     Start screen with player creation
     """
     if request.method == "GET":
-        result: dict = {"header": "Кто ты?",
-                        "classes": unit_classes.keys(),
-                        "weapons": equipment.get_weapons_names(),
-                        "armors": equipment.get_armors_names()
-                        }
+        return render_cached_page("hero_choosing.html", get_hero_choosing_page_context)
 
-        return render_template("hero_choosing.html", result=result)
+    views.set_hero(get_battle(), "player", views.create_hero("player", request.form))
+    return redirect(url_for("choose_enemy"), 301)
 
-    if request.method == "POST":
-        hero: dict = {
-            "name": request.form.get("name"),
-            "unit_class": unit_classes.get(request.form.get("unit_class"))
-        }
 
-        player: PlayerUnit = PlayerUnit(**hero)
-        player.equip_weapon(equipment.get_weapon(request.form.get("weapon")))
-        player.equip_armor(equipment.get_armor(request.form.get("armor")))
+@app.route("/choose-enemy/", methods=['POST', 'GET'])
+def choose_enemy():
+    """
+    Start screen with enemy creation
+    """
+    if request.method == "GET":
+        return render_cached_page("hero_choosing.html", get_hero_choosing_page_context)
+
+    views.set_hero(get_battle(), "enemy", views.create_hero("enemy", request.form))
+    return redirect(url_for("start_fight"), 301)
 
-        heroes["player"] = player
 
-        return redirect(url_for("choose_enemy"), 301)
+# ----------------------------------------------------------------------------------------------------------------------
+# Create routes for player-versus-player battles
+@app.route("/pvp/queue", methods=["POST"])
+def join_pvp_queue():
+    """
+    Put the hero chosen on /choose-hero/ into the matchmaking queue
+    """
+    return jsonify(views.join_pvp_queue(session, get_battle()))
 
 
-@app.route("/choose-enemy/", methods=['post', 'get'])
-def choose_enemy():
+@app.route("/pvp/queue")
+def poll_pvp_queue():
     """
-    Start screen with enemy creation
+    Matchmaking status, pairs the player if an opponent is found
     """
-    if request.method == "GET":
-        result: dict = {"header": "Кто ты?",
-                        "classes": unit_classes.keys(),
-                        "weapons": equipment.get_weapons_names(),
-                        "armors": equipment.get_armors_names()
-                        }
+    return jsonify(views.poll_pvp_queue(session))
 
-        return render_template("hero_choosing.html", result=result)
 
-    if request.method == "POST":
-        hero: dict = {
-            "name": request.form.get("name"),
-            "unit_class": unit_classes.get(request.form.get("unit_class"))
-        }
+@app.route("/pvp/queue", methods=["DELETE"])
+def leave_pvp_queue():
+    """
+    Leave the queue, or the duel, which the opponent then wins
+    """
+    views.leave_pvp_queue(session)
+    return "", 204
 
-        player = EnemyUnit(**hero)
-        player.equip_weapon(equipment.get_weapon(request.form.get("weapon")))
-        player.equip_armor(equipment.get_armor(request.form.get("armor")))
 
-        heroes["enemy"] = player
+@app.route("/pvp/duel/<action>", methods=["POST"])
+def pvp_turn(action: str):
+    """
+    Perform the turn of the player in the duel
+    """
+    return jsonify(views.play_pvp_turn(session, action))
 
-        return redirect(url_for("start_fight"), 301)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create CLI commands
+@app.cli.command("compile-templates")
+def compile_templates():
+    """
+    Compile every template into the bytecode cache, so workers start without compiling them
+    """
+    preload()
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Run game
 if __name__ == "__main__":
+    preload()
     app.run()
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Deque, IO, List, Optional, Tuple
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Battle event export settings, the export is off unless a folder is given
+EVENTS_DIR: Optional[str] = os.environ.get("BATTLE_EVENTS_DIR")
+BUFFER_SIZE: int = int(os.environ.get("BATTLE_EVENTS_BUFFER_SIZE", 256))
+FLUSH_INTERVAL: float = float(os.environ.get("BATTLE_EVENTS_FLUSH_INTERVAL", 1.0))
+MAX_FILE_BYTES: int = int(os.environ.get("BATTLE_EVENTS_MAX_FILE_BYTES", 64 * 1024 * 1024))
+MAX_FILE_AGE: float = float(os.environ.get("BATTLE_EVENTS_MAX_FILE_AGE", 300))
+
+# The file being written has this suffix, it is renamed to .jsonl when rotated, so readers only see complete files
+OPEN_SUFFIX: str = ".part"
+
+# Event sequence number, wall clock time and the event sent by the arena
+Entry = Tuple[int, float, dict]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create event buffer class
+class EventBuffer:
+    """
+    Bounded ring buffer of the turn events of one battle. Recording an event only appends it under a short lock,
+    the oldest events are overwritten if the writer falls behind and are counted as dropped
+    """
+    __slots__ = ("battle_id", "_exporter", "_events", "_sequence", "_exported", "_scheduled", "_lock")
+
+    def __init__(self, battle_id: str, exporter: EventExporter, size: int = BUFFER_SIZE):
+        """
+        Initialize empty buffer
+
+        :param battle_id: Exported id of the battle
+        :param exporter: Exporter writing the events
+        :param size: Maximum number of events kept
+        """
+        self.battle_id: str = battle_id
+        self._exporter: EventExporter = exporter
+        self._events: Deque[Entry] = deque(maxlen=size)
+        self._sequence: int = 0
+        self._exported: int = 0
+        self._scheduled: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def record(self, event: dict) -> None:
+        """
+        Arena listener, keep the event and schedule the buffer for the next export
+
+        :param event: Turn event
+        :return: None
+        """
+        with self._lock:
+            self._sequence += 1
+            self._events.append((self._sequence, time.time(), event))
+            schedule: bool = not self._scheduled
+            self._scheduled = True
+
+        if schedule:
+            self._exporter.schedule(self)
+
+    def drain(self) -> Tuple[List[Entry], int]:
+        """
+        Take the events recorded since the last export
+
+        :return: Events in order and the number of events overwritten before they were exported
+        """
+        with self._lock:
+            pending: int = self._sequence - self._exported
+            events: List[Entry] = list(self._events)[-pending:] if pending else []
+            self._exported = self._sequence
+            self._scheduled = False
+
+        return events, pending - len(events)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create event exporter class
+class EventExporter:
+    """
+    Background writer of battle events. Buffers with new events are queued without blocking, a daemon thread
+    drains them in batches and appends the events as JSON lines to a file of this process. The file is rotated
+    when it grows over the size limit or gets older than the age limit
+    """
+
+    def __init__(self, directory: str, flush_interval: float = FLUSH_INTERVAL, max_file_bytes: int = MAX_FILE_BYTES,
+                 max_file_age: float = MAX_FILE_AGE):
+        """
+        Initialize exporter, the folder is created and the first file opened on the first flush
+
+        :param directory: Folder of the event files
+        :param flush_interval: Seconds between the exports
+        :param max_file_bytes: Size after which the file is rotated
+        :param max_file_age: Seconds after which the file is rotated
+        """
+        self.directory: str = directory
+        self.flush_interval: float = flush_interval
+        self.max_file_bytes: int = max_file_bytes
+        self.max_file_age: float = max_file_age
+        self.exported: int = 0
+        self.dropped: int = 0
+        self._queue: queue.SimpleQueue[EventBuffer] = queue.SimpleQueue()
+        self._file: Optional[IO[str]] = None
+        self._file_pid: int = 0
+        self._file_opened: float = 0.0
+        self._files: int = 0
+        self._flush_lock: threading.Lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
+    def create_buffer(self, battle_id: str) -> EventBuffer:
+        """
+        Create the event buffer of a battle. Battle ids are session secrets, so the files get their hash
+
+        :param battle_id: Battle id stored in the user session
+        :return: Event buffer
+        """
+        return EventBuffer(hashlib.blake2b(battle_id.encode(), digest_size=8).hexdigest(), self)
+
+    def schedule(self, buffer: EventBuffer) -> None:
+        self._queue.put_nowait(buffer)
+
+    def start(self) -> None:
+        """
+        Start the writer thread, threads do not survive fork, so it is started again in every worker
+
+        :return: None
+        """
+        if self._writer is not None and self._writer.is_alive():
+            return
+
+        self._writer = threading.Thread(target=self._flush_forever, name="battle-events-writer", daemon=True)
+        self._writer.start()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Failed to export battle events")
+
+    def flush(self) -> int:
+        """
+        Write the events of all scheduled buffers in one batch
+
+        :return: Number of written events
+        """
+        with self._flush_lock:
+            lines: List[str] = []
+            while True:
+                try:
+                    buffer: EventBuffer = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                events, dropped = buffer.drain()
+                self.dropped += dropped
+                for sequence, timestamp, event in events:
+                    record: dict = {"battle": buffer.battle_id, "seq": sequence, "time": round(timestamp, 3)}
+                    record.update((key, value) for key, value in event.items() if key != "text")
+                    lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+
+            if self._file is not None and self._is_full():
+                self._rotate()
+
+            if lines:
+                self._get_file().write("\n".join(lines) + "\n")
+                self._file.flush()
+                self.exported += len(lines)
+
+            return len(lines)
+
+    def close(self) -> None:
+        """
+        Write the pending events and rotate the open file, called at exit
+
+        :return: None
+        """
+        self.flush()
+        with self._flush_lock:
+            self._rotate()
+
+    def _get_file(self) -> IO[str]:
+        """
+        Get the file of this process, opening a new one if needed. Files are named by the opening time, the pid
+        and a counter, so every worker writes its own files. Must be called with the flush lock
+
+        :return: Open event file
+        """
+        if self._file is None or self._file_pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            self._files += 1
+            name: str = (f"battle-events-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}"
+                         f"-{self._files}.jsonl")
+            self._file = open(os.path.join(self.directory, name + OPEN_SUFFIX), "a", encoding="utf-8")
+            self._file_pid = os.getpid()
+            self._file_opened = time.monotonic()
+
+        return self._file
+
+    def _is_full(self) -> bool:
+        return self._file.tell() >= self.max_file_bytes or time.monotonic() - self._file_opened >= self.max_file_age
+
+    def _rotate(self) -> None:
+        """
+        Close the file of this process and give it its final name. Must be called with the flush lock
+
+        :return: None
+        """
+        if self._file is None or self._file_pid != os.getpid():
+            return
+
+        self._file.close()
+        os.replace(self._file.name, self._file.name[:-len(OPEN_SUFFIX)])
+        self._file = None
+
+
+def create_exporter(directory: Optional[str]) -> Optional[EventExporter]:
+    """
+    Create the battle event exporter
+
+    :param directory: Folder of the event files, the export is off if not given
+    :return: EventExporter or None
+    """
+    return EventExporter(directory) if directory else None
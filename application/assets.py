@@ -0,0 +1,101 @@
+import hashlib
+import io
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Asset settings
+STATIC_PATH: Path = Path(__file__).resolve().parent.parent / "static"
+BUILD_DIR: str = "build"
+MANIFEST_PATH: Path = STATIC_PATH / BUILD_DIR / "manifest.json"
+STATIC_URL: str = "/static/"
+
+PORTRAITS: tuple = ("warrior.png", "assassin.png", "mage.png")
+PORTRAIT_SIZE: tuple = (256, 256)
+IMAGE_FORMATS: Dict[str, dict] = {
+    "avif": {"format": "AVIF", "quality": 50},
+    "webp": {"format": "WEBP", "quality": 80, "method": 6}
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Resolve assets through the manifest
+@lru_cache(maxsize=None)
+def get_manifest() -> Dict[str, Dict[str, str]]:
+    """
+    Load the asset manifest written by the build step
+
+    :return: Dict of original file names to their built variants by format, empty if assets were not built
+    """
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+def get_asset_variant(name: str, image_format: str) -> Optional[str]:
+    """
+    Get the URL of a built asset variant
+
+    :param name: Original file name in the static folder
+    :param image_format: Format of the variant
+    :return: URL of the variant or None if it was not built
+    """
+    variant: Optional[str] = get_manifest().get(name, {}).get(image_format)
+    return STATIC_URL + variant if variant else None
+
+
+def asset_url(name: str) -> str:
+    """
+    Get the URL of the WebP variant of an asset, falling back to the original file if assets were not built
+
+    :param name: Original file name in the static folder
+    :return: Asset URL
+    """
+    return get_asset_variant(name, "webp") or STATIC_URL + name
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Build assets
+def build(static_path: Path = STATIC_PATH) -> Dict[str, Dict[str, str]]:
+    """
+    Resize portraits, encode them in every supported format under content-hashed names and write the manifest
+
+    :param static_path: Static folder
+    :return: Manifest
+    """
+    from PIL import Image, features
+
+    build_path: Path = static_path / BUILD_DIR
+    build_path.mkdir(exist_ok=True)
+    manifest: Dict[str, Dict[str, str]] = {}
+
+    for name in PORTRAITS:
+        with Image.open(static_path / name) as image:
+            portrait = image.convert("RGB").resize(PORTRAIT_SIZE, Image.LANCZOS)
+
+        manifest[name] = {}
+        for extension, options in IMAGE_FORMATS.items():
+            if not features.check(extension):
+                continue
+
+            buffer: io.BytesIO = io.BytesIO()
+            portrait.save(buffer, **options)
+            content: bytes = buffer.getvalue()
+
+            file_name: str = f"{Path(name).stem}.{hashlib.sha256(content).hexdigest()[:10]}.{extension}"
+            (build_path / file_name).write_bytes(content)
+            manifest[name][extension] = f"{BUILD_DIR}/{file_name}"
+
+    with open(build_path / "manifest.json", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    return manifest
+
+
+if __name__ == "__main__":
+    for original, built in build().items():
+        print(original, built)
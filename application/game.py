@@ -0,0 +1,272 @@
+import os
+import time
+from typing import Mapping, Optional, Type
+from uuid import uuid4
+
+from application import analytics, metrics
+from application.matchmaking import Matchmaker, Ticket
+from application.models.base import Arena
+from application.models.battle import Battle, BattleRegistry
+from application.models.classes import UnitClass, unit_classes
+from application.models.duel import Duel, ROLES
+from application.models.equipment import Equipment, EquipmentCatalog
+from application.models.matchups import MatchupTable, get_matchup_table
+from application.models.policies import default_player_policy, get_player_policy, get_policy
+from application.models.replay import DEFAULT_POLICY
+from application.models.unit import BaseUnit, PlayerUnit, EnemyUnit
+from application.simulation.engine import Build
+from application.simulation.estimator import Estimate, estimate
+from application.storage import create_store
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create game settings shared by the WSGI and ASGI applications
+battle_ttl: float = float(os.environ.get("BATTLE_TTL", 1800))
+equipment_reload_interval: float = float(os.environ.get("EQUIPMENT_RELOAD_INTERVAL", 2))
+
+# Threads do not survive fork, a preloading gunicorn master sets 0 and starts them in every worker after forking
+START_BACKGROUND_TASKS: bool = os.environ.get("START_BACKGROUND_TASKS", "1") != "0"
+
+# The catalog is loaded on first use or by load_shared_state, importing the game does not read any file
+equipment: Equipment = Equipment(lazy=True)
+battles: BattleRegistry = BattleRegistry(ttl=battle_ttl,
+                                         max_battles=int(os.environ.get("MAX_BATTLES", 10000)),
+                                         store=create_store(os.environ.get("BATTLE_STORE_PATH"), battle_ttl),
+                                         equipment=equipment,
+                                         events=analytics.create_exporter(analytics.EVENTS_DIR))
+
+# Build the matchup table again on every catalog reload, so requests never build it
+equipment.add_reload_listener(get_matchup_table)
+
+
+def load_shared_state() -> None:
+    """
+    Load the equipment catalog and build the matchup table. Called once in the gunicorn master with preload_app,
+    so forked workers inherit both copy-on-write instead of loading them in every worker
+
+    :return: None
+    """
+    get_matchup_table(equipment.catalog)
+
+
+def start_background_tasks() -> None:
+    """
+    Start the equipment watcher, the battle store writer, the battle event writer and the metrics flusher
+    of this process.
+    Every task is started once per process, so calling it again after fork starts the tasks of the worker
+
+    :return: None
+    """
+    if equipment_reload_interval > 0:
+        equipment.start_watching(equipment_reload_interval)
+
+    battles.store.start()
+
+    if battles.events is not None:
+        battles.events.start()
+
+    if metrics.ENABLED:
+        metrics.registry.start_flushing()
+
+
+def configure_workers(workers: int) -> None:
+    """
+    Adapt the process to the number of workers serving the application, called in every forked worker
+
+    :param workers: Number of worker processes
+    :return: None
+    """
+    global matchmaking_enabled
+
+    matchmaking_enabled = workers == 1
+
+
+def start_duel(first: Ticket, second: Ticket) -> Duel:
+    """
+    Start the duel of two paired players, the one who waited longer moves first
+
+    :param first: Ticket that waited longer
+    :param second: Other ticket
+    :return: Duel
+    """
+    first.role, second.role = ROLES
+    return Duel(first.unit, second.unit)
+
+
+def is_duel_running(duel: Duel) -> bool:
+    """
+    Check that the duel is not over, the matchmaker keeps both tickets alive while it runs
+
+    :param duel: Duel of the paired players
+    :return: True if the duel is running
+    """
+    return duel.is_running
+
+
+# The queue lives in the memory of one process, it is turned off when gunicorn forks several workers,
+# since the requests of a player would reach workers that do not know the ticket
+matchmaker: Matchmaker = Matchmaker(start_duel, ttl=battle_ttl, is_running=is_duel_running)
+matchmaking_enabled: bool = True
+
+if START_BACKGROUND_TASKS:
+    start_background_tasks()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create game helpers
+def get_hero_choosing_context() -> dict:
+    """
+    Get the context of the hero choosing page
+
+    :return: Header, class names, weapon names and armor names
+    """
+    catalog: EquipmentCatalog = equipment.catalog
+
+    return {"header": "Кто ты?",
+            "classes": unit_classes.keys(),
+            "weapons": catalog.get_weapons_names(),
+            "armors": catalog.get_armors_names()
+            }
+
+
+def get_hero_choosing_page_context() -> dict:
+    """
+    Get the template context of the hero choosing page
+
+    :return: Context with the page data as result
+    """
+    return {"result": get_hero_choosing_context()}
+
+
+def create_unit(unit_type: Type[BaseUnit], form: Mapping[str, str]) -> BaseUnit:
+    """
+    Create an equipped unit from the hero choosing form
+
+    :param unit_type: PlayerUnit or EnemyUnit
+    :param form: Submitted form with name, unit_class, weapon and armor
+    :return: Unit instance
+    """
+    build: Build = get_build(form)
+    unit: BaseUnit = unit_type(name=form.get("name"), unit_class=build.unit_class)
+    unit.equip_weapon(build.weapon)
+    unit.equip_armor(build.armor)
+
+    return unit
+
+
+def create_enemy(form: Mapping[str, str]) -> EnemyUnit:
+    """
+    Create an equipped enemy from the enemy choosing form
+
+    :param form: Submitted form with name, unit_class, weapon, armor and optional policy:
+    random, greedy, expectimax or lookup
+    :return: Enemy unit
+    """
+    enemy: EnemyUnit = create_unit(EnemyUnit, form)
+    enemy.policy = get_policy(form.get("policy") or DEFAULT_POLICY)
+
+    return enemy
+
+
+def auto_battle(battle: Battle, form: Mapping[str, str]) -> dict:
+    """
+    Play the battle of the session to the end on the server
+
+    :param battle: Battle with both heroes chosen
+    :param form: Form or query with optional policy: hit, skill or conserve
+    :return: Final state with the battle result and the compressed replay log
+    """
+    return battle.auto_play(get_player_policy(form.get("policy") or default_player_policy.name))
+
+
+def get_build(form: Mapping[str, str]) -> Build:
+    """
+    Get the hero configuration from the hero choosing form
+
+    :param form: Form with unit_class, weapon and armor
+    :return: Build
+    """
+    unit_class: UnitClass = unit_classes.get(form.get("unit_class"))
+
+    if unit_class is None:
+        raise ValueError("Unknown unit class")
+
+    catalog: EquipmentCatalog = equipment.catalog
+    return Build(unit_class=unit_class, weapon=catalog.get_weapon(form.get("weapon")),
+                 armor=catalog.get_armor(form.get("armor")))
+
+
+def get_estimate(query: Mapping[str, str]) -> dict:
+    """
+    Estimate the outcome of a battle between two hero configurations
+
+    :param query: Query arguments player_class, player_weapon, player_armor, enemy_class, enemy_weapon, enemy_armor
+    :return: Win probability, expected battle length and the estimation method
+    """
+    player, enemy = (get_build({"unit_class": query.get(f"{role}_class"),
+                                "weapon": query.get(f"{role}_weapon"),
+                                "armor": query.get(f"{role}_armor")}) for role in ("player", "enemy"))
+    result: Estimate = estimate(player, enemy)
+
+    return result.to_dict()
+
+
+def get_matchups(query: Mapping[str, str]) -> dict:
+    """
+    Get the matchups of the current catalog filtered by the query
+
+    :param query: Query arguments attacker, weapon, defender and armor, a missing one matches everything
+    :return: Catalog version and matchups with expected damage per turn
+    """
+    table: MatchupTable = get_matchup_table(equipment.catalog)
+
+    return {"version": table.version,
+            "matchups": [matchup.to_dict() for matchup in table.find(attacker=query.get("attacker"),
+                                                                     weapon=query.get("weapon"),
+                                                                     defender=query.get("defender"),
+                                                                     armor=query.get("armor"))]}
+
+
+def join_queue(unit: BaseUnit) -> Ticket:
+    """
+    Put a copy of the player unit into the matchmaking queue, rated by its class and equipment
+
+    :param unit: Unit chosen on the hero choosing page
+    :return: Ticket
+    """
+    catalog: EquipmentCatalog = equipment.catalog
+    rating: int = get_matchup_table(catalog).get_rating(unit.unit_class, unit.weapon, unit.armor)
+    duel_unit: BaseUnit = Arena.create_unit(PlayerUnit, Arena.get_unit_config(unit), catalog)
+
+    return matchmaker.join(Ticket(id=uuid4().hex, rating=rating, unit=duel_unit))
+
+
+def leave_queue(ticket_id: str) -> None:
+    """
+    Take the player out of the queue, a player leaving a running duel forfeits it
+
+    :param ticket_id: Ticket id
+    :return: None
+    """
+    ticket: Optional[Ticket] = matchmaker.leave(ticket_id)
+
+    if ticket is not None and ticket.match is not None:
+        with ticket.match.lock:
+            ticket.match.forfeit(ticket.role)
+
+
+def get_ticket_state(ticket: Ticket) -> dict:
+    """
+    Get the matchmaking status of the player
+
+    :param ticket: Ticket
+    :return: Status, rating, waiting time and the duel as seen by the player once matched
+    """
+    state: dict = {"status": "waiting" if ticket.match is None else "matched",
+                   "rating": ticket.rating,
+                   "waited": round(time.monotonic() - ticket.queued_at, 1)}
+
+    if ticket.match is not None:
+        with ticket.match.lock:
+            state["duel"] = ticket.match.get_state(ticket.role)
+
+    return state
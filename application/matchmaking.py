@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Matchmaking settings
+BUCKET_WIDTH: int = int(os.environ.get("MATCHMAKING_BUCKET_WIDTH", 50))
+
+# Every WIDEN_INTERVAL seconds of waiting a player accepts opponents one more bucket away, up to MAX_RADIUS buckets
+WIDEN_INTERVAL: float = float(os.environ.get("MATCHMAKING_WIDEN_INTERVAL", 5))
+MAX_RADIUS: int = int(os.environ.get("MATCHMAKING_MAX_RADIUS", 10))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create ticket dataclass
+@dataclass(slots=True, eq=False)
+class Ticket:
+    """
+    Class representing a player in the matchmaking queue \n
+    id: Ticket id stored in the user session \n
+    rating: Rating of the player build \n
+    unit: Unit the player fights with \n
+    queued_at: Monotonic time the player joined the queue \n
+    last_seen: Monotonic time of the last request of the player, or of the opponent during a running match \n
+    match: Match object created when the player is paired \n
+    role: Role of the player in the match \n
+    opponent: Ticket of the opponent once paired
+    """
+    id: str
+    rating: int
+    unit: Any
+    queued_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+    match: Any = None
+    role: Optional[str] = None
+    opponent: Optional[Ticket] = field(default=None, repr=False)
+
+    @property
+    def bucket(self) -> int:
+        return self.rating // BUCKET_WIDTH
+
+    def get_radius(self, now: float) -> int:
+        """
+        Get the number of buckets around its own one the player accepts opponents from
+
+        :param now: Current monotonic time
+        :return: Radius in buckets
+        """
+        return min(1 + int((now - self.queued_at) / WIDEN_INTERVAL), MAX_RADIUS)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create matchmaker class
+class Matchmaker:
+    """
+    Queue of players paired by rating. Waiting tickets are indexed by rating bucket, every bucket is a FIFO,
+    so joining, leaving and finding an opponent take time proportional to the search radius, not the queue length.
+    The queue lives in the memory of the process, every request of a player must reach the same process
+    """
+
+    def __init__(self, start_match: Callable[[Ticket, Ticket], Any], ttl: float = 1800.0,
+                 is_running: Callable[[Any], bool] = lambda match: False):
+        """
+        Initialize empty queue
+
+        :param start_match: Function creating the match of two paired tickets, the first one waited longer
+        :param ttl: Seconds without requests after which tickets are forgotten, waiting or matched
+        :param is_running: Function telling if a match is still played, a request of one player
+        keeps both tickets of a running match
+        """
+        self.start_match: Callable[[Ticket, Ticket], Any] = start_match
+        self.ttl: float = ttl
+        self.is_running: Callable[[Any], bool] = is_running
+        self._buckets: Dict[int, OrderedDict[str, Ticket]] = {}
+        # All tickets in the order of their last request, and the waiting ones in joining order
+        self._tickets: OrderedDict[str, Ticket] = OrderedDict()
+        self._waiting: OrderedDict[str, Ticket] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+    def join(self, ticket: Ticket) -> Ticket:
+        """
+        Add the player to the queue, pairing it at once if an opponent is waiting
+
+        :param ticket: New ticket
+        :return: The same ticket, with the match set if it was paired
+        """
+        with self._lock:
+            now: float = ticket.queued_at
+            ticket.last_seen = now
+            self._expire(now)
+            self._tickets[ticket.id] = ticket
+
+            opponent: Optional[Ticket] = self._find_opponent(ticket, now)
+            if opponent is None:
+                self._buckets.setdefault(ticket.bucket, OrderedDict())[ticket.id] = ticket
+                self._waiting[ticket.id] = ticket
+            else:
+                self._pair(opponent, ticket)
+
+        return ticket
+
+    def poll(self, ticket_id: str) -> Optional[Ticket]:
+        """
+        Get the ticket of a player request, trying to pair it again with the search radius widened
+        by its waiting time
+
+        :param ticket_id: Ticket id
+        :return: Ticket or None if it is unknown or expired
+        """
+        with self._lock:
+            now: float = time.monotonic()
+            self._expire(now)
+            ticket: Optional[Ticket] = self._tickets.get(ticket_id)
+
+            if ticket is not None:
+                self._touch(ticket, now)
+
+            if ticket is not None and ticket.match is None:
+                opponent: Optional[Ticket] = self._find_opponent(ticket, now)
+                if opponent is not None:
+                    first, second = (opponent, ticket) if opponent.queued_at <= ticket.queued_at \
+                        else (ticket, opponent)
+                    self._pair(first, second)
+
+        return ticket
+
+    def leave(self, ticket_id: str) -> Optional[Ticket]:
+        """
+        Remove the ticket from the queue
+
+        :param ticket_id: Ticket id
+        :return: Removed ticket or None if it is unknown
+        """
+        with self._lock:
+            ticket: Optional[Ticket] = self._tickets.pop(ticket_id, None)
+            if ticket is not None and ticket.match is None:
+                self._remove_waiting(ticket)
+
+        return ticket
+
+    def _find_opponent(self, ticket: Ticket, now: float) -> Optional[Ticket]:
+        """
+        Find the longest waiting opponent in the nearest bucket both players accept, without removing it.
+        Buckets further than both the own radius and the radius of the oldest ticket are never searched
+
+        :param ticket: Ticket looking for an opponent
+        :param now: Current monotonic time
+        :return: Opponent or None
+        """
+        own_radius: int = ticket.get_radius(now)
+        oldest: Ticket = next(iter(self._waiting.values()), ticket)
+        limit: int = max(own_radius, oldest.get_radius(now))
+
+        for distance in range(limit + 1):
+            for bucket_index in {ticket.bucket - distance, ticket.bucket + distance}:
+                bucket: Optional[OrderedDict[str, Ticket]] = self._buckets.get(bucket_index)
+                if not bucket:
+                    continue
+                for opponent in bucket.values():
+                    if opponent is ticket:
+                        continue
+                    if distance <= max(own_radius, opponent.get_radius(now)):
+                        return opponent
+                    # The rest of the bucket joined later and accepts a smaller radius
+                    break
+
+        return None
+
+    def _pair(self, first: Ticket, second: Ticket) -> None:
+        """
+        Take both tickets out of the buckets and start their match
+
+        :param first: Ticket that waited longer, it moves first
+        :param second: Other ticket
+        :return: None
+        """
+        self._remove_waiting(first)
+        self._remove_waiting(second)
+        first.match = second.match = self.start_match(first, second)
+        first.opponent, second.opponent = second, first
+
+    def _touch(self, ticket: Ticket, now: float) -> None:
+        """
+        Mark the ticket as active, and its opponent too while their match is running,
+        so a player waiting for the turn of the other one never loses the match
+
+        :param ticket: Ticket of the requesting player
+        :param now: Current monotonic time
+        :return: None
+        """
+        ticket.last_seen = now
+        self._tickets.move_to_end(ticket.id)
+
+        opponent: Optional[Ticket] = ticket.opponent
+        if opponent is not None and opponent.id in self._tickets and self.is_running(ticket.match):
+            opponent.last_seen = now
+            self._tickets.move_to_end(opponent.id)
+
+    def _remove_waiting(self, ticket: Ticket) -> None:
+        self._waiting.pop(ticket.id, None)
+        bucket: Optional[OrderedDict[str, Ticket]] = self._buckets.get(ticket.bucket)
+
+        if bucket is not None and bucket.pop(ticket.id, None) is not None and not bucket:
+            del self._buckets[ticket.bucket]
+
+    def _expire(self, now: float) -> None:
+        """
+        Forget tickets without requests for longer than the TTL. Tickets are kept in the order of their last request,
+        so only the head is inspected
+
+        :param now: Current monotonic time
+        :return: None
+        """
+        while self._tickets:
+            ticket: Ticket = next(iter(self._tickets.values()))
+            if now - ticket.last_seen <= self.ttl:
+                break
+            del self._tickets[ticket.id]
+            if ticket.match is None:
+                self._remove_waiting(ticket)
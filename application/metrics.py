@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import atexit
+import bisect
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics settings
+ENABLED: bool = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Folder shared by gunicorn workers, every worker writes its metrics there so that /metrics can aggregate them
+METRICS_DIR: Optional[str] = os.environ.get("METRICS_DIR")
+FLUSH_INTERVAL: float = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+# Every worker process writes its own file, the totals of exited workers are added up in the archive
+WORKER_FILE_PATTERN: str = "worker_*.json"
+ARCHIVE_FILE: str = "archive.json"
+
+BUCKETS: Tuple[float, ...] = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                              0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP: Dict[str, str] = {
+    "http_request_duration_seconds": "Latency of Flask routes",
+    "arena_phase_duration_seconds": "Duration of Arena combat phases",
+    "template_render_duration_seconds": "Duration of Jinja template rendering"
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create histogram class
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets
+    """
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Record a value
+
+        :param value: Duration in seconds
+        :return: None
+        """
+        index: int = bisect.bisect_left(BUCKETS, value)
+
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create registry class
+class MetricsRegistry:
+    """
+    Process-wide store of histograms keyed by metric name and labels
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._path: Optional[str] = None
+        self._path_pid: int = 0
+        self._flush_lock: threading.Lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        """
+        Get or create the histogram for the metric name and labels
+
+        :param name: Metric name
+        :param labels: Metric labels
+        :return: Histogram
+        """
+        key: Tuple[str, Labels] = (name, tuple(sorted(labels.items())))
+        histogram: Optional[Histogram] = self._histograms.get(key)
+
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+
+        return histogram
+
+    def snapshot(self) -> List[dict]:
+        """
+        Get the current values of all histograms of this process
+
+        :return: List of metrics with names and labels
+        """
+        return [{"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in list(self._histograms.items())]
+
+    def flush(self) -> None:
+        """
+        Write the snapshot of this process to METRICS_DIR
+
+        :return: None
+        """
+        if not METRICS_DIR:
+            return
+
+        with self._flush_lock:
+            _write_json(self._get_path(), self.snapshot())
+
+    def _get_path(self) -> str:
+        """
+        Get the file of this process. The name has the start time of the process besides the pid,
+        so a new worker reusing the pid of an exited one never overwrites its totals
+
+        :return: Path of the metrics file
+        """
+        if self._path is None or self._path_pid != os.getpid():
+            self._path_pid = os.getpid()
+            self._path = os.path.join(METRICS_DIR, f"worker_{self._path_pid}_{time.time_ns()}.json")
+
+        return self._path
+
+    def start_flushing(self) -> None:
+        """
+        Start a daemon thread writing the snapshot every FLUSH_INTERVAL seconds, must be called in every worker
+
+        :return: None
+        """
+        if not METRICS_DIR or (self._flusher is not None and self._flusher.is_alive()):
+            return
+
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def collect(self) -> List[dict]:
+        """
+        Get metrics of all workers, the live ones from their files and the exited ones from the archive.
+        The worker files are read before the archive, and a worker the archive lists as added is skipped,
+        so a worker exiting during the collection is counted exactly once and totals never go backwards
+
+        :return: Aggregated list of metrics
+        """
+        if not METRICS_DIR:
+            return self.snapshot()
+
+        self.flush()
+        workers: Dict[str, List[dict]] = {}
+        for path in glob.glob(os.path.join(METRICS_DIR, WORKER_FILE_PATTERN)):
+            metrics: Optional[List[dict]] = _read_json(path)
+            if metrics is not None:
+                workers[os.path.basename(path)] = metrics
+
+        archive: dict = _read_json(os.path.join(METRICS_DIR, ARCHIVE_FILE)) or {"workers": [], "metrics": []}
+        snapshots: List[dict] = list(archive["metrics"])
+        for name, metrics in workers.items():
+            if name not in archive["workers"]:
+                snapshots.extend(metrics)
+
+        return merge(snapshots)
+
+    def render(self) -> str:
+        """
+        Render aggregated metrics in the Prometheus text format
+
+        :return: Metrics text
+        """
+        return render_prometheus(self.collect())
+
+
+def retire_worker(pid: int) -> None:
+    """
+    Add the totals of an exited worker to the archive and remove its file. Called by the gunicorn master only,
+    so the archive has a single writer. The archive lists the added files until they are removed
+
+    :param pid: Pid of the exited worker
+    :return: None
+    """
+    if not METRICS_DIR:
+        return
+
+    archive_path: str = os.path.join(METRICS_DIR, ARCHIVE_FILE)
+    archive: dict = _read_json(archive_path) or {"workers": [], "metrics": []}
+    paths: List[str] = glob.glob(os.path.join(METRICS_DIR, WORKER_FILE_PATTERN.replace("*", f"{pid}_*")))
+    snapshots: List[dict] = list(archive["metrics"])
+    for path in paths:
+        snapshots.extend(_read_json(path) or [])
+
+    # Names of files already removed are dropped, no reader can see them any more
+    workers: List[str] = [name for name in archive["workers"] if os.path.exists(os.path.join(METRICS_DIR, name))]
+    _write_json(archive_path, {"workers": workers + [os.path.basename(path) for path in paths],
+                               "metrics": merge(snapshots)})
+
+    for path in paths:
+        os.remove(path)
+
+
+def clear(directory: str) -> None:
+    """
+    Remove the metrics of a previous run, counters start from zero with the server
+
+    :param directory: Metrics folder
+    :return: None
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        os.remove(path)
+
+
+def _read_json(path: str) -> Optional[list | dict]:
+    try:
+        with open(path, encoding="utf-8") as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: list | dict) -> None:
+    with open(f"{path}.tmp", "w", encoding="utf-8") as metrics_file:
+        json.dump(data, metrics_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def merge(snapshots: Iterable[dict]) -> List[dict]:
+    """
+    Add up histograms with the same name and labels
+
+    :param snapshots: Metrics of several processes
+    :return: Merged list of metrics
+    """
+    merged: Dict[Tuple[str, Labels], dict] = {}
+
+    for metric in snapshots:
+        key: Tuple[str, Labels] = (metric["name"], tuple(sorted(metric["labels"].items())))
+        if key not in merged:
+            merged[key] = {"name": metric["name"], "labels": metric["labels"],
+                           "counts": list(metric["counts"]), "sum": metric["sum"], "count": metric["count"]}
+            continue
+        total: dict = merged[key]
+        total["counts"] = [left + right for left, right in zip(total["counts"], metric["counts"])]
+        total["sum"] += metric["sum"]
+        total["count"] += metric["count"]
+
+    return list(merged.values())
+
+
+def render_prometheus(metrics: List[dict]) -> str:
+    """
+    Render histograms in the Prometheus text format
+
+    :param metrics: List of metrics
+    :return: Metrics text
+    """
+    lines: List[str] = []
+
+    for name in sorted({metric["name"] for metric in metrics}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+
+        for metric in (metric for metric in metrics if metric["name"] == name):
+            labels: str = ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(metric["labels"].items()))
+            separator: str = "," if labels else ""
+            cumulative: int = 0
+
+            for bound, count in zip((*BUCKETS, "+Inf"), metric["counts"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+            selector: str = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{selector} {metric['sum']}")
+            lines.append(f"{name}_count{selector} {metric['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create timing helpers
+registry: MetricsRegistry = MetricsRegistry()
+
+
+class _Timer:
+    """
+    Context manager recording its duration into a histogram
+    """
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram: Histogram = histogram
+        self.started: float = 0.0
+
+    def __enter__(self) -> _Timer:
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class _NullTimer:
+    """
+    Context manager doing nothing, used when metrics are disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> _NullTimer:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_null_timer: _NullTimer = _NullTimer()
+
+
+def timer(name: str, **labels: str) -> _Timer | _NullTimer:
+    """
+    Time a block of code
+
+    :param name: Metric name
+    :param labels: Metric labels
+    :return: Context manager
+    """
+    if not ENABLED:
+        return _null_timer
+    return _Timer(registry.histogram(name, **labels))
+
+
+def timed(name: str, **labels: str) -> Callable:
+    """
+    Time every call of the decorated function. If metrics are disabled the function is returned unchanged
+
+    :param name: Metric name
+    :param labels: Metric labels
+    :return: Decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        if not ENABLED:
+            return function
+
+        histogram: Histogram = registry.histogram(name, **labels)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
@@ -1,41 +1,212 @@
-from typing import Optional, Tuple
+from __future__ import annotations
 
-from application.models.unit import BaseUnit
+from typing import Callable, List, Optional, Tuple
 
-
-# ----------------------------------------------------------------------------------------------------------------------
-# Create singleton class
-class BaseSingleton(type):
-    _instances: dict = {}
-
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            instance = super().__call__(*args, **kwargs)
-            cls._instances[cls] = instance
-        return cls._instances[cls]
+from application.metrics import timed
+from application.models.classes import unit_classes
+from application.models.effects import EffectScheduler, STUN
+from application.models.equipment import EquipmentCatalog
+from application.models.policies import PlayerPolicy, get_policy
+from application.models.replay import BattleLog, UnitConfig, HIT, SKILL, PASS, DEFAULT_POLICY
+from application.models.rng import BattleRandom
+from application.models.unit import BaseUnit, PlayerUnit, EnemyUnit
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Create Arena class
-class Arena(metaclass=BaseSingleton):
+class Arena:
+    __slots__ = ("player", "enemy", "game_is_running", "battle_result", "rng", "log", "listeners", "effects")
+
     STAMINA_PER_ROUND: int = 1
-    player: BaseUnit = None
-    enemy: BaseUnit = None
-    game_is_running: bool = False
-    battle_result: str = ""
 
-    def start_game(self, player: BaseUnit, enemy: BaseUnit) -> None:
+    def __init__(self):
+        """
+        Initialize Arena with an empty battle
+        """
+        self.player: Optional[BaseUnit] = None
+        self.enemy: Optional[BaseUnit] = None
+        self.game_is_running: bool = False
+        self.battle_result: str = ""
+        self.rng: Optional[BattleRandom] = None
+        self.log: Optional[BattleLog] = None
+        self.listeners: List[Callable[[dict], None]] = []
+        self.effects: EffectScheduler = EffectScheduler()
+
+    def start_game(self, player: BaseUnit, enemy: BaseUnit, seed: Optional[int] = None) -> None:
         """
-        Set up player and enemy units and change game status
+        Set up player and enemy units with a random generator of the battle and change game status
 
         :param player: Player instance
         :param enemy: Enemy instance
+        :param seed: Seed of the battle random generator, a random one is used if not given
         :return: None
         """
         self.player = player
         self.enemy = enemy
         self.game_is_running = True
+        self.battle_result = ""
+        self.rng = BattleRandom(seed)
+        self.player.rng = self.enemy.rng = self.rng
+        self.effects = EffectScheduler()
+        self.player.status = self.effects.track()
+        self.enemy.status = self.effects.track()
+        self.log = BattleLog(seed=self.rng.seed, player=self.get_unit_config(player),
+                             enemy=self.get_unit_config(enemy), policy=self.get_policy_name(enemy))
+
+    def _emit(self, event_type: str, text: str = "", actor: Optional[BaseUnit] = None,
+              target_hp: float = 0.0) -> None:
+        """
+        Send a turn event with the current HP and stamina to the listeners.
+        Action events also tell who acted, how, the HP the target lost and the damage its armor stopped
+
+        :param event_type: player_action, stamina_regeneration, status_effects, enemy_action or battle_end
+        :param text: Turn result text
+        :param actor: Unit that acted, only for action events
+        :param target_hp: HP of the target before the action
+        :return: None
+        """
+        if not self.listeners:
+            return
+
+        event: dict = {"type": event_type,
+                       "text": text,
+                       "player": {"hp": self.player.hp, "stamina": self.player.stamina},
+                       "enemy": {"hp": self.enemy.hp, "stamina": self.enemy.stamina}}
+
+        if actor is not None:
+            target: BaseUnit = self.enemy if actor is self.player else self.player
+            event["actor"] = actor.name
+            event["action"] = actor.last_action
+            event["damage"] = round(target_hp - target.hp, 1)
+            event["armor_absorbed"] = actor.armor_absorbed
+
+        for listener in self.listeners:
+            listener(event)
+
+    @classmethod
+    def replay(cls, log: BattleLog, catalog: EquipmentCatalog) -> Arena:
+        """
+        Play the recorded battle again from its seed and actions
+
+        :param log: Battle log
+        :param catalog: Equipment catalog to take weapons and armors from
+        :return: Arena in the same state as the recorded battle
+        """
+        arena: Arena = cls()
+        enemy: EnemyUnit = cls.create_unit(EnemyUnit, log.enemy, catalog)
+        enemy.policy = get_policy(log.policy)
+        arena.start_game(cls.create_unit(PlayerUnit, log.player, catalog), enemy, seed=log.seed)
+
+        for action in log.actions:
+            arena.play_action(action)
+
+        return arena
+
+    def dump_state(self) -> dict:
+        """
+        Get the state of the started battle: the log, the draw counter of the random generator,
+        the units and their effects. It is restored without playing the battle again
+
+        :return: JSON-compatible state
+        """
+        return {"log": self.log.to_dict(compress=True),
+                "draws": self.rng.draws,
+                "running": self.game_is_running,
+                "result": self.battle_result,
+                "units": [self.player.get_state(), self.enemy.get_state()],
+                "effects": self.effects.dump((self.player.status, self.enemy.status))}
+
+    @classmethod
+    def restore(cls, state: dict, catalog: EquipmentCatalog) -> Arena:
+        """
+        Restore the battle saved by dump_state. Units get the current stats of their equipment,
+        so a catalog reload changes the rest of the battle but not what already happened
+
+        :param state: Battle state
+        :param catalog: Equipment catalog to take weapons and armors from
+        :return: Arena in the saved state
+        """
+        try:
+            log: BattleLog = BattleLog.from_dict(state["log"])
+            enemy: EnemyUnit = cls.create_unit(EnemyUnit, log.enemy, catalog)
+            enemy.policy = get_policy(log.policy)
+
+            arena: Arena = cls()
+            arena.start_game(cls.create_unit(PlayerUnit, log.player, catalog), enemy, seed=log.seed)
+            arena.log = log
+            arena.rng.draws = int(state["draws"])
+            arena.game_is_running = bool(state["running"])
+            arena.battle_result = str(state["result"])
+            arena.player.set_state(state["units"][0])
+            arena.enemy.set_state(state["units"][1])
+            arena.effects, (arena.player.status, arena.enemy.status) = EffectScheduler.load(state["effects"])
+        except (KeyError, IndexError, TypeError):
+            raise ValueError("Invalid battle state")
+
+        return arena
+
+    def play_action(self, action: str) -> Optional[str]:
+        """
+        Perform the player action given by its log code
+
+        :param action: HIT, SKILL or PASS
+        :return: Turn result
+        """
+        if action == HIT:
+            return self.player_hit()
+        if action == SKILL:
+            return self.player_use_skill()
+        if action == PASS:
+            return self.pass_turn()
+
+        raise ValueError(f"Unknown action: {action}")
+
+    def auto_battle(self, policy: PlayerPolicy, max_turns: int = 1000) -> str:
+        """
+        Play the started battle to the end, the policy chooses every player action.
+        The actions are logged as if the player clicked them, so the battle can be replayed and continued
+
+        :param policy: Player policy
+        :param max_turns: Maximum number of player turns
+        :return: Battle result, empty if the battle did not end in max_turns
+        """
+        for _ in range(max_turns):
+            if not self.game_is_running:
+                break
+            self.play_action(policy.choose(self.player, self.enemy))
+
+        return self.battle_result
+
+    @staticmethod
+    def get_unit_config(unit: BaseUnit) -> UnitConfig:
+        return unit.name, unit.unit_class.name, unit.weapon.id, unit.armor.id
+
+    @staticmethod
+    def get_policy_name(unit: BaseUnit) -> str:
+        policy = getattr(unit, "policy", None)
+        return policy.name if policy is not None else DEFAULT_POLICY
+
+    @staticmethod
+    def create_unit(unit_type: type, config: UnitConfig, catalog: EquipmentCatalog) -> BaseUnit:
+        """
+        Create an equipped unit from its configuration
+
+        :param unit_type: PlayerUnit or EnemyUnit
+        :param config: Unit configuration
+        :param catalog: Equipment catalog
+        :return: Unit instance
+        """
+        name, class_name, weapon_id, armor_id = config
+
+        if class_name not in unit_classes:
+            raise ValueError(f"Unknown unit class: {class_name}")
 
+        unit: BaseUnit = unit_type(name=name, unit_class=unit_classes[class_name])
+        unit.equip_weapon(catalog.get_weapon_by_id(weapon_id))
+        unit.equip_armor(catalog.get_armor_by_id(armor_id))
+        return unit
+
+    @timed("arena_phase_duration_seconds", phase="check_players_hp")
     def _check_players_hp(self) -> Optional[str]:
         """
         Determine the HP status of Player and Enemy and either end the game with the battle result
@@ -59,14 +230,15 @@ class Arena(metaclass=BaseSingleton):
 
     def _end_game(self) -> str:
         """
-        Reset the Singleton instance, update the game status, and return the outcome of the battle
+        Update the game status and return the outcome of the battle
 
         :return: Battle result
         """
-        self._instances: dict = {}
         self.game_is_running = False
+        self._emit("battle_end", self.battle_result)
         return self.battle_result
 
+    @timed("arena_phase_duration_seconds", phase="stamina_regeneration")
     def _stamina_regeneration(self) -> None:
         """
         Recharge the stamina of both Player and Enemy every turn
@@ -76,13 +248,71 @@ class Arena(metaclass=BaseSingleton):
         units: Tuple[BaseUnit, BaseUnit] = (self.player, self.enemy)
 
         for unit in units:
-            if unit.stamina + self.STAMINA_PER_ROUND > unit.unit_class.max_stamina:
-                unit.stamina = unit.unit_class.max_stamina
-            unit.stamina += self.STAMINA_PER_ROUND
+            self.regenerate_stamina(unit)
+
+    @classmethod
+    def regenerate_stamina(cls, unit: BaseUnit) -> None:
+        if unit.stamina + cls.STAMINA_PER_ROUND > unit.unit_class.max_stamina:
+            unit.stamina = unit.unit_class.max_stamina
+        unit.stamina += cls.STAMINA_PER_ROUND
+
+    def _apply_status_effects(self) -> Optional[str]:
+        """
+        Start the next turn of the effect clock and apply the damage over time and regeneration of both units.
+        Only the per-turn totals are read, the single effects are not visited
+
+        :return: Effects result or None if no effect is active
+        """
+        self.effects.advance()
+        if not self.effects:
+            return None
+
+        results: List[str] = []
+        for unit in (self.player, self.enemy):
+            self.apply_unit_effects(unit, results)
+
+        if not results:
+            return None
 
+        result: str = "\n".join(results)
+        self._emit("status_effects", result)
+        return result
+
+    @staticmethod
+    def apply_unit_effects(unit: BaseUnit, results: List[str]) -> None:
+        """
+        Apply the damage over time and regeneration totals of the unit
+
+        :param unit: Unit with a status
+        :param results: List collecting the effect results
+        :return: None
+        """
+        if unit.status.dot:
+            unit.hp = max(round(unit.hp - unit.status.dot, 1), 0)
+            results.append(f"{unit.name} получает {unit.status.dot} урона от эффектов.")
+        if unit.status.regen and 0 < unit.hp < unit.unit_class.max_health:
+            unit.hp = min(unit.hp + unit.status.regen, unit.unit_class.max_health)
+            results.append(f"{unit.name} восстанавливает {unit.status.regen} здоровья.")
+
+    @staticmethod
+    def get_stun_result(unit: BaseUnit) -> Optional[str]:
+        """
+        Get the result of the turn of a stunned unit
+
+        :param unit: Acting unit
+        :return: Turn result or None if the unit is not stunned
+        """
+        if unit.status is not None and unit.status.is_stunned:
+            unit.record_action(STUN)
+            return f"{unit.name} оглушен и пропускает ход."
+        return None
+
+    @timed("arena_phase_duration_seconds", phase="next_turn")
     def next_turn(self) -> Optional[str]:
         """
-        If both Player and Enemy are alive, perform the next turn, otherwise end the game
+        If both Player and Enemy are alive, perform the next turn, otherwise end the game.
+        Status effects act after the stamina regeneration, the effects whose last turn this was expire
+        after the enemy action
 
         :return: Battle result or turn result
         """
@@ -92,30 +322,62 @@ class Arena(metaclass=BaseSingleton):
             return result
         else:
             self._stamina_regeneration()
-            return self.enemy.hit(self.player)
+            self._emit("stamina_regeneration")
+
+            effects_result: Optional[str] = self._apply_status_effects()
+            if effects_result is not None:
+                result = self._check_players_hp()
+                if result:
+                    return f"{effects_result}\n{result}"
+
+            player_hp: float = self.player.hp
+            result = self.get_stun_result(self.enemy) or self.enemy.hit(self.player)
+            self._emit("enemy_action", result, self.enemy, player_hp)
+            self.effects.expire()
+            return result if effects_result is None else f"{effects_result}\n{result}"
+
+    def pass_turn(self) -> Optional[str]:
+        """
+        Make the Player skip the turn and let the Enemy act
+
+        :return: Battle result or turn result
+        """
+        self.log.append(PASS)
+        if self.player.hp > 0 and self.enemy.hp > 0:
+            self.player.record_action(PASS)
+            self._emit("player_action", f"{self.player.name} пропускает ход.", self.player, self.enemy.hp)
+        return self.next_turn()
 
+    @timed("arena_phase_duration_seconds", phase="player_hit")
     def player_hit(self) -> str:
         """
         Make the Player hit the Enemy and return the result and next turn status
 
         :return: The result of the Player's hit and the next turn status as a string
         """
+        self.log.append(HIT)
         result: Optional[str] = self._check_players_hp()
         if not result:
-            result: str = self.player.hit(self.enemy)
+            enemy_hp: float = self.enemy.hp
+            result: str = self.get_stun_result(self.player) or self.player.hit(self.enemy)
+            self._emit("player_action", result, self.player, enemy_hp)
             next_turn: Optional[str] = self.next_turn()
             return f"{result}\n{next_turn}"
         return result
 
+    @timed("arena_phase_duration_seconds", phase="player_use_skill")
     def player_use_skill(self) -> str:
         """
         Make the Player use skill on Enemy and return the result and next turn status
 
         :return: The result of the player's hit and the next turn status as a string
         """
+        self.log.append(SKILL)
         result: Optional[str] = self._check_players_hp()
         if not result:
-            result: str = self.player.use_skill(self.enemy)
+            enemy_hp: float = self.enemy.hp
+            result: str = self.get_stun_result(self.player) or self.player.use_skill(self.enemy)
+            self._emit("player_action", result, self.player, enemy_hp)
             next_turn: Optional[str] = self.next_turn()
             return f"{result}\n{next_turn}"
         return result
@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from application.analytics import EventBuffer, EventExporter
+from application.models.base import Arena
+from application.models.equipment import Equipment, EquipmentCatalog
+from application.models.policies import PlayerPolicy, get_policy
+from application.models.replay import DEFAULT_POLICY
+from application.models.unit import PlayerUnit, EnemyUnit
+from application.storage import BattleStore, Record
+from application.streaming import BattleChannel
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Marks a hero that is the unit fighting in the arena, so it is restored from the saved arena
+IN_ARENA: str = "arena"
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create battle class
+class Battle:
+    """
+    Class holding the state of a single player's battle \n
+    id: Battle id stored in the user session \n
+    heroes: Player and enemy units chosen for the battle \n
+    arena: Arena instance of the battle \n
+    lock: Lock guarding the battle state between concurrent requests \n
+    last_access: Monotonic time of the last access to the battle \n
+    revision: Number of changes of the battle, stored with it to tell newer copies from older ones \n
+    channel: Channel of turn events, created when a client subscribes \n
+    events: Ring buffer of the turn events exported for analytics, None if the export is off
+    """
+    __slots__ = ("id", "heroes", "arena", "lock", "last_access", "revision", "channel", "events")
+
+    ACTIONS: Tuple[str, ...] = ("hit", "use-skill", "pass-turn")
+
+    def __init__(self, battle_id: str = ""):
+        self.id: str = battle_id
+        self.heroes: dict = {}
+        self.arena: Arena = Arena()
+        self.lock: threading.Lock = threading.Lock()
+        self.last_access: float = time.monotonic()
+        self.revision: int = 0
+        self.channel: Optional[BattleChannel] = None
+        self.events: Optional[EventBuffer] = None
+
+    def get_channel(self) -> BattleChannel:
+        """
+        Get the channel of turn events of the battle, creating it on the first subscription
+
+        :return: Battle channel
+        """
+        if self.channel is None:
+            self.channel = BattleChannel()
+            self.arena.listeners.append(self.channel.publish)
+
+        return self.channel
+
+    def export_events(self, buffer: EventBuffer) -> None:
+        """
+        Record the turn events of the battle in the buffer of the analytics export
+
+        :param buffer: Event buffer of the battle
+        :return: None
+        """
+        self.events = buffer
+        self.arena.listeners.append(buffer.record)
+
+    def dumps(self) -> str:
+        """
+        Serialize the battle to compact JSON. Units are stored as class name, weapon id and armor id,
+        the policy of an enemy waiting for the battle by its name, the arena as its state
+
+        :return: JSON string
+        """
+        record: dict = {}
+
+        for role in ("player", "enemy"):
+            unit = self.heroes.get(role)
+            if unit is None:
+                continue
+            record[role] = IN_ARENA if unit is getattr(self.arena, role) else Arena.get_unit_config(unit)
+
+        enemy = self.heroes.get("enemy")
+        policy: str = Arena.get_policy_name(enemy) if enemy is not None else DEFAULT_POLICY
+        if record.get("enemy") != IN_ARENA and policy != DEFAULT_POLICY:
+            record["policy"] = policy
+
+        if self.arena.log is not None:
+            record["arena"] = self.arena.dump_state()
+
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+    def serialize(self) -> Record:
+        """
+        Serialize the battle while holding its lock, used by the battle store at flush time
+
+        :return: JSON string and revision
+        """
+        with self.lock:
+            return self.dumps(), self.revision
+
+    @classmethod
+    def loads(cls, data: str, catalog: EquipmentCatalog, battle_id: str = "") -> Battle:
+        """
+        Restore the battle serialized by dumps, the arena is restored from its state without playing it again
+
+        :param data: JSON string
+        :param catalog: Equipment catalog to take weapons and armors from
+        :param battle_id: Battle id stored in the user session
+        :return: Battle object
+        """
+        try:
+            record: dict = json.loads(data)
+        except ValueError:
+            raise ValueError("Invalid battle")
+
+        battle: Battle = cls(battle_id)
+
+        if "arena" in record:
+            battle.arena = Arena.restore(record["arena"], catalog)
+
+        for role, unit_type in (("player", PlayerUnit), ("enemy", EnemyUnit)):
+            config = record.get(role)
+            if config == IN_ARENA:
+                battle.heroes[role] = getattr(battle.arena, role)
+            elif config is not None:
+                battle.heroes[role] = Arena.create_unit(unit_type, tuple(config), catalog)
+
+        if "policy" in record and "enemy" in battle.heroes:
+            battle.heroes["enemy"].policy = get_policy(record["policy"])
+
+        return battle
+
+    def play_turn(self, action: str) -> str:
+        """
+        Perform the player action, or return the battle result if the battle is over
+
+        :param action: One of ACTIONS
+        :return: Turn result
+        """
+        if not self.arena.game_is_running:
+            return self.arena.battle_result
+
+        if action == "hit":
+            return self.arena.player_hit()
+        if action == "use-skill":
+            return self.arena.player_use_skill()
+        if action == "pass-turn":
+            return self.arena.pass_turn()
+
+        raise ValueError(f"Unknown action: {action}")
+
+    def auto_play(self, policy: PlayerPolicy, max_turns: int = 1000) -> dict:
+        """
+        Play the battle to the end on the server, starting it first if the fight page was not opened
+
+        :param policy: Player policy
+        :param max_turns: Maximum number of player turns
+        :return: Final state with the battle result and the compressed replay log
+        """
+        if self.arena.player is None:
+            self.arena.start_game(self.heroes["player"], self.heroes["enemy"])
+
+        state: dict = self.get_turn_state(self.arena.auto_battle(policy, max_turns=max_turns))
+        state["turns"] = len(self.arena.log.actions)
+        state["log"] = self.arena.log.to_dict(compress=True)
+
+        return state
+
+    def get_turn_state(self, result: str) -> dict:
+        """
+        Get the part of the fight page that changes after a turn
+
+        :param result: Turn result
+        :return: HP and stamina of both units, turn result and battle status
+        """
+        return {
+            "player": {"hp": self.arena.player.hp, "stamina": self.arena.player.stamina},
+            "enemy": {"hp": self.arena.enemy.hp, "stamina": self.arena.enemy.stamina},
+            "result": result,
+            "battle_over": not self.arena.game_is_running
+        }
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create battle registry class
+class BattleRegistry:
+    """
+    Session-keyed store of live battles with idle TTL eviction and a cap on the number of battles.
+    With a persistent battle store the registry is its in-memory LRU front: saved battles are written behind,
+    and a battle missing from memory or changed by another worker is restored from the store
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_battles: int = 10000,
+                 store: Optional[BattleStore] = None, equipment: Optional[Equipment] = None,
+                 events: Optional[EventExporter] = None):
+        """
+        Initialize empty registry
+
+        :param ttl: Seconds of inactivity after which a battle is evicted
+        :param max_battles: Maximum number of live battles, the least recently used ones are evicted first
+        :param store: Persistent battle store, battles live only in memory if not given
+        :param equipment: Equipment used to restore battles from the store
+        :param events: Exporter of the turn events of the battles, events are not exported if not given
+        """
+        self.ttl: float = ttl
+        self.max_battles: int = max_battles
+        self.store: BattleStore = store if store is not None else BattleStore()
+        self.equipment: Optional[Equipment] = equipment
+        self.events: Optional[EventExporter] = events
+        self._battles: OrderedDict[str, Battle] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._battles)
+
+    def find(self, battle_id: str) -> Optional[Battle]:
+        """
+        Return the battle if it is in memory and no other worker changed it. Never reads the store,
+        so the ASGI application calls it on the event loop and only calls get in a thread if it misses
+
+        :param battle_id: Battle id stored in the user session
+        :return: Battle object or None if it has to be loaded
+        """
+        now: float = time.monotonic()
+
+        with self._lock:
+            battle: Optional[Battle] = self._battles.get(battle_id)
+            if battle is None or not self._is_current(battle, now):
+                return None
+
+            self._touch(battle_id, battle, now)
+            self._evict(now)
+
+        return battle
+
+    def get(self, battle_id: str) -> Battle:
+        """
+        Return the battle for the given id, restoring it from the store or creating a new one
+        if it is not in memory, has expired or was changed by another worker
+
+        :param battle_id: Battle id stored in the user session
+        :return: Battle object
+        """
+        now: float = time.monotonic()
+
+        with self._lock:
+            stale: Optional[Battle] = self._battles.get(battle_id)
+            if stale is not None and self._is_current(stale, now):
+                self._touch(battle_id, stale, now)
+                self._evict(now)
+                return stale
+
+        loaded: Battle = self._load(battle_id) or Battle(battle_id)
+        if self.events is not None:
+            loaded.export_events(self.events.create_buffer(battle_id))
+
+        with self._lock:
+            # Another request may have loaded the battle meanwhile, its copy is kept
+            battle: Optional[Battle] = self._battles.get(battle_id)
+            if battle is stale:
+                battle = self._battles[battle_id] = loaded
+
+            self._touch(battle_id, battle, now)
+            self._evict(now)
+
+        return battle
+
+    def discard(self, battle_id: str) -> None:
+        """
+        Remove the battle from the registry if it exists
+
+        :param battle_id: Battle id stored in the user session
+        :return: None
+        """
+        with self._lock:
+            self._battles.pop(battle_id, None)
+
+        self.store.delete(battle_id)
+
+    def save(self, battle: Battle) -> None:
+        """
+        Schedule the battle to be written to the store after a request changed it
+
+        :param battle: Battle object
+        :return: None
+        """
+        with battle.lock:
+            base_revision: int = battle.revision
+            battle.revision += 1
+
+        self.store.mark_dirty(battle.id, battle.serialize, base_revision)
+
+    def _touch(self, battle_id: str, battle: Battle, now: float) -> None:
+        """
+        Mark the battle as recently used
+
+        :param battle_id: Battle id
+        :param battle: Battle object
+        :param now: Current monotonic time
+        :return: None
+        """
+        battle.last_access = now
+        self._battles.move_to_end(battle_id)
+
+    def _is_current(self, battle: Battle, now: float) -> bool:
+        """
+        Check that the battle in memory has not expired and no other worker stored a newer copy of it
+
+        :param battle: Battle object in memory
+        :param now: Current monotonic time
+        :return: True if the battle can be used as it is
+        """
+        return now - battle.last_access <= self.ttl and not self.store.is_outdated(battle.id, battle.revision)
+
+    def _load(self, battle_id: str) -> Optional[Battle]:
+        """
+        Restore the battle from the store
+
+        :param battle_id: Battle id
+        :return: Battle object or None if it is not stored, expired or refers to removed equipment
+        """
+        record: Optional[Record] = self.store.load(battle_id, self.ttl)
+
+        if record is None or self.equipment is None:
+            return None
+
+        data, revision = record
+        try:
+            battle: Battle = Battle.loads(data, self.equipment.catalog, battle_id)
+        except ValueError:
+            logger.warning("Failed to restore battle %s, starting a new one", battle_id)
+            return None
+
+        battle.revision = revision
+        return battle
+
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired battles and the least recently used ones above the cap.
+        Battles are kept in access order, so only the head of the registry is inspected
+
+        :param now: Current monotonic time
+        :return: None
+        """
+        while self._battles:
+            battle_id, battle = next(iter(self._battles.items()))
+            if now - battle.last_access <= self.ttl and len(self._battles) <= self.max_battles:
+                break
+            del self._battles[battle_id]
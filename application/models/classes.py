@@ -1,11 +1,13 @@
 from dataclasses import dataclass
+from typing import Optional
 
-from application.models.skills import Skill, FuryPunch, HardShot, FireballShot
+from application.assets import asset_url, get_asset_variant
+from application.models.skills import Skill, skills
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Create dataclass for units
-@dataclass
+@dataclass(frozen=True, slots=True)
 class UnitClass:
     """
     Class representing the properties of a game unit \n
@@ -15,7 +17,8 @@ class UnitClass:
     attack: The attack modifier value for the unit \n
     stamina: The stamina modifier value for the unit \n
     armor: The armor modifier value for the unit \n
-    skill: The skill object associated with the unit
+    skill: The compiled skill of the unit, shared by every unit of the class \n
+    portrait: The file name of the unit portrait in the static folder
     """
     name: str
     max_health: float
@@ -24,7 +27,25 @@ class UnitClass:
     stamina: float
     armor: float
     skill: Skill
-    image: str
+    portrait: str
+
+    @property
+    def image(self) -> str:
+        """
+        Get the URL of the unit portrait resolved through the asset manifest
+
+        :return: Portrait URL
+        """
+        return asset_url(self.portrait)
+
+    @property
+    def image_avif(self) -> Optional[str]:
+        """
+        Get the URL of the AVIF unit portrait if it was built
+
+        :return: Portrait URL or None
+        """
+        return get_asset_variant(self.portrait, "avif")
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -35,8 +56,8 @@ WarriorClass: UnitClass = UnitClass(name="Воин",
                                     attack=0.8,
                                     stamina=0.9,
                                     armor=1.2,
-                                    skill=FuryPunch(),
-                                    image="../static/warrior.png")
+                                    skill=skills.get("Свирепый пинок"),
+                                    portrait="warrior.png")
 
 ThiefClass: UnitClass = UnitClass(name="Вор",
                                   max_health=50,
@@ -44,8 +65,8 @@ ThiefClass: UnitClass = UnitClass(name="Вор",
                                   attack=1.5,
                                   stamina=1.2,
                                   armor=1,
-                                  skill=HardShot(),
-                                  image="../static/assassin.png")
+                                  skill=skills.get("Мощный укол"),
+                                  portrait="assassin.png")
 
 MageClass: UnitClass = UnitClass(name="Маг",
                                  max_health=30,
@@ -53,8 +74,8 @@ MageClass: UnitClass = UnitClass(name="Маг",
                                  attack=2,
                                  stamina=1.5,
                                  armor=0.8,
-                                 skill=FireballShot(),
-                                 image="../static/mage.png")
+                                 skill=skills.get("Метеоритный удар"),
+                                 portrait="mage.png")
 # ----------------------------------------------------------------------------------------------------------------------
 # Create dict with classes names for HTML page
 unit_classes: dict = {
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional, Tuple
+
+from application.models.base import Arena
+from application.models.replay import PASS
+from application.models.unit import BaseUnit
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Duel roles, the player moves first
+ROLES: Tuple[str, str] = ("player", "enemy")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create duel arena class
+class DuelArena(Arena):
+    """
+    Arena of two players taking turns, the turn owner is the only one allowed to act
+    """
+    __slots__ = ("turn",)
+
+    def __init__(self):
+        super().__init__()
+        self.turn: str = ROLES[0]
+
+    def start_game(self, player: BaseUnit, enemy: BaseUnit, seed: Optional[int] = None) -> None:
+        super().start_game(player, enemy, seed=seed)
+        self.turn = ROLES[0]
+        # The replay log only describes battles against the computer enemy
+        self.log = None
+
+    def _check_players_hp(self) -> Optional[str]:
+        """
+        End the game with the name of the winner if one of the players is dead
+
+        :return: Battle result or None
+        """
+        if self.player.hp > 0 and self.enemy.hp > 0:
+            return None
+
+        if self.player.hp <= 0 and self.enemy.hp <= 0:
+            self.battle_result = "Ничья."
+        elif self.player.hp > 0:
+            self.battle_result = f"{self.player.name} выиграл битву."
+        else:
+            self.battle_result = f"{self.enemy.name} выиграл битву."
+
+        return self._end_game()
+
+    def act(self, role: str, action: str) -> str:
+        """
+        Perform the action of the turn owner and pass the turn to the other player.
+        Stamina regenerates and status effects act once per round, after the first player's action, as in the Arena
+
+        :param role: Role of the acting player
+        :param action: hit, use-skill or pass-turn
+        :return: Turn result
+        """
+        if not self.game_is_running:
+            return self.battle_result
+
+        if role != self.turn:
+            raise ValueError("Not your turn")
+
+        attacker, target = (self.player, self.enemy) if role == ROLES[0] else (self.enemy, self.player)
+
+        target_hp: float = target.hp
+        stun_result: Optional[str] = self.get_stun_result(attacker)
+        if action == "hit":
+            result: str = stun_result or attacker.hit(target)
+        elif action == "use-skill":
+            result = stun_result or attacker.use_skill(target)
+        elif action == "pass-turn":
+            result = stun_result or f"{attacker.name} пропускает ход."
+            if not stun_result:
+                attacker.record_action(PASS)
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+        self._emit(f"{role}_action", result, attacker, target_hp)
+
+        if role == ROLES[0]:
+            self._stamina_regeneration()
+            self._emit("stamina_regeneration")
+            effects_result: Optional[str] = self._apply_status_effects()
+            if effects_result is not None:
+                result = f"{result}\n{effects_result}"
+        else:
+            self.effects.expire()
+
+        self.turn = ROLES[1] if role == ROLES[0] else ROLES[0]
+        battle_result: Optional[str] = self._check_players_hp()
+
+        return f"{result}\n{battle_result}" if battle_result else result
+
+    def forfeit(self, role: str) -> str:
+        """
+        End the game with the other player as the winner
+
+        :param role: Role of the player leaving the duel
+        :return: Battle result
+        """
+        if not self.game_is_running:
+            return self.battle_result
+
+        winner: BaseUnit = self.enemy if role == ROLES[0] else self.player
+        self.battle_result = f"{winner.name} выиграл битву."
+        return self._end_game()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create duel class
+class Duel:
+    """
+    Class holding a player-versus-player battle \n
+    arena: Duel arena \n
+    lock: Lock guarding the duel between the requests of both players \n
+    last_result: Result of the last turn, shown to both players \n
+    last_access: Monotonic time of the last action
+    """
+    __slots__ = ("arena", "lock", "last_result", "last_access")
+
+    def __init__(self, player: BaseUnit, enemy: BaseUnit):
+        self.arena: DuelArena = DuelArena()
+        self.arena.start_game(player, enemy)
+        self.lock: threading.Lock = threading.Lock()
+        self.last_result: str = ""
+        self.last_access: float = time.monotonic()
+
+    @property
+    def is_running(self) -> bool:
+        return self.arena.game_is_running
+
+    def act(self, role: str, action: str) -> str:
+        """
+        Perform the action of the player
+
+        :param role: Role of the acting player
+        :param action: hit, use-skill or pass-turn
+        :return: Turn result
+        """
+        self.last_result = self.arena.act(role, action)
+        self.last_access = time.monotonic()
+        return self.last_result
+
+    def forfeit(self, role: str) -> str:
+        """
+        Leave the duel, the other player wins
+
+        :param role: Role of the leaving player
+        :return: Battle result
+        """
+        self.last_result = self.arena.forfeit(role)
+        self.last_access = time.monotonic()
+        return self.last_result
+
+    def get_state(self, role: str) -> dict:
+        """
+        Get the duel as seen by the player
+
+        :param role: Role of the player
+        :return: Role, turn owner, HP and stamina of both units, last turn result and battle status
+        """
+        return {
+            "role": role,
+            "turn": self.arena.turn,
+            "your_turn": self.arena.game_is_running and self.arena.turn == role,
+            "player": {"name": self.arena.player.name, "hp": self.arena.player.hp,
+                       "stamina": self.arena.player.stamina},
+            "enemy": {"name": self.arena.enemy.name, "hp": self.arena.enemy.hp, "stamina": self.arena.enemy.stamina},
+            "result": self.last_result,
+            "battle_over": not self.arena.game_is_running
+        }
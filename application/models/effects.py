@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Status effect kinds. Damage over time and stuns are put on the target of a skill, shields and regeneration on its user
+DOT: str = "dot"
+STUN: str = "stun"
+SHIELD: str = "shield"
+REGEN: str = "regen"
+
+TARGET_STATUSES: Tuple[str, str] = (DOT, STUN)
+USER_STATUSES: Tuple[str, str] = (SHIELD, REGEN)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create status effect dataclasses
+@dataclass(frozen=True, slots=True)
+class StatusEffect:
+    """
+    Class representing a timed effect \n
+    kind: DOT, STUN, SHIELD or REGEN \n
+    amount: Damage or HP per turn, or the damage a shield absorbs, not used by stuns \n
+    duration: Number of turns the effect lasts
+    """
+    kind: str
+    amount: float
+    duration: int
+
+
+@dataclass(slots=True)
+class UnitStatus:
+    """
+    Class representing the totals of the active effects of one unit, updated when an effect starts and expires \n
+    scheduler: Scheduler of the battle the unit fights in \n
+    dot: Damage taken every turn \n
+    regen: HP restored every turn \n
+    shield: Damage left to absorb \n
+    stuns: Number of active stuns
+    """
+    scheduler: EffectScheduler = field(repr=False)
+    dot: float = 0.0
+    regen: float = 0.0
+    shield: float = 0.0
+    stuns: int = 0
+
+    @property
+    def is_stunned(self) -> bool:
+        return self.stuns > 0
+
+    def add(self, effect: StatusEffect) -> None:
+        self.scheduler.add(self, effect)
+
+    def absorb(self, damage: float) -> float:
+        """
+        Take the damage from the shield
+
+        :param damage: Incoming damage
+        :return: Damage left after the shield
+        """
+        absorbed: float = min(self.shield, damage)
+        self.shield = round(self.shield - absorbed, 1)
+        return round(damage - absorbed, 1)
+
+    def _update(self, effect: StatusEffect, sign: int) -> None:
+        """
+        Add the effect to the totals or remove it. Totals are rounded like HP, so they return to exactly zero.
+        An expiring shield removes at most its own amount from what the damage has left of the pooled shields
+
+        :param effect: Starting or expiring effect
+        :param sign: 1 when the effect starts, -1 when it expires
+        :return: None
+        """
+        if effect.kind == DOT:
+            self.dot = round(self.dot + sign * effect.amount, 1)
+        elif effect.kind == REGEN:
+            self.regen = round(self.regen + sign * effect.amount, 1)
+        elif effect.kind == SHIELD:
+            self.shield = round(max(self.shield + sign * effect.amount, 0), 1)
+        elif effect.kind == STUN:
+            self.stuns += sign
+        else:
+            raise ValueError(f"Unknown status effect: {effect.kind}")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create effect scheduler class
+class EffectScheduler:
+    """
+    Turn clock of a battle with the timed effects of its units on a heap keyed by the turn they expire at.
+    Effects only change the totals of their unit when they start and expire, so a turn costs O(log n)
+    per expiring effect, however many effects are stacked
+    """
+    __slots__ = ("turn", "_queue", "_added")
+
+    def __init__(self):
+        self.turn: int = 0
+        self._queue: List[Tuple[int, int, UnitStatus, StatusEffect]] = []
+        # Number of effects ever added, it orders the effects expiring on the same turn
+        self._added: int = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def track(self) -> UnitStatus:
+        """
+        Create the status of a unit entering the battle
+
+        :return: Unit status without effects
+        """
+        return UnitStatus(scheduler=self)
+
+    def add(self, status: UnitStatus, effect: StatusEffect) -> None:
+        """
+        Start the effect, it acts on the next effect.duration turns
+
+        :param status: Status of the affected unit
+        :param effect: Effect to start
+        :return: None
+        """
+        if effect.duration < 1:
+            raise ValueError("Status effect duration must be positive")
+
+        status._update(effect, 1)
+        heapq.heappush(self._queue, (self.turn + effect.duration, self._added, status, effect))
+        self._added += 1
+
+    def advance(self) -> None:
+        self.turn += 1
+
+    def dump(self, statuses: Sequence[UnitStatus]) -> dict:
+        """
+        Get the state of the clock, the totals of the statuses and the active effects, effects refer to their status
+        by its position, so the state is plain JSON
+
+        :param statuses: Statuses tracked by the scheduler
+        :return: State restored by load
+        """
+        positions: dict = {id(status): position for position, status in enumerate(statuses)}
+        return {"turn": self.turn,
+                "added": self._added,
+                "statuses": [[status.dot, status.regen, status.shield, status.stuns] for status in statuses],
+                "effects": [[turn, order, positions[id(status)], effect.kind, effect.amount, effect.duration]
+                            for turn, order, status, effect in self._queue]}
+
+    @classmethod
+    def load(cls, state: dict) -> Tuple[EffectScheduler, List[UnitStatus]]:
+        """
+        Restore the scheduler saved by dump
+
+        :param state: Scheduler state
+        :return: Scheduler and the statuses in the order they were given to dump
+        """
+        scheduler: EffectScheduler = cls()
+        scheduler.turn = int(state["turn"])
+        statuses: List[UnitStatus] = [UnitStatus(scheduler, float(dot), float(regen), float(shield), int(stuns))
+                                      for dot, regen, shield, stuns in state["statuses"]]
+        # The heap is stored in heap order, so the list is a valid heap as it is
+        scheduler._queue = [(int(turn), int(order), statuses[position],
+                             StatusEffect(kind=kind, amount=float(amount), duration=int(duration)))
+                            for turn, order, position, kind, amount, duration in state["effects"]]
+        scheduler._added = int(state["added"])
+
+        return scheduler, statuses
+
+    def expire(self) -> int:
+        """
+        Remove the effects whose last turn has passed
+
+        :return: Number of expired effects
+        """
+        expired: int = 0
+        while self._queue and self._queue[0][0] <= self.turn:
+            _, _, status, effect = heapq.heappop(self._queue)
+            status._update(effect, -1)
+            expired += 1
+
+        return expired
@@ -1,22 +1,37 @@
 from dataclasses import dataclass
-from typing import List
-from random import uniform
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 import json
+import logging
+import os
+import random
+import threading
+import time
 
 import marshmallow_dataclass
 import marshmallow
 
+from application.models.rng import BattleRandom
+
+logger = logging.getLogger(__name__)
+
+# Default location of the equipment catalog, can be overridden with the EQUIPMENT_PATH environment variable
+EQUIPMENT_PATH: Path = Path(__file__).resolve().parent.parent / "data" / "equipment.json"
+
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Create dataclasses for equipment
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Armor:
     """
     Class representing the properties of an armor \n
+    id: The id of the armor \n
     name: The name of the armor \n
     defence: The defense value of the armor \n
     stamina_per_turn: The amount of stamina consumed by the armor per turn
     """
+    id: int
     name: str
     defence: float
     stamina_per_turn: float
@@ -25,15 +40,17 @@ class Armor:
         unknown = marshmallow.EXCLUDE
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Weapon:
     """
     Class representing the properties of a weapon \n
+    id: The id of the weapon \n
     name: The name of the weapon \n
     min_damage: The minimum damage value of the weapon \n
     max_damage: The maximum damage value of the weapon \n
     stamina_per_hit: The amount of stamina consumed by the weapon per hit
     """
+    id: int
     name: str
     min_damage: float
     max_damage: float
@@ -48,7 +65,16 @@ class Weapon:
         Get damage value for the weapon as a random value between min_damage and max_damage
 
         :return: Random value"""
-        return uniform(self.min_damage, self.max_damage)
+        return self.roll_damage(random)
+
+    def roll_damage(self, rng: BattleRandom | random.Random) -> float:
+        """
+        Get damage value for the weapon drawn from the given random generator
+
+        :param rng: Random generator of the battle
+        :return: Random value between min_damage and max_damage
+        """
+        return rng.uniform(self.min_damage, self.max_damage)
 
 
 @dataclass
@@ -64,60 +90,281 @@ class EquipmentData:
 
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create equipment class
-class Equipment:
+# Create equipment catalog class
+class EquipmentCatalog:
     """
-    Class for handling equipment
+    Immutable snapshot of the loaded equipment with name and id indexes
     """
 
-    def __init__(self):
-        self.equipment: EquipmentData = self._get_equipment_data()
+    def __init__(self, equipment: EquipmentData, version: int = 1):
+        """
+        Build lookup indexes for the equipment
+
+        :param equipment: Loaded equipment data
+        :param version: Catalog version, incremented on every reload
+        """
+        self.equipment: EquipmentData = equipment
+        self.version: int = version
+
+        self._weapons: Dict[str, Weapon] = {weapon.name: weapon for weapon in equipment.weapons}
+        self._armors: Dict[str, Armor] = {armor.name: armor for armor in equipment.armors}
+        self._weapons_by_id: Dict[int, Weapon] = {weapon.id: weapon for weapon in equipment.weapons}
+        self._armors_by_id: Dict[int, Armor] = {armor.id: armor for armor in equipment.armors}
+        self._weapons_names: Tuple[str, ...] = tuple(self._weapons)
+        self._armors_names: Tuple[str, ...] = tuple(self._armors)
+
+        if len(self._weapons) != len(equipment.weapons) or len(self._armors) != len(equipment.armors) \
+                or len(self._weapons_by_id) != len(equipment.weapons) \
+                or len(self._armors_by_id) != len(equipment.armors):
+            raise ValueError("Invalid equipment data: duplicate names or ids")
 
     def get_weapon(self, weapon_name: str) -> Weapon:
         """
-        Return weapon object filtered by name
+        Return weapon object by name
 
         :param weapon_name: Name of the weapon
         :return: Weapon object
         """
-        return next(filter(lambda weapon: weapon.name == weapon_name, self.equipment.weapons))
+        try:
+            return self._weapons[weapon_name]
+        except KeyError:
+            raise ValueError(f"Unknown weapon: {weapon_name}") from None
 
     def get_armor(self, armor_name: str) -> Armor:
         """
-        Return armor object filtered by name
+        Return armor object by name
 
         :param armor_name: Name of the armor
         :return: Armor object
         """
-        return next(filter(lambda armor: armor.name == armor_name, self.equipment.armors))
+        try:
+            return self._armors[armor_name]
+        except KeyError:
+            raise ValueError(f"Unknown armor: {armor_name}") from None
+
+    def get_weapon_by_id(self, weapon_id: int) -> Weapon:
+        """
+        Return weapon object by id
+
+        :param weapon_id: Id of the weapon
+        :return: Weapon object
+        """
+        try:
+            return self._weapons_by_id[weapon_id]
+        except KeyError:
+            raise ValueError(f"Unknown weapon id: {weapon_id}") from None
+
+    def get_armor_by_id(self, armor_id: int) -> Armor:
+        """
+        Return armor object by id
+
+        :param armor_id: Id of the armor
+        :return: Armor object
+        """
+        try:
+            return self._armors_by_id[armor_id]
+        except KeyError:
+            raise ValueError(f"Unknown armor id: {armor_id}") from None
 
-    def get_weapons_names(self) -> list:
+    def get_weapons_names(self) -> Tuple[str, ...]:
         """
-        Get list of weapon names
+        Get weapon names
 
-        :return: List of weapon names
+        :return: Tuple of weapon names
         """
-        return [weapon.name for weapon in self.equipment.weapons]
+        return self._weapons_names
 
-    def get_armors_names(self) -> list:
+    def get_armors_names(self) -> Tuple[str, ...]:
         """
-        Get list of armor names
+        Get armor names
 
-        :return: List of armor names
+        :return: Tuple of armor names
         """
-        return [armor.name for armor in self.equipment.armors]
+        return self._armors_names
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create equipment class
+class Equipment:
+    """
+    Class for handling equipment. The catalog is replaced as a whole on reload,
+    so a request holding a catalog snapshot never sees a half-loaded catalog
+    """
+
+    def __init__(self, path: Optional[str | Path] = None, lazy: bool = False):
+        """
+        Load the equipment catalog
+
+        :param path: Path of the equipment json file, defaults to EQUIPMENT_PATH
+        :param lazy: Load the catalog on first access instead of now
+        """
+        self.path: Path = Path(path or os.environ.get("EQUIPMENT_PATH") or EQUIPMENT_PATH)
+        self._mtime: Optional[int] = None
+        self._catalog: Optional[EquipmentCatalog] = None
+        self._reload_lock: threading.Lock = threading.Lock()
+        self._listeners: List[Callable[[EquipmentCatalog], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+
+        if not lazy:
+            self._load()
+
+    @property
+    def catalog(self) -> EquipmentCatalog:
+        """
+        Get the current catalog, loading it on first access
+
+        :return: Equipment catalog
+        """
+        catalog: Optional[EquipmentCatalog] = self._catalog
+        return catalog if catalog is not None else self._load()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._catalog is not None
+
+    @property
+    def equipment(self) -> EquipmentData:
+        return self.catalog.equipment
+
+    @property
+    def version(self) -> int:
+        return self.catalog.version
+
+    def get_weapon(self, weapon_name: str) -> Weapon:
+        return self.catalog.get_weapon(weapon_name)
+
+    def get_armor(self, armor_name: str) -> Armor:
+        return self.catalog.get_armor(armor_name)
+
+    def get_weapon_by_id(self, weapon_id: int) -> Weapon:
+        return self.catalog.get_weapon_by_id(weapon_id)
+
+    def get_armor_by_id(self, armor_id: int) -> Armor:
+        return self.catalog.get_armor_by_id(armor_id)
+
+    def get_weapons_names(self) -> Tuple[str, ...]:
+        return self.catalog.get_weapons_names()
+
+    def get_armors_names(self) -> Tuple[str, ...]:
+        return self.catalog.get_armors_names()
+
+    def add_reload_listener(self, listener: Callable[[EquipmentCatalog], None]) -> None:
+        """
+        Register a function called with the new catalog after every reload
+
+        :param listener: Function taking the new catalog
+        :return: None
+        """
+        self._listeners.append(listener)
+
+    def reload(self) -> EquipmentCatalog:
+        """
+        Load the equipment file again and swap the new catalog in
+
+        :return: New catalog
+        """
+        with self._reload_lock:
+            # The time is read before parsing, so a change made meanwhile is loaded on the next check,
+            # and stored after it, so a file that failed to load is tried again
+            mtime: Optional[int] = self._get_mtime()
+            catalog: EquipmentCatalog = EquipmentCatalog(self._get_equipment_data(self.path),
+                                                         version=self._catalog.version + 1 if self._catalog else 1)
+            self._catalog = catalog
+            self._mtime = mtime
+
+        for listener in self._listeners:
+            listener(catalog)
+
+        return catalog
+
+    def _load(self) -> EquipmentCatalog:
+        """
+        Load the first catalog once, concurrent first accesses wait for the same load
+
+        :return: Current catalog
+        """
+        with self._reload_lock:
+            if self._catalog is None:
+                mtime: Optional[int] = self._get_mtime()
+                self._catalog = EquipmentCatalog(self._get_equipment_data(self.path))
+                self._mtime = mtime
+            return self._catalog
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the catalog if the equipment file was modified since the last load
+
+        :return: True if the catalog was reloaded
+        """
+        if not self.is_loaded or self._get_mtime() == self._mtime:
+            return False
+
+        self.reload()
+        return True
+
+    def start_watching(self, interval: float = 2.0) -> None:
+        """
+        Start a daemon thread polling the equipment file for changes
+
+        :param interval: Seconds between checks
+        :return: None
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="equipment-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        """
+        Poll the equipment file, keeping the current catalog if the new file is invalid
+
+        :param interval: Seconds between checks
+        :return: None
+        """
+        while True:
+            time.sleep(interval)
+            try:
+                if self.reload_if_changed():
+                    logger.info("Equipment catalog reloaded from %s", self.path)
+            except (OSError, ValueError):
+                logger.exception("Failed to reload equipment catalog from %s", self.path)
+
+    def _get_mtime(self) -> Optional[int]:
+        """
+        Get the modification time of the equipment file
+
+        :return: Modification time or None if the file does not exist
+        """
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
 
     @staticmethod
-    def _get_equipment_data() -> EquipmentData | ValueError:
+    def _get_equipment_data(path: Path) -> EquipmentData | ValueError:
         """
         Load equipment data from json file
 
+        :param path: Path of the equipment json file
         :return: EquipmentData object or ValueError
         """
-        with open("././application/data/equipment.json", encoding="utf-8") as equipment_file:
-            data = json.load(equipment_file)
-            equipment_schema = marshmallow_dataclass.class_schema(EquipmentData)
+        with open(path, encoding="utf-8") as equipment_file:
+            try:
+                data = json.load(equipment_file)
+            except json.JSONDecodeError:
+                raise ValueError("Invalid equipment data")
         try:
-            return equipment_schema().load(data)
+            return _get_equipment_schema().load(data)
         except marshmallow.exceptions.ValidationError:
             raise ValueError("Invalid equipment data")
+
+
+@lru_cache(maxsize=None)
+def _get_equipment_schema() -> marshmallow.Schema:
+    """
+    Build the equipment schema once
+
+    :return: Equipment schema instance
+    """
+    return marshmallow_dataclass.class_schema(EquipmentData)()
@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+import math
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from application.models.classes import UnitClass, unit_classes
+from application.models.equipment import Weapon, Armor, EquipmentCatalog
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create profile dataclasses
+@dataclass(frozen=True, slots=True)
+class AttackProfile:
+    """
+    Attack of a unit class with a weapon \n
+    attack: Class attack multiplier applied to the weapon damage roll \n
+    min_damage: Minimal damage before the target defence \n
+    max_damage: Maximal damage before the target defence \n
+    stamina_per_hit: Stamina spent by the attacker on a hit that gets through
+    """
+    attack: float
+    min_damage: float
+    max_damage: float
+    stamina_per_hit: float
+
+    @property
+    def mean_damage(self) -> float:
+        return (self.min_damage + self.max_damage) / 2
+
+    @classmethod
+    def create(cls, unit_class: UnitClass, weapon: Weapon) -> AttackProfile:
+        return cls(attack=unit_class.attack,
+                   min_damage=weapon.min_damage * unit_class.attack,
+                   max_damage=weapon.max_damage * unit_class.attack,
+                   stamina_per_hit=weapon.stamina_per_hit)
+
+
+@dataclass(frozen=True, slots=True)
+class DefenceProfile:
+    """
+    Defence of a unit class in an armor \n
+    defence: Effective defence, the armor defence multiplied by the class armor modifier \n
+    stamina_per_turn: Stamina the defender must have above to absorb a hit with the armor
+    """
+    defence: float
+    stamina_per_turn: float
+
+    @classmethod
+    def create(cls, unit_class: UnitClass, armor: Armor) -> DefenceProfile:
+        return cls(defence=armor.defence * unit_class.armor, stamina_per_turn=armor.stamina_per_turn)
+
+
+def get_attack_profile(unit_class: UnitClass, weapon: Weapon) -> AttackProfile:
+    """
+    Get the attack profile of the class with the weapon from the matchup table of the newest catalog,
+    the one the matchups and ratings are computed from. A weapon that is not in it, kept by a unit
+    created before a reload, gets a new profile
+
+    :param unit_class: Class of the attacker
+    :param weapon: Weapon of the attacker
+    :return: Attack profile
+    """
+    profile: Optional[AttackProfile] = _latest_table.get_attack_profile(unit_class, weapon) \
+        if _latest_table is not None else None
+
+    return profile or AttackProfile.create(unit_class, weapon)
+
+
+def get_defence_profile(unit_class: UnitClass, armor: Armor) -> DefenceProfile:
+    """
+    Get the defence profile of the class in the armor from the matchup table of the newest catalog,
+    an armor that is not in it gets a new profile
+
+    :param unit_class: Class of the defender
+    :param armor: Armor of the defender
+    :return: Defence profile
+    """
+    profile: Optional[DefenceProfile] = _latest_table.get_defence_profile(unit_class, armor) \
+        if _latest_table is not None else None
+
+    return profile or DefenceProfile.create(unit_class, armor)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create matchup dataclass
+@dataclass(frozen=True, slots=True)
+class Matchup:
+    """
+    Outcome of one weapon hit for an attacker and defender pairing, ignoring the rounding to 0.1 HP \n
+    attacker: Class name of the attacker \n
+    weapon: Weapon name of the attacker \n
+    defender: Class name of the defender \n
+    armor: Armor name of the defender \n
+    defence: Effective defence of the defender \n
+    min_damage: Minimal damage dealt through the armor \n
+    max_damage: Maximal damage dealt through the armor \n
+    hit_chance: Probability that the hit gets through the armor \n
+    expected_damage: Expected damage per turn while the defender has stamina to absorb hits \n
+    expected_damage_unabsorbed: Expected damage per turn once the defender runs out of stamina \n
+    stamina_per_hit: Stamina spent by the attacker on a hit that gets through \n
+    absorb_stamina: Stamina the defender must have above to absorb hits
+    """
+    attacker: str
+    weapon: str
+    defender: str
+    armor: str
+    defence: float
+    min_damage: float
+    max_damage: float
+    hit_chance: float
+    expected_damage: float
+    expected_damage_unabsorbed: float
+    stamina_per_hit: float
+    absorb_stamina: float
+
+    @classmethod
+    def create(cls, attacker: UnitClass, weapon: Weapon, defender: UnitClass, armor: Armor,
+               attack: AttackProfile, defence: DefenceProfile) -> Matchup:
+        """
+        Compute the matchup in closed form, the damage roll is uniform between min and max damage
+
+        :param attacker: Class of the attacker
+        :param weapon: Weapon of the attacker
+        :param defender: Class of the defender
+        :param armor: Armor of the defender
+        :param attack: Attack profile of the attacker with the weapon
+        :param defence: Defence profile of the defender in the armor
+        :return: Matchup
+        """
+        low, high, threshold = attack.min_damage, attack.max_damage, defence.defence
+
+        if threshold >= high:
+            hit_chance, absorbed, unabsorbed = 0.0, 0.0, 0.0
+        elif threshold <= low:
+            hit_chance, absorbed, unabsorbed = 1.0, (low + high) / 2 - threshold, (low + high) / 2
+        else:
+            # Only the part of the roll above the defence hits, the roll is uniform on [low, high]
+            hit_chance = (high - threshold) / (high - low)
+            absorbed = (high - threshold) ** 2 / (2 * (high - low))
+            unabsorbed = (high ** 2 - threshold ** 2) / (2 * (high - low))
+
+        return cls(attacker=attacker.name,
+                   weapon=weapon.name,
+                   defender=defender.name,
+                   armor=armor.name,
+                   defence=threshold,
+                   min_damage=max(low - threshold, 0.0) if hit_chance else 0.0,
+                   max_damage=max(high - threshold, 0.0),
+                   hit_chance=hit_chance,
+                   expected_damage=absorbed,
+                   expected_damage_unabsorbed=unabsorbed,
+                   stamina_per_hit=attack.stamina_per_hit,
+                   absorb_stamina=defence.stamina_per_turn)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create matchup table class
+AttackKey = Tuple[str, Weapon]
+DefenceKey = Tuple[str, Armor]
+BuildKey = Tuple[str, int, int]
+
+# Rating of a build as strong as the average build, every RATING_SCALE points mean ten times the strength
+BASE_RATING: int = 1000
+RATING_SCALE: int = 400
+
+
+class MatchupTable:
+    """
+    Attack profiles of every class and weapon and defence profiles of every class and armor of an equipment catalog,
+    the matchups of every pairing computed from them on demand, and ratings of every build.
+    The table grows with classes * (weapons + armors), not with the number of pairings
+    """
+
+    def __init__(self, catalog: EquipmentCatalog, classes: Optional[Mapping[str, UnitClass]] = None):
+        """
+        Build the table
+
+        :param catalog: Equipment catalog
+        :param classes: Unit classes by name, all game classes if not given
+        """
+        self.version: int = catalog.version
+        self._classes: Dict[str, UnitClass] = dict(classes if classes is not None else unit_classes)
+        self._weapons: Dict[str, Weapon] = {weapon.name: weapon for weapon in catalog.equipment.weapons}
+        self._armors: Dict[str, Armor] = {armor.name: armor for armor in catalog.equipment.armors}
+        self._attacks: Dict[AttackKey, AttackProfile] = {
+            (unit_class.name, weapon): AttackProfile.create(unit_class, weapon)
+            for unit_class in self._classes.values() for weapon in self._weapons.values()}
+        self._defences: Dict[DefenceKey, DefenceProfile] = {
+            (unit_class.name, armor): DefenceProfile.create(unit_class, armor)
+            for unit_class in self._classes.values() for armor in self._armors.values()}
+        self._ratings: Dict[BuildKey, int] = self._get_ratings()
+
+    def __len__(self) -> int:
+        return len(self._attacks) * len(self._defences)
+
+    def get_attack_profile(self, unit_class: UnitClass, weapon: Weapon) -> Optional[AttackProfile]:
+        return self._attacks.get((unit_class.name, weapon))
+
+    def get_defence_profile(self, unit_class: UnitClass, armor: Armor) -> Optional[DefenceProfile]:
+        return self._defences.get((unit_class.name, armor))
+
+    def get(self, attacker: UnitClass, weapon: Weapon, defender: UnitClass, armor: Armor) -> Matchup:
+        """
+        Get the matchup of the pairing
+
+        :param attacker: Class of the attacker
+        :param weapon: Weapon of the attacker
+        :param defender: Class of the defender
+        :param armor: Armor of the defender
+        :return: Matchup
+        """
+        attack: Optional[AttackProfile] = self.get_attack_profile(attacker, weapon)
+        defence: Optional[DefenceProfile] = self.get_defence_profile(defender, armor)
+
+        if attack is None or defence is None:
+            raise ValueError("Unknown matchup")
+
+        return Matchup.create(attacker, weapon, defender, armor, attack, defence)
+
+    def get_rating(self, unit_class: UnitClass, weapon: Weapon, armor: Armor) -> int:
+        """
+        Get the rating of the build
+
+        :param unit_class: Class of the unit
+        :param weapon: Weapon of the unit
+        :param armor: Armor of the unit
+        :return: Rating
+        """
+        rating: Optional[int] = self._ratings.get((unit_class.name, weapon.id, armor.id))
+
+        if rating is None:
+            raise ValueError("Unknown build")
+
+        return rating
+
+    def _get_ratings(self) -> Dict[BuildKey, int]:
+        """
+        Rate every build by the number of turns it survives against the average attacker
+        divided by the number of turns it needs to kill the average defender.
+        The averages over all pairings are summed in closed form over the sorted profiles,
+        so rating n builds takes O(n log n) instead of visiting every pairing
+
+        :return: Ratings by class name, weapon id and armor id
+        """
+        attacks: List[AttackProfile] = list(self._attacks.values())
+        defences: List[float] = [profile.defence for profile in self._defences.values()]
+        dealt: Dict[AttackKey, float] = dict(zip(self._attacks, _get_mean_damage_dealt(attacks, defences)))
+        taken: Dict[DefenceKey, float] = dict(zip(self._defences, _get_mean_damage_taken(attacks, defences)))
+
+        average_health: float = sum(unit_class.max_health for unit_class in self._classes.values()) / len(self._classes)
+        ratings: Dict[BuildKey, int] = {}
+
+        for unit_class in self._classes.values():
+            for weapon in self._weapons.values():
+                for armor in self._armors.values():
+                    damage_dealt: float = max(dealt[(unit_class.name, weapon)], 1e-3)
+                    damage_taken: float = max(taken[(unit_class.name, armor)], 1e-3)
+                    strength: float = (unit_class.max_health / damage_taken) / (average_health / damage_dealt)
+                    ratings[(unit_class.name, weapon.id, armor.id)] = \
+                        round(BASE_RATING + RATING_SCALE * math.log10(strength))
+
+        return ratings
+
+    def find(self, attacker: Optional[str] = None, weapon: Optional[str] = None,
+             defender: Optional[str] = None, armor: Optional[str] = None) -> List[Matchup]:
+        """
+        Get the matchups matching the given names, a missing name matches everything.
+        Every name is looked up in its index, so the cost is the number of matchups returned
+
+        :param attacker: Class name of the attacker
+        :param weapon: Weapon name of the attacker
+        :param defender: Class name of the defender
+        :param armor: Armor name of the defender
+        :return: List of matchups
+        """
+        return [Matchup.create(attacker_class, attacker_weapon, defender_class, defender_armor,
+                               self._attacks[(attacker_class.name, attacker_weapon)],
+                               self._defences[(defender_class.name, defender_armor)])
+                for attacker_class in _select(self._classes, attacker)
+                for attacker_weapon in _select(self._weapons, weapon)
+                for defender_class in _select(self._classes, defender)
+                for defender_armor in _select(self._armors, armor)]
+
+
+def _select(index: Mapping[str, object], name: Optional[str]) -> list:
+    if name is None:
+        return list(index.values())
+    return [index[name]] if name in index else []
+
+
+def _get_mean_damage_dealt(attacks: Sequence[AttackProfile], defences: Sequence[float]) -> List[float]:
+    """
+    Get the expected damage of every attack averaged over all defences. Defences at or below the lowest roll
+    take the mean roll minus the defence, defences inside the roll range take (high - defence)^2 / 2(high - low),
+    so prefix sums of the sorted defences and their squares give every average in O(log n)
+
+    :param attacks: Attack profiles
+    :param defences: Effective defences
+    :return: Average expected damage of every attack in order
+    """
+    thresholds: List[float] = sorted(defences)
+    sums: List[float] = list(itertools.accumulate(thresholds, initial=0.0))
+    squares: List[float] = list(itertools.accumulate((threshold ** 2 for threshold in thresholds), initial=0.0))
+    averages: List[float] = []
+
+    for attack in attacks:
+        low, high = attack.min_damage, attack.max_damage
+        below_high: int = bisect.bisect_left(thresholds, high)
+        through: int = min(bisect.bisect_right(thresholds, low), below_high)
+        total: float = through * (low + high) / 2 - sums[through]
+
+        if below_high > through:
+            count: int = below_high - through
+            inside_sum: float = sums[below_high] - sums[through]
+            inside_squares: float = squares[below_high] - squares[through]
+            total += (count * high ** 2 - 2 * high * inside_sum + inside_squares) / (2 * (high - low))
+
+        averages.append(total / len(thresholds))
+
+    return averages
+
+
+def _get_mean_damage_taken(attacks: Sequence[AttackProfile], defences: Sequence[float]) -> List[float]:
+    """
+    Get the expected damage every defence takes averaged over all attacks. Attacks whose lowest roll is at or above
+    the defence deal the mean roll minus the defence, attacks whose range contains it deal
+    high^2 / 2w - defence * high / w + defence^2 / 2w with w = high - low. Those sums are taken over the attacks
+    with the highest roll above the defence minus the ones with the lowest roll at or above it,
+    both are suffixes of the attacks sorted by the highest and by the lowest roll
+
+    :param attacks: Attack profiles
+    :param defences: Effective defences
+    :return: Average expected damage taken by every defence in order
+    """
+    ranged: List[AttackProfile] = [attack for attack in attacks if attack.max_damage > attack.min_damage]
+    fixed: List[float] = sorted(attack.min_damage for attack in attacks if attack.max_damage <= attack.min_damage)
+    fixed_sums: List[float] = list(itertools.accumulate(fixed, initial=0.0))
+
+    by_low: List[AttackProfile] = sorted(ranged, key=lambda attack: attack.min_damage)
+    by_high: List[AttackProfile] = sorted(ranged, key=lambda attack: attack.max_damage)
+    lows: List[float] = [attack.min_damage for attack in by_low]
+    highs: List[float] = [attack.max_damage for attack in by_high]
+    low_means: List[float] = list(itertools.accumulate((attack.mean_damage for attack in by_low), initial=0.0))
+    low_terms: List[List[float]] = _get_range_term_sums(by_low)
+    high_terms: List[List[float]] = _get_range_term_sums(by_high)
+    averages: List[float] = []
+
+    for defence in defences:
+        # Fixed rolls above the defence deal the roll minus the defence
+        above: int = bisect.bisect_right(fixed, defence)
+        total: float = fixed_sums[-1] - fixed_sums[above] - (len(fixed) - above) * defence
+
+        through: int = bisect.bisect_left(lows, defence)
+        total += low_means[-1] - low_means[through] - (len(lows) - through) * defence
+
+        inside: int = bisect.bisect_right(highs, defence)
+        squares, linear, constant = (high_sums[-1] - high_sums[inside] - low_sums[-1] + low_sums[through]
+                                     for high_sums, low_sums in zip(high_terms, low_terms))
+        total += squares - defence * linear + defence ** 2 * constant
+
+        averages.append(total / len(attacks))
+
+    return averages
+
+
+def _get_range_term_sums(attacks: Sequence[AttackProfile]) -> List[List[float]]:
+    """
+    Get the prefix sums of high^2 / 2w, high / w and 1 / 2w of the attacks with w = high - low
+
+    :param attacks: Attack profiles with a roll range
+    :return: Three prefix sum lists
+    """
+    widths: List[float] = [attack.max_damage - attack.min_damage for attack in attacks]
+    return [list(itertools.accumulate((attack.max_damage ** 2 / (2 * width)
+                                       for attack, width in zip(attacks, widths)), initial=0.0)),
+            list(itertools.accumulate((attack.max_damage / width
+                                       for attack, width in zip(attacks, widths)), initial=0.0)),
+            list(itertools.accumulate((1 / (2 * width) for width in widths), initial=0.0))]
+
+
+# The table of the newest catalog, live units read their profiles from it
+_latest_table: Optional[MatchupTable] = None
+
+
+@lru_cache(maxsize=4)
+def _build_matchup_table(catalog: EquipmentCatalog) -> MatchupTable:
+    return MatchupTable(catalog)
+
+
+def get_matchup_table(catalog: EquipmentCatalog) -> MatchupTable:
+    """
+    Get the matchup table of the catalog. Catalogs are immutable and replaced on reload,
+    so a reloaded catalog gets a new table, which becomes the source of the profiles of new units
+
+    :param catalog: Equipment catalog
+    :return: Matchup table
+    """
+    global _latest_table
+
+    table: MatchupTable = _build_matchup_table(catalog)
+    if _latest_table is None or table.version >= _latest_table.version:
+        _latest_table = table
+
+    return table
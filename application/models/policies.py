@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import importlib
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import numpy as np
+
+from application.models.replay import HIT, SKILL, PASS, DEFAULT_POLICY
+
+if TYPE_CHECKING:
+    from application.models.unit import BaseUnit
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Enemy actions, batch modes return indices into ACTIONS
+ACTIONS: Tuple[str, str, str] = (HIT, SKILL, PASS)
+HIT_INDEX: int = 0
+SKILL_INDEX: int = 1
+PASS_INDEX: int = 2
+
+# Chance of the skill roll of the random policy, random.randint(0, 100) < 10
+SKILL_ROLL_RANGE: int = 101
+SKILL_ROLL_THRESHOLD: int = 10
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create abstract enemy policy class
+class EnemyPolicy(ABC):
+    """
+    Decides what the enemy does on its turn. A policy chooses for one unit in the Arena and for many battles at once
+    in the vectorized engine, where a side holds arrays with one element per battle: hp, stamina, is_skill_used,
+    max_health, max_stamina, attack, min_damage, max_damage, stamina_per_hit, defence, stamina_per_turn,
+    skill_id, skill_stamina and skill_damage
+    """
+    name: str = ""
+
+    @abstractmethod
+    def choose(self, enemy: BaseUnit, target: BaseUnit) -> str:
+        """
+        Choose the action of the enemy unit
+
+        :param enemy: Acting enemy unit
+        :param target: Player unit
+        :return: HIT, SKILL or PASS
+        """
+        pass
+
+    @abstractmethod
+    def choose_batch(self, enemy, player, rng: np.random.Generator) -> np.ndarray:
+        """
+        Choose the enemy action in every battle
+
+        :param enemy: Enemy side arrays
+        :param player: Player side arrays
+        :param rng: Random generator of the battles
+        :return: Array of indices into ACTIONS
+        """
+        pass
+
+
+def get_available_actions(side) -> np.ndarray:
+    """
+    Get the actions the enemy can perform in every battle, passing is always possible
+
+    :param side: Enemy side arrays
+    :return: Boolean array of shape (battles, 3) in the order of ACTIONS
+    """
+    stamina: np.ndarray = np.round(side.stamina, 1)
+
+    return np.stack([stamina > side.stamina_per_hit,
+                     ~side.is_skill_used & (stamina >= side.skill_stamina),
+                     np.ones(len(stamina), dtype=bool)], axis=1)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create random policy, the original enemy behaviour
+class RandomSkillPolicy(EnemyPolicy):
+    """
+    Uses the skill with a 10% chance while it is available and hits otherwise
+    """
+    name: str = DEFAULT_POLICY
+
+    def choose(self, enemy: BaseUnit, target: BaseUnit) -> str:
+        if not enemy._is_skill_used and enemy.stamina >= enemy.unit_class.skill.stamina \
+                and enemy.rng.randint(0, SKILL_ROLL_RANGE - 1) < SKILL_ROLL_THRESHOLD:
+            return SKILL
+        return HIT
+
+    def choose_batch(self, enemy, player, rng: np.random.Generator) -> np.ndarray:
+        skill: np.ndarray = ~enemy.is_skill_used & (np.round(enemy.stamina, 1) >= enemy.skill_stamina) \
+            & (rng.integers(0, SKILL_ROLL_RANGE, len(enemy.stamina)) < SKILL_ROLL_THRESHOLD)
+        return np.where(skill, SKILL_INDEX, HIT_INDEX)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create policy registry. The searching policies run on the vectorized engine, which imports the models,
+# so they are registered by importing their module on the first lookup of a name that is not registered yet
+_policies: Dict[str, EnemyPolicy] = {}
+ENGINE_POLICIES_MODULE: str = "application.simulation.policies"
+
+
+def register_policy(policy: EnemyPolicy) -> EnemyPolicy:
+    """
+    Make the policy available by its name to the hero choosing form and to battle replays
+
+    :param policy: Policy instance
+    :return: The same policy
+    """
+    _policies[policy.name] = policy
+    return policy
+
+
+def get_policy(name: str) -> EnemyPolicy:
+    """
+    Get the registered policy
+
+    :param name: Policy name
+    :return: Policy instance
+    """
+    if name not in _policies:
+        importlib.import_module(ENGINE_POLICIES_MODULE)
+    if name not in _policies:
+        raise ValueError(f"Unknown enemy policy: {name}")
+    return _policies[name]
+
+
+def get_policy_names() -> Tuple[str, ...]:
+    importlib.import_module(ENGINE_POLICIES_MODULE)
+    return tuple(_policies)
+
+
+default_policy: EnemyPolicy = register_policy(RandomSkillPolicy())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create player policies, they play the player side of Arena.auto_battle
+class PlayerPolicy(ABC):
+    """
+    Decides what the player does on its turn when the server plays the battle
+    """
+    name: str = ""
+
+    @abstractmethod
+    def choose(self, player: BaseUnit, enemy: BaseUnit) -> str:
+        """
+        Choose the action of the player unit
+
+        :param player: Acting player unit
+        :param enemy: Enemy unit
+        :return: HIT, SKILL or PASS
+        """
+        pass
+
+
+def is_skill_affordable(unit: BaseUnit) -> bool:
+    return not unit._is_skill_used and unit.unit_class.skill.is_stamina_enough(unit.stamina)
+
+
+class AlwaysHitPolicy(PlayerPolicy):
+    """
+    Hits on every turn, the same as clicking the hit button
+    """
+    name: str = "hit"
+
+    def choose(self, player: BaseUnit, enemy: BaseUnit) -> str:
+        return HIT
+
+
+class SkillWhenAffordablePolicy(PlayerPolicy):
+    """
+    Uses the skill as soon as there is stamina for it and hits otherwise
+    """
+    name: str = "skill"
+
+    def choose(self, player: BaseUnit, enemy: BaseUnit) -> str:
+        return SKILL if is_skill_affordable(player) else HIT
+
+
+class ConserveStaminaPolicy(PlayerPolicy):
+    """
+    Uses the skill when there is stamina for it, passes while the stamina is too low for a hit and hits otherwise
+    """
+    name: str = "conserve"
+
+    def choose(self, player: BaseUnit, enemy: BaseUnit) -> str:
+        if is_skill_affordable(player):
+            return SKILL
+        if player.stamina <= player.weapon.stamina_per_hit:
+            return PASS
+        return HIT
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create player policy registry
+_player_policies: Dict[str, PlayerPolicy] = {}
+
+
+def register_player_policy(policy: PlayerPolicy) -> PlayerPolicy:
+    """
+    Make the player policy available by its name to the auto battle endpoint
+
+    :param policy: Policy instance
+    :return: The same policy
+    """
+    _player_policies[policy.name] = policy
+    return policy
+
+
+def get_player_policy(name: str) -> PlayerPolicy:
+    """
+    Get the registered player policy
+
+    :param name: Policy name
+    :return: Policy instance
+    """
+    if name not in _player_policies:
+        raise ValueError(f"Unknown player policy: {name}")
+    return _player_policies[name]
+
+
+def get_player_policy_names() -> Tuple[str, ...]:
+    return tuple(_player_policies)
+
+
+default_player_policy: PlayerPolicy = register_player_policy(AlwaysHitPolicy())
+register_player_policy(SkillWhenAffordablePolicy())
+register_player_policy(ConserveStaminaPolicy())
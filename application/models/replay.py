@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Player action codes
+HIT: str = "h"
+SKILL: str = "s"
+PASS: str = "p"
+
+# Enemy policy of battles recorded without one
+DEFAULT_POLICY: str = "random"
+
+# Unit configuration: name, unit class name, weapon id, armor id
+UnitConfig = Tuple[str, str, int, int]
+
+# Run of the compressed action string: optional repeat count and action code
+ACTION_RUN = re.compile(r"(\d*)(\D)")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create action compression
+def compress_actions(actions: Sequence[str]) -> str:
+    """
+    Run-length encode the action codes, runs longer than one action are prefixed with their length
+
+    :param actions: Action codes in order
+    :return: Compressed string, for example "12hs3p"
+    """
+    runs: List[str] = []
+    index: int = 0
+
+    while index < len(actions):
+        end: int = index + 1
+        while end < len(actions) and actions[end] == actions[index]:
+            end += 1
+        runs.append(f"{end - index}{actions[index]}" if end - index > 1 else actions[index])
+        index = end
+
+    return "".join(runs)
+
+
+def decompress_actions(data: str) -> List[str]:
+    """
+    Decode the action string made by compress_actions, plain action strings are returned as they are
+
+    :param data: Compressed or plain action string
+    :return: Action codes in order
+    """
+    if not any(character.isdigit() for character in data):
+        return list(data)
+
+    actions: List[str] = []
+    position: int = 0
+    for run in ACTION_RUN.finditer(data):
+        if run.start() != position:
+            break
+        actions.extend(run[2] * int(run[1] or 1))
+        position = run.end()
+
+    if position != len(data):
+        raise ValueError("Invalid battle log")
+
+    return actions
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create battle log dataclass
+@dataclass(slots=True)
+class BattleLog:
+    """
+    Append-only record of a battle, enough to replay it bit-for-bit \n
+    seed: Seed of the battle random generator \n
+    player: Configuration of the player unit \n
+    enemy: Configuration of the enemy unit \n
+    actions: Player action codes in order \n
+    policy: Name of the enemy policy
+    """
+    seed: int
+    player: UnitConfig
+    enemy: UnitConfig
+    actions: List[str] = field(default_factory=list)
+    policy: str = DEFAULT_POLICY
+
+    def append(self, action: str) -> None:
+        """
+        Record a player action
+
+        :param action: Action code
+        :return: None
+        """
+        self.actions.append(action)
+
+    def to_dict(self, compress: bool = False) -> dict:
+        """
+        Convert the log to a JSON-compatible dict with actions joined into one string
+
+        :param compress: Run-length encode the actions
+        :return: Log dict
+        """
+        actions: str = compress_actions(self.actions) if compress else "".join(self.actions)
+        return {"seed": self.seed, "player": self.player, "enemy": self.enemy, "actions": actions,
+                "policy": self.policy}
+
+    @classmethod
+    def from_dict(cls, log: dict) -> BattleLog:
+        """
+        Create the log from a dict made by to_dict
+
+        :param log: Log dict
+        :return: Battle log
+        """
+        try:
+            return cls(seed=int(log["seed"]),
+                       player=tuple(log["player"]),
+                       enemy=tuple(log["enemy"]),
+                       actions=decompress_actions(log["actions"]),
+                       policy=str(log.get("policy", DEFAULT_POLICY)))
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid battle log")
+
+    def dumps(self) -> str:
+        """
+        Serialize the log to compact JSON
+
+        :return: JSON string
+        """
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, data: str) -> BattleLog:
+        """
+        Deserialize the log from JSON
+
+        :param data: JSON string
+        :return: Battle log
+        """
+        try:
+            log: dict = json.loads(data)
+        except ValueError:
+            raise ValueError("Invalid battle log")
+
+        return cls.from_dict(log)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import secrets
+from typing import Optional
+
+# ----------------------------------------------------------------------------------------------------------------------
+# SplitMix64 constants, the n-th draw of a seed is the mix of seed + n * GOLDEN_GAMMA
+MASK: int = (1 << 64) - 1
+GOLDEN_GAMMA: int = 0x9E3779B97F4A7C15
+FLOAT_SCALE: float = 2.0 ** -53
+
+
+def _mix(value: int) -> int:
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create battle random generator class
+class BattleRandom:
+    """
+    Counter-based random generator of a battle. Its whole state is the seed and the number of draws,
+    so a live battle keeps two integers instead of the 2.5 KB state of random.Random,
+    and any point of the battle is restored from the seed and the draw counter
+    """
+    __slots__ = ("seed", "draws")
+
+    def __init__(self, seed: Optional[int] = None, draws: int = 0):
+        """
+        Initialize generator
+
+        :param seed: Seed of the battle, a random one is used if not given
+        :param draws: Number of values already drawn
+        """
+        self.seed: int = (secrets.randbits(64) if seed is None else seed) & MASK
+        self.draws: int = draws
+
+    def random(self) -> float:
+        """
+        Draw the next value
+
+        :return: Float in [0, 1)
+        """
+        self.draws += 1
+        return (_mix((self.seed + self.draws * GOLDEN_GAMMA) & MASK) >> 11) * FLOAT_SCALE
+
+    def uniform(self, low: float, high: float) -> float:
+        return low + (high - low) * self.random()
+
+    def randint(self, low: int, high: int) -> int:
+        """
+        Draw an integer
+
+        :param low: Smallest value
+        :param high: Largest value, inclusive like random.randint
+        :return: Integer in [low, high]
+        """
+        return low + int(self.random() * (high - low + 1))
@@ -1,67 +1,215 @@
 from __future__ import annotations
 
-from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import marshmallow
+import marshmallow_dataclass
+import numpy as np
+
+from application.models.effects import StatusEffect, TARGET_STATUSES, USER_STATUSES
 
 if TYPE_CHECKING:
     from application.models.unit import BaseUnit
 
+# Default location of the skill catalog, can be overridden with the SKILLS_PATH environment variable
+SKILLS_PATH: Path = Path(__file__).resolve().parent.parent / "data" / "skills.json"
+
+DEFAULT_MESSAGE: str = "{user} использует {skill} и наносит {damage} урона."
+
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create abstract skill class
-class Skill(ABC):
+# Create dataclasses for skill data
+@dataclass(frozen=True, slots=True)
+class EffectData:
     """
-    Abstract base class for skills
+    Class representing one effect of a skill in the skill file \n
+    type: One of the EFFECTS keys or a status effect kind \n
+    amount: Strength of the effect \n
+    duration: Number of turns a status effect lasts
     """
-    user = None
-    target = None
+    type: str
+    amount: float
+    duration: int = 0
 
-    @property
-    @abstractmethod
-    def name(self) -> str:
-        """
-        Get the name of the skill
+    class Meta:
+        unknown = marshmallow.EXCLUDE
 
-        :return: Name of the skill
-        """
-        pass
 
-    @property
-    @abstractmethod
-    def stamina(self) -> float:
-        """
-        Get the stamina cost of using the skill
+@dataclass(frozen=True, slots=True)
+class SkillData:
+    """
+    Class representing a skill in the skill file \n
+    id: The id of the skill \n
+    name: The name of the skill \n
+    stamina: The stamina cost of using the skill \n
+    effects: Effects applied in the given order \n
+    message: Result message, formatted with user, skill, damage and heal
+    """
+    id: int
+    name: str
+    stamina: float
+    effects: List[EffectData]
+    message: str = DEFAULT_MESSAGE
 
-        :return: Stamina cost of using the skill
-        """
-        pass
+    class Meta:
+        unknown = marshmallow.EXCLUDE
 
-    @property
-    @abstractmethod
-    def damage(self) -> float:
-        """
-        Get the damage caused by the skill
 
-        :return: Damage caused by the skill
-        """
-        pass
+@dataclass
+class SkillsData:
+    """
+    Class representing the data of the skill file \n
+    skills: A list of the skills
+    """
+    skills: List[SkillData]
 
-    @abstractmethod
-    def skill_effect(self) -> str:
-        """
-        Get the effect of using the skill
 
-        :return: Effect of using the skill
-        """
-        pass
+class SkillState(NamedTuple):
+    """
+    Battle state a skill reads and changes, either numbers of one battle or arrays with one element per battle \n
+    user_hp: HP of the skill user \n
+    user_stamina: Stamina of the skill user \n
+    user_max_health: Maximum HP of the skill user \n
+    user_max_stamina: Maximum stamina of the skill user \n
+    target_hp: HP of the target \n
+    target_stamina: Stamina of the target
+    """
+    user_hp: float | np.ndarray
+    user_stamina: float | np.ndarray
+    user_max_health: float | np.ndarray
+    user_max_stamina: float | np.ndarray
+    target_hp: float | np.ndarray
+    target_stamina: float | np.ndarray
+
+
+Effect = Callable[[SkillState], SkillState]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create effect compilers, every compiled effect is a pure function of the state.
+# Fields an effect does not change are returned as the same objects
+def _clip(value: float | np.ndarray, low: float | np.ndarray, high: float | np.ndarray) -> float | np.ndarray:
+    if isinstance(value, np.ndarray):
+        return np.clip(value, low, high)
+    return min(max(value, low), high)
+
+
+def _damage(amount: float) -> Effect:
+    """
+    Damage not reduced by armor, the target HP may drop below zero until the battle end check
+    """
+    def effect(state: SkillState) -> SkillState:
+        return state._replace(target_hp=state.target_hp - amount)
+    return effect
+
+
+def _stamina_damage(amount: float) -> Effect:
+    def effect(state: SkillState) -> SkillState:
+        return state._replace(target_stamina=_clip(state.target_stamina - amount, 0, np.inf))
+    return effect
+
+
+def _heal(amount: float) -> Effect:
+    def effect(state: SkillState) -> SkillState:
+        return state._replace(user_hp=_clip(state.user_hp + amount, 0, state.user_max_health))
+    return effect
+
+
+def _restore_stamina(amount: float) -> Effect:
+    def effect(state: SkillState) -> SkillState:
+        return state._replace(user_stamina=_clip(state.user_stamina + amount, 0, state.user_max_stamina))
+    return effect
+
+
+EFFECTS: Dict[str, Callable[[float], Effect]] = {
+    "damage": _damage,
+    "stamina_damage": _stamina_damage,
+    "heal": _heal,
+    "restore_stamina": _restore_stamina,
+}
+
 
-    def _is_stamina_enough(self) -> bool:
+def compile_skill(data: SkillData) -> Skill:
+    """
+    Compile the effects of the skill into one function, the stamina cost is paid before the effects
+
+    :param data: Skill data
+    :return: Skill object
+    """
+    cost: float = data.stamina
+    effects: List[Effect] = []
+    user_statuses: List[StatusEffect] = []
+    target_statuses: List[StatusEffect] = []
+    for effect in data.effects:
+        if effect.type in EFFECTS:
+            effects.append(EFFECTS[effect.type](effect.amount))
+        elif effect.type in USER_STATUSES + TARGET_STATUSES:
+            if effect.duration < 1:
+                raise ValueError(f"Status effect {effect.type} of {data.name} needs a positive duration")
+            statuses: List[StatusEffect] = user_statuses if effect.type in USER_STATUSES else target_statuses
+            statuses.append(StatusEffect(kind=effect.type, amount=effect.amount, duration=effect.duration))
+        else:
+            raise ValueError(f"Unknown skill effect: {effect.type}")
+
+    def apply(state: SkillState) -> SkillState:
+        state = state._replace(user_stamina=state.user_stamina - cost)
+        for compiled_effect in effects:
+            state = compiled_effect(state)
+        return state
+
+    return Skill(id=data.id,
+                 name=data.name,
+                 stamina=cost,
+                 damage=sum(effect.amount for effect in data.effects if effect.type == "damage"),
+                 heal=sum(effect.amount for effect in data.effects if effect.type == "heal"),
+                 message=data.message,
+                 apply=apply,
+                 user_statuses=tuple(user_statuses),
+                 target_statuses=tuple(target_statuses))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create skill class
+@dataclass(frozen=True, slots=True, eq=False)
+class Skill:
+    """
+    Class representing a compiled skill. It keeps no battle state, one object is shared by every battle and thread \n
+    id: The id of the skill \n
+    name: The name of the skill \n
+    stamina: The stamina cost of using the skill \n
+    damage: The damage caused by the skill \n
+    heal: The HP restored to the user by the skill \n
+    message: Result message template \n
+    apply: Pure function from the battle state before the skill to the state after it \n
+    user_statuses: Status effects started on the user \n
+    target_statuses: Status effects started on the target
+    """
+    id: int
+    name: str
+    stamina: float
+    damage: float
+    heal: float
+    message: str = field(repr=False)
+    apply: Callable[[SkillState], SkillState] = field(repr=False)
+    user_statuses: Tuple[StatusEffect, ...] = ()
+    target_statuses: Tuple[StatusEffect, ...] = ()
+
+    @property
+    def has_statuses(self) -> bool:
+        return bool(self.user_statuses or self.target_statuses)
+
+    def is_stamina_enough(self, stamina: float) -> bool:
         """
-        Check if user has enough stamina to use the skill
+        Check if the user has enough stamina to use the skill
 
+        :param stamina: Stamina of the user
         :return: True if user has enough stamina, False otherwise
         """
-        return self.user.stamina >= self.stamina
+        return stamina >= self.stamina
 
     def use(self, user: BaseUnit, target: BaseUnit) -> str:
         """
@@ -71,44 +219,99 @@ class Skill(ABC):
         :param target: The target of the skill
         :return: Result of using the skill
         """
-        self.user = user
-        self.target = target
+        if not self.is_stamina_enough(user.stamina):
+            return f"{user.name} попытался использовать {self.name}, но у него не хватило выносливости."
+        if self.has_statuses and (user.status is None or target.status is None):
+            raise ValueError(f"{self.name} starts status effects, it can only be used in a battle")
+
+        state: SkillState = SkillState(user_hp=user.hp, user_stamina=user.stamina,
+                                       user_max_health=user.unit_class.max_health,
+                                       user_max_stamina=user.unit_class.max_stamina,
+                                       target_hp=target.hp, target_stamina=target.stamina)
+        result: SkillState = self.apply(state)
+
+        # Only the changed values are written back, the others keep their unrounded values
+        if result.user_hp is not state.user_hp:
+            user.hp = result.user_hp
+        if result.user_stamina is not state.user_stamina:
+            user.stamina = result.user_stamina
+        if result.target_hp is not state.target_hp:
+            target.hp = state.target_hp - target.absorb(state.target_hp - result.target_hp) \
+                if target.status is not None and target.status.shield else result.target_hp
+        if result.target_stamina is not state.target_stamina:
+            target.stamina = result.target_stamina
 
-        if self._is_stamina_enough:
-            return self.skill_effect()
-        return f"{self.user.name} попытался использовать {self.name}, но у него не хватило выносливости."
+        for effect in self.user_statuses:
+            user.status.add(effect)
+        for effect in self.target_statuses:
+            target.status.add(effect)
+
+        return self.message.format(user=user.name, skill=self.name, damage=self.damage, heal=self.heal)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create skills
-class FuryPunch(Skill):
-    name: str = "Свирепый пинок"
-    stamina: float = 6.0
-    damage: float = 12.0
-
-    def skill_effect(self):
-        self.user.stamina -= self.stamina
-        self.target.hp -= self.damage
-        return f"{self.user.name} использует {self.name} и наносит {self.damage} урона."
-
-
-class HardShot(Skill):
-    name: str = "Мощный укол"
-    stamina: float = 5.0
-    damage: float = 15.0
-
-    def skill_effect(self):
-        self.user.stamina -= self.stamina
-        self.target.hp -= self.damage
-        return f"{self.user.name} использует {self.name} и наносит {self.damage} урона."
-
-
-class FireballShot(Skill):
-    name: str = "Метеоритный удар"
-    stamina: float = 15.0
-    damage: float = 30.0
-
-    def skill_effect(self):
-        self.user.stamina -= self.stamina
-        self.target.hp -= self.damage
-        return f"{self.user.name} использует {self.name} и наносит {self.damage} урона."
+# Create skill registry
+class SkillRegistry:
+    """
+    Compiled skills with name and id indexes
+    """
+
+    def __init__(self, skills: Sequence[Skill]):
+        self._skills: Dict[str, Skill] = {skill.name: skill for skill in skills}
+        self._skills_by_id: Dict[int, Skill] = {skill.id: skill for skill in skills}
+
+        if len(self._skills) != len(skills) or len(self._skills_by_id) != len(skills):
+            raise ValueError("Invalid skill data: duplicate names or ids")
+
+    def __len__(self) -> int:
+        return len(self._skills)
+
+    def get(self, skill_name: str) -> Skill:
+        """
+        Return skill object by name
+
+        :param skill_name: Name of the skill
+        :return: Skill object
+        """
+        try:
+            return self._skills[skill_name]
+        except KeyError:
+            raise ValueError(f"Unknown skill: {skill_name}") from None
+
+    def get_by_id(self, skill_id: int) -> Skill:
+        """
+        Return skill object by id
+
+        :param skill_id: Id of the skill
+        :return: Skill object
+        """
+        try:
+            return self._skills_by_id[skill_id]
+        except KeyError:
+            raise ValueError(f"Unknown skill id: {skill_id}") from None
+
+    def get_names(self) -> Tuple[str, ...]:
+        return tuple(self._skills)
+
+
+def load_skills(path: Optional[str | Path] = None) -> SkillRegistry:
+    """
+    Load and compile the skills from json file
+
+    :param path: Path of the skill json file, defaults to SKILLS_PATH
+    :return: Skill registry
+    """
+    with open(path or os.environ.get("SKILLS_PATH") or SKILLS_PATH, encoding="utf-8") as skills_file:
+        try:
+            data = json.load(skills_file)
+        except json.JSONDecodeError:
+            raise ValueError("Invalid skill data")
+    try:
+        skills_data: SkillsData = marshmallow_dataclass.class_schema(SkillsData)().load(data)
+    except marshmallow.exceptions.ValidationError:
+        raise ValueError("Invalid skill data")
+
+    return SkillRegistry([compile_skill(skill) for skill in skills_data.skills])
+
+
+skills: SkillRegistry = load_skills()
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from application.models.base import Arena
+from application.models.effects import EffectScheduler
+from application.models.rng import BattleRandom
+from application.models.unit import BaseUnit
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Team battle settings
+SIDES: Tuple[str, str] = ("player", "enemy")
+
+# Targeting rules: the alive opponent with the lowest HP or the one with the highest mean hit damage
+LOWEST_HP: str = "lowest_hp"
+HIGHEST_THREAT: str = "highest_threat"
+TARGETING: Tuple[str, str] = (LOWEST_HP, HIGHEST_THREAT)
+
+# Heap entries of units whose HP changed are left in place, the heap is rebuilt when they outnumber the alive units
+STALE_ENTRIES_FACTOR: int = 2
+
+UnitRef = Tuple[str, int]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create squad class
+class Squad:
+    """
+    Units of one side of a team battle. The alive units are kept in a set and the targets in two lazy heaps,
+    by HP and by threat, so a unit is only looked at when it acts or is hit, never by a scan of the roster
+    """
+    __slots__ = ("units", "alive", "_hp", "_by_hp", "_by_threat")
+
+    def __init__(self, units: Sequence[BaseUnit]):
+        """
+        Index the units
+
+        :param units: Equipped units of the side
+        """
+        if not units:
+            raise ValueError("A squad needs at least one unit")
+
+        self.units: List[BaseUnit] = list(units)
+        self._hp: List[float] = [unit.hp for unit in self.units]
+        self.alive: Set[int] = {index for index, hp in enumerate(self._hp) if hp > 0}
+        self._by_hp: List[Tuple[float, int]] = [(self._hp[index], index) for index in self.alive]
+        # Threat does not change during the battle, its entries only go stale when the unit dies
+        self._by_threat: List[Tuple[float, int]] = [(-self.units[index].attack_profile.mean_damage, index)
+                                                    for index in self.alive]
+        heapq.heapify(self._by_hp)
+        heapq.heapify(self._by_threat)
+
+    def __len__(self) -> int:
+        return len(self.alive)
+
+    @property
+    def is_defeated(self) -> bool:
+        return not self.alive
+
+    def update(self, index: int) -> None:
+        """
+        Record the HP of the unit after it acted or was hit
+
+        :param index: Index of the unit in the squad
+        :return: None
+        """
+        hp: float = self.units[index].hp
+        if hp == self._hp[index] or index not in self.alive:
+            return
+
+        self._hp[index] = hp
+        if hp <= 0:
+            self.alive.discard(index)
+            return
+
+        heapq.heappush(self._by_hp, (hp, index))
+        if len(self._by_hp) > STALE_ENTRIES_FACTOR * (len(self.alive) + 1):
+            self._by_hp = [(self._hp[alive], alive) for alive in self.alive]
+            heapq.heapify(self._by_hp)
+
+    def get_lowest_hp(self) -> Optional[int]:
+        """
+        Get the alive unit with the lowest HP, the earlier unit on ties
+
+        :return: Index of the unit or None if the squad is defeated
+        """
+        heap: List[Tuple[float, int]] = self._by_hp
+        while heap:
+            hp, index = heap[0]
+            if index in self.alive and self._hp[index] == hp:
+                return index
+            heapq.heappop(heap)
+
+        return None
+
+    def get_highest_threat(self) -> Optional[int]:
+        """
+        Get the alive unit with the highest mean hit damage, the earlier unit on ties
+
+        :return: Index of the unit or None if the squad is defeated
+        """
+        heap: List[Tuple[float, int]] = self._by_threat
+        while heap:
+            if heap[0][1] in self.alive:
+                return heap[0][1]
+            heapq.heappop(heap)
+
+        return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create team arena class
+class TeamArena:
+    """
+    Battle of two squads. Units act one at a time, alternating between the sides, each alive unit once per round.
+    Every unit regenerates stamina and takes its status effects at the start of its own turn
+    """
+    __slots__ = ("squads", "targeting", "order", "position", "turns", "game_is_running", "battle_result", "rng",
+                 "effects", "_deaths")
+
+    def __init__(self, targeting: str = LOWEST_HP):
+        """
+        Initialize TeamArena with an empty battle
+
+        :param targeting: LOWEST_HP or HIGHEST_THREAT
+        """
+        if targeting not in TARGETING:
+            raise ValueError(f"Unknown targeting: {targeting}")
+
+        self.squads: Dict[str, Squad] = {}
+        self.targeting: str = targeting
+        self.order: List[UnitRef] = []
+        self.position: int = 0
+        self.turns: int = 0
+        self.game_is_running: bool = False
+        self.battle_result: str = ""
+        self.rng: Optional[BattleRandom] = None
+        self.effects: EffectScheduler = EffectScheduler()
+        self._deaths: bool = False
+
+    def start_game(self, players: Sequence[BaseUnit], enemies: Sequence[BaseUnit], seed: Optional[int] = None) -> None:
+        """
+        Set up both squads with a random generator of the battle and change game status
+
+        :param players: Units of the player side
+        :param enemies: Units of the enemy side
+        :param seed: Seed of the battle random generator, a random one is used if not given
+        :return: None
+        """
+        self.rng = BattleRandom(seed)
+        self.effects = EffectScheduler()
+        for unit in (*players, *enemies):
+            unit.rng = self.rng
+            unit.status = self.effects.track()
+
+        self.squads = {SIDES[0]: Squad(players), SIDES[1]: Squad(enemies)}
+        self.order = [(side, index) for index in range(max(len(players), len(enemies))) for side in SIDES
+                      if index < len(self.squads[side].units)]
+        self.position = 0
+        self.turns = 0
+        self.game_is_running = True
+        self.battle_result = ""
+        self._deaths = False
+
+    def get_unit(self, ref: UnitRef) -> BaseUnit:
+        side, index = ref
+        return self.squads[side].units[index]
+
+    def get_target(self, side: str) -> Optional[UnitRef]:
+        """
+        Choose the target of a unit of the side by the targeting rule
+
+        :param side: Side of the acting unit
+        :return: Opponent reference or None if the opponents are defeated
+        """
+        opponent: str = SIDES[1] if side == SIDES[0] else SIDES[0]
+        squad: Squad = self.squads[opponent]
+        index: Optional[int] = squad.get_lowest_hp() if self.targeting == LOWEST_HP else squad.get_highest_threat()
+
+        return None if index is None else (opponent, index)
+
+    def play_turn(self) -> str:
+        """
+        Let the next alive unit act on its target
+
+        :return: Turn result or battle result
+        """
+        if not self.game_is_running:
+            return self.battle_result
+
+        ref: UnitRef = self._next_actor()
+        side, index = ref
+        unit: BaseUnit = self.get_unit(ref)
+        self.turns += 1
+
+        Arena.regenerate_stamina(unit)
+        results: List[str] = []
+        if self.effects:
+            Arena.apply_unit_effects(unit, results)
+            self._update(ref)
+
+        if unit.hp > 0:
+            target_ref: Optional[UnitRef] = self.get_target(side)
+            if target_ref is not None:
+                target: BaseUnit = self.get_unit(target_ref)
+                results.append(Arena.get_stun_result(unit) or unit.hit(target))
+                self._update(ref)
+                self._update(target_ref)
+
+        self.position += 1
+        battle_result: Optional[str] = self._check_squads()
+        if battle_result:
+            results.append(battle_result)
+
+        return "\n".join(results)
+
+    def play(self, max_turns: int = 100000) -> str:
+        """
+        Play the battle to the end
+
+        :param max_turns: Maximum number of unit turns
+        :return: Battle result, empty if the battle did not end in max_turns
+        """
+        for _ in range(max_turns):
+            if not self.game_is_running:
+                break
+            self.play_turn()
+
+        return self.battle_result
+
+    def _next_actor(self) -> UnitRef:
+        """
+        Skip the units that died since the order was built. At the end of the round advance the effect clock,
+        so effects last their duration in rounds, expire them and drop the dead units from the order
+
+        :return: Reference of the acting unit
+        """
+        while True:
+            if self.position >= len(self.order):
+                self.effects.advance()
+                self.effects.expire()
+                if self._deaths:
+                    self.order = [ref for ref in self.order if ref[1] in self.squads[ref[0]].alive]
+                    self._deaths = False
+                self.position = 0
+
+            ref: UnitRef = self.order[self.position]
+            if ref[1] in self.squads[ref[0]].alive:
+                return ref
+            self.position += 1
+
+    def _update(self, ref: UnitRef) -> None:
+        squad: Squad = self.squads[ref[0]]
+        alive: int = len(squad)
+        squad.update(ref[1])
+        self._deaths = self._deaths or len(squad) < alive
+
+    def _check_squads(self) -> Optional[str]:
+        """
+        End the game if a squad is defeated, the alive sets make it a constant time check
+
+        :return: Battle result or None
+        """
+        player, enemy = self.squads[SIDES[0]], self.squads[SIDES[1]]
+        if not player.is_defeated and not enemy.is_defeated:
+            return None
+
+        if player.is_defeated and enemy.is_defeated:
+            self.battle_result = "Ничья."
+        elif enemy.is_defeated:
+            self.battle_result = "Игрок выиграл битву."
+        else:
+            self.battle_result = "Игрок проиграл битву."
+
+        self.game_is_running = False
+        return self.battle_result
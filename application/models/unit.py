@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-import random
 from abc import ABC, abstractmethod
 from typing import Optional
 
+from application.metrics import timed
 from application.models.classes import UnitClass
+from application.models.effects import UnitStatus
 from application.models.equipment import Weapon, Armor
+from application.models.matchups import AttackProfile, DefenceProfile, get_attack_profile, get_defence_profile
+from application.models.policies import EnemyPolicy, default_policy, HIT, SKILL, PASS
+from application.models.rng import BattleRandom
+
+# Random generator of units which do not take part in an arena battle
+_default_rng: BattleRandom = BattleRandom()
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -14,6 +21,9 @@ class BaseUnit(ABC):
     """
     Base unit class
     """
+    __slots__ = ("name", "unit_class", "_hp", "_stamina", "weapon", "armor", "attack_profile", "defence_profile",
+                 "_is_skill_used", "rng", "status", "last_action", "armor_absorbed")
+
     def __init__(self, name: str, unit_class: UnitClass):
         """
         Initialize Unit class using UnitClass properties
@@ -24,7 +34,15 @@ class BaseUnit(ABC):
         self._stamina: float = unit_class.max_stamina
         self.weapon = None
         self.armor = None
+        self.attack_profile: Optional[AttackProfile] = None
+        self.defence_profile: Optional[DefenceProfile] = None
         self._is_skill_used: bool = False
+        self.rng: BattleRandom = _default_rng
+        # Totals of the status effects, set by the arena when the battle starts
+        self.status: Optional[UnitStatus] = None
+        # Outcome of the last action, read by the arena for the structured turn events
+        self.last_action: str = ""
+        self.armor_absorbed: float = 0.0
 
     @property
     def hp(self) -> float:
@@ -72,6 +90,7 @@ class BaseUnit(ABC):
         :return: Weapon equipped successfully
         """
         self.weapon = weapon
+        self.attack_profile = get_attack_profile(self.unit_class, weapon)
         return f"{self.name} экипирован оружием {self.weapon.name}"
 
     def equip_armor(self, armor: Armor) -> str:
@@ -82,6 +101,7 @@ class BaseUnit(ABC):
         :return: Armor equipped successfully
         """
         self.armor = armor
+        self.defence_profile = get_defence_profile(self.unit_class, armor)
         return f"{self.name} экипирован броней {self.armor.name}"
 
     def _count_damage(self, target: BaseUnit) -> float:
@@ -91,13 +111,14 @@ class BaseUnit(ABC):
         :param target: The unit that is being attacked
         :return: The damage dealt by the attacking unit to the target unit
         """
-        attack_damage: float = random.uniform(self.weapon.min_damage, self.weapon.max_damage) * self.unit_class.attack
-        target_defense: float = target.armor.defence * target.unit_class.armor
+        attack_damage: float = self.weapon.roll_damage(self.rng) * self.attack_profile.attack
+        target_defense: float = target.defence_profile.defence
 
         if target_defense < attack_damage:
             if target.stamina > target.armor.stamina_per_turn:
                 damage: float = attack_damage - target_defense
                 target.stamina -= self.armor.stamina_per_turn
+                self.armor_absorbed = round(target_defense, 1)
             else:
                 damage = attack_damage
             damage = round(damage, 1)
@@ -105,6 +126,7 @@ class BaseUnit(ABC):
             target.get_damage(damage)
         else:
             damage = 0.0
+            self.armor_absorbed = round(attack_damage, 1)
 
         return damage
 
@@ -115,6 +137,7 @@ class BaseUnit(ABC):
         :param damage: Input damage
         :return: New HP or None
         """
+        damage = self.absorb(damage)
         if damage > 0:
             self.hp: float = self.hp - damage
             if self.hp < 0:
@@ -122,6 +145,45 @@ class BaseUnit(ABC):
             return self.hp
         return None
 
+    def get_state(self) -> list:
+        """
+        Get the state the unit changes during a battle
+
+        :return: Unrounded HP, unrounded stamina and whether the skill is used
+        """
+        return [self._hp, self._stamina, self._is_skill_used]
+
+    def set_state(self, state: list) -> None:
+        """
+        Restore the state saved by get_state
+
+        :param state: Unit state
+        :return: None
+        """
+        hp, stamina, is_skill_used = state
+        self._hp, self._stamina, self._is_skill_used = float(hp), float(stamina), bool(is_skill_used)
+
+    def record_action(self, action: str) -> None:
+        """
+        Start the record of the action the unit takes on its turn
+
+        :param action: HIT, SKILL, PASS or STUN when the unit is stunned
+        :return: None
+        """
+        self.last_action = action
+        self.armor_absorbed = 0.0
+
+    def absorb(self, damage: float) -> float:
+        """
+        Take the damage from the shields of the unit
+
+        :param damage: Incoming damage
+        :return: Damage left after the shields
+        """
+        if self.status is None or not self.status.shield or damage <= 0:
+            return damage
+        return self.status.absorb(damage)
+
     @abstractmethod
     def hit(self, target: BaseUnit) -> str:
         """
@@ -129,6 +191,7 @@ class BaseUnit(ABC):
         """
         pass
 
+    @timed("arena_phase_duration_seconds", phase="use_skill")
     def use_skill(self, target: BaseUnit) -> str:
         """
         Use the skill of the unit
@@ -136,11 +199,14 @@ class BaseUnit(ABC):
         :param target: The target of the skill
         :return: A message indicating if the skill was used or not
         """
+        self.record_action(SKILL)
         if self._is_skill_used:
             return f"Навык использован."
-        else:
+
+        # A skill that failed for lack of stamina can be tried again
+        if self.unit_class.skill.is_stamina_enough(self.stamina):
             self._is_skill_used = True
-            return self.unit_class.skill.use(user=self, target=target)
+        return self.unit_class.skill.use(user=self, target=target)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -149,6 +215,8 @@ class PlayerUnit(BaseUnit):
     """
     A player unit class
     """
+    __slots__ = ()
+
     def hit(self, target: BaseUnit) -> str:
         """
         Hits the target unit with weapon and calculates damage based on target's armor
@@ -156,6 +224,7 @@ class PlayerUnit(BaseUnit):
         :param target: Target unit to hit
         :return: Message indicating result of the hit
         """
+        self.record_action(HIT)
         if self.stamina > self.weapon.stamina_per_hit:
             damage: float = self._count_damage(target)
 
@@ -169,19 +238,32 @@ class PlayerUnit(BaseUnit):
 
 class EnemyUnit(BaseUnit):
     """
-    An enemy unit class
+    An enemy unit class, its policy decides what it does on its turn
     """
+    __slots__ = ("policy",)
+
+    def __init__(self, name: str, unit_class: UnitClass, policy: Optional[EnemyPolicy] = None):
+        super().__init__(name, unit_class)
+        self.policy: EnemyPolicy = policy or default_policy
+
     def hit(self, target: BaseUnit) -> str:
         """
-        Hits the target unit with weapon and/or skill and calculates damage based on target's armor
+        Hits the target unit with weapon, uses the skill or passes as the policy decides,
+        and calculates damage based on target's armor
 
         :param target: Target unit to hit
         :return: Message indicating result of the hit
         """
-        if not self._is_skill_used and self.stamina >= self.unit_class.skill.stamina and random.randint(0, 100) < 10:
+        action: str = self.policy.choose(self, target)
+        self.record_action(action)
+
+        if action == SKILL:
             return self.use_skill(target)
 
         if self.stamina > self.weapon.stamina_per_hit:
+            if action == PASS:
+                return f"{self.name} пропускает ход."
+
             damage: float = self._count_damage(target)
 
             if damage == 0.0:
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from jinja2 import FileSystemBytecodeCache
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Page cache settings
+# Folder of compiled templates shared by workers and restarts, the system temp folder is used if not set
+TEMPLATE_CACHE_DIR: Optional[str] = os.environ.get("TEMPLATE_CACHE_DIR")
+
+PageKey = Tuple[str, int]
+
+
+def create_bytecode_cache(is_async: bool = False) -> FileSystemBytecodeCache:
+    """
+    Create the cache of compiled templates, so a worker loads bytecode instead of compiling templates.
+    Templates compiled for async rendering differ from the sync ones, so the Quart application keeps its own files
+
+    :param is_async: True for the environment of the Quart application
+    :return: Jinja bytecode cache
+    """
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+    return FileSystemBytecodeCache(TEMPLATE_CACHE_DIR, pattern=f"__skywars_{'async' if is_async else 'sync'}_%s.cache")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create page cache classes
+@dataclass(frozen=True, slots=True)
+class Page:
+    """
+    Class representing a rendered page \n
+    body: Rendered HTML encoded to UTF-8 \n
+    etag: Hash of the body, the same in every worker rendering the same content
+    """
+    body: bytes
+    etag: str
+
+
+class PageCache:
+    """
+    Rendered pages that are the same for every user, keyed by template name and catalog version.
+    A new catalog version replaces the pages of the previous one
+    """
+
+    def __init__(self):
+        self._pages: Dict[PageKey, Page] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, template_name: str, version: int) -> Optional[Page]:
+        """
+        Get the rendered page
+
+        :param template_name: Template name
+        :param version: Catalog version the page was rendered with
+        :return: Page or None if it is not rendered yet
+        """
+        return self._pages.get((template_name, version))
+
+    def put(self, template_name: str, version: int, html: str) -> Page:
+        """
+        Store the rendered page, dropping the pages of the template rendered with other catalog versions
+
+        :param template_name: Template name
+        :param version: Catalog version the page was rendered with
+        :param html: Rendered page
+        :return: Page
+        """
+        body: bytes = html.encode("utf-8")
+        page: Page = Page(body=body, etag=hashlib.sha1(body).hexdigest()[:20])
+
+        with self._lock:
+            for key in [key for key in self._pages if key[0] == template_name and key[1] != version]:
+                del self._pages[key]
+            self._pages[(template_name, version)] = page
+
+        return page
+
+
+pages: PageCache = PageCache()
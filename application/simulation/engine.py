@@ -0,0 +1,584 @@
+from __future__ import annotations
+
+import copy
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from application.models.base import Arena
+from application.models.classes import UnitClass
+from application.models.effects import DOT, REGEN, SHIELD, STUN
+from application.models.equipment import Weapon, Armor
+from application.models.matchups import get_attack_profile, get_defence_profile
+from application.models.policies import EnemyPolicy, default_policy, HIT_INDEX, SKILL_INDEX
+from application.models.effects import StatusEffect
+from application.models.skills import Skill, SkillState
+from application.models.unit import BaseUnit, PlayerUnit, EnemyUnit
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Battle outcome codes
+RUNNING: int = 0
+WIN: int = 1
+DRAW: int = 2
+LOSS: int = 3
+TIMEOUT: int = 4
+
+# Phases of a round of the effect clock. The clock of a round is advanced before the status effects act,
+# effects expire after the enemy action and the player acts on the next round before the clock moves again.
+# A point in the battle is clock * PHASES + phase, so the effects started before it and not expired are active
+PHASES: int = 4
+APPLY_PHASE: int = 0
+ENEMY_PHASE: int = 1
+EXPIRY_PHASE: int = 2
+PLAYER_PHASE: int = 3
+
+# Status effect kinds by their index in the status arrays of a side, -1 pads skills with fewer effects
+STATUS_KINDS: Tuple[str, ...] = (DOT, STUN, SHIELD, REGEN)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create simulation dataclasses
+class Build(NamedTuple):
+    """
+    Hero configuration as built in choose_hero/choose_enemy \n
+    unit_class: Class of the unit \n
+    weapon: Equipped weapon \n
+    armor: Equipped armor
+    """
+    unit_class: UnitClass
+    weapon: Weapon
+    armor: Armor
+
+
+@dataclass
+class SimulationResult:
+    """
+    Class representing the outcome of a batch of battles \n
+    wins: Number of battles won by the player \n
+    draws: Number of draws \n
+    losses: Number of battles lost by the player \n
+    timeouts: Number of battles not finished in max_turns \n
+    turns: Length of every battle in player turns \n
+    outcomes: Outcome code of every battle
+    """
+    wins: int
+    draws: int
+    losses: int
+    timeouts: int
+    turns: np.ndarray = field(repr=False)
+    outcomes: np.ndarray = field(repr=False)
+
+    @property
+    def battles(self) -> int:
+        return self.wins + self.draws + self.losses + self.timeouts
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.battles if self.battles else 0.0
+
+    @property
+    def turn_histogram(self) -> np.ndarray:
+        """
+        Get the distribution of battle lengths, index is the number of turns
+
+        :return: Array with the number of battles per length
+        """
+        return np.bincount(self.turns)
+
+    def to_dict(self) -> dict:
+        return {"wins": self.wins,
+                "draws": self.draws,
+                "losses": self.losses,
+                "timeouts": self.timeouts,
+                "mean_turns": float(self.turns.mean()) if len(self.turns) else 0.0,
+                "turn_histogram": self.turn_histogram.tolist()}
+
+
+@dataclass
+class ParityReport:
+    """
+    Class representing the comparison of the vectorized engine with the object-based Arena \n
+    vectorized: Result of the vectorized engine \n
+    reference: Result of the object-based Arena \n
+    tolerance: Allowed difference of win/draw/loss rates \n
+    ok: True if both engines agree within the tolerance
+    """
+    vectorized: SimulationResult
+    reference: SimulationResult
+    tolerance: float
+    ok: bool
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create vectorized battle state
+class Side:
+    """
+    Arrays of static parameters and mutable state of one side in every battle, attack and defence are taken
+    from the same matchup profiles as the Arena units use. A skill is used once per battle, so its status effects
+    are found from the point it was used at instead of being kept on a heap like the EffectScheduler does
+    """
+
+    def __init__(self, builds: Sequence[Build]):
+        indices: Dict[Build, int] = {}
+        self.build_index: np.ndarray = np.array([indices.setdefault(build, len(indices)) for build in builds],
+                                                dtype=np.int64)
+        self.max_health: np.ndarray = np.array([build.unit_class.max_health for build in builds], dtype=float)
+        self.max_stamina: np.ndarray = np.array([build.unit_class.max_stamina for build in builds], dtype=float)
+        self.attack: np.ndarray = np.array([get_attack_profile(build.unit_class, build.weapon).attack
+                                            for build in builds], dtype=float)
+        self.skill_id: np.ndarray = np.array([build.unit_class.skill.id for build in builds], dtype=np.int64)
+        # Skills of the builds, a skill is applied through its position in the tuple
+        skill_indices: Dict[Skill, int] = {}
+        self.skill_index: np.ndarray = np.array([skill_indices.setdefault(build.unit_class.skill, len(skill_indices))
+                                                 for build in builds], dtype=np.int64)
+        self.skills: Tuple[Skill, ...] = tuple(skill_indices)
+        self.skill_stamina: np.ndarray = np.array([build.unit_class.skill.stamina for build in builds], dtype=float)
+        self.skill_damage: np.ndarray = np.array([build.unit_class.skill.damage for build in builds], dtype=float)
+        self.min_damage: np.ndarray = np.array([build.weapon.min_damage for build in builds], dtype=float)
+        self.max_damage: np.ndarray = np.array([build.weapon.max_damage for build in builds], dtype=float)
+        self.stamina_per_hit: np.ndarray = np.array([build.weapon.stamina_per_hit for build in builds], dtype=float)
+        self.defence: np.ndarray = np.array([get_defence_profile(build.unit_class, build.armor).defence
+                                             for build in builds], dtype=float)
+        self.stamina_per_turn: np.ndarray = np.array([build.armor.stamina_per_turn for build in builds], dtype=float)
+
+        # Status effects of the skill, one column per effect: kind index, amount and duration
+        statuses: List[Tuple[StatusEffect, ...]] = [skill.user_statuses + skill.target_statuses
+                                                    for skill in (build.unit_class.skill for build in builds)]
+        width: int = max(map(len, statuses), default=0)
+        self.status_kind: np.ndarray = np.full((len(builds), width), -1, dtype=np.int64)
+        self.status_amount: np.ndarray = np.zeros((len(builds), width), dtype=float)
+        self.status_duration: np.ndarray = np.zeros((len(builds), width), dtype=np.int64)
+        for row, effects in enumerate(statuses):
+            for column, effect in enumerate(effects):
+                self.status_kind[row, column] = STATUS_KINDS.index(effect.kind)
+                self.status_amount[row, column] = effect.amount
+                self.status_duration[row, column] = effect.duration
+
+        self.hp: np.ndarray = np.array([build.unit_class.max_health for build in builds], dtype=float)
+        self.stamina: np.ndarray = self.max_stamina.copy()
+        self.is_skill_used: np.ndarray = np.zeros(len(builds), dtype=bool)
+        # Point of the battle the skill was used at, -1 if it was not, and the damage the shields have left
+        self.skill_point: np.ndarray = np.full(len(builds), -1, dtype=np.int64)
+        self.shield: np.ndarray = np.zeros(len(builds), dtype=float)
+
+    @classmethod
+    def from_units(cls, units: Sequence[BaseUnit]) -> Side:
+        """
+        Create the side of battles in progress, one per unit. Shields are kept, the effects that act
+        on the next turns are not, the policies looking ahead ignore them
+
+        :param units: Equipped units
+        :return: Side with the current HP, stamina and skill state of the units
+        """
+        side: Side = cls([Build(unit_class=unit.unit_class, weapon=unit.weapon, armor=unit.armor) for unit in units])
+        side.hp = np.array([unit.hp for unit in units], dtype=float)
+        side.stamina = np.array([unit.stamina for unit in units], dtype=float)
+        side.is_skill_used = np.array([unit._is_skill_used for unit in units], dtype=bool)
+        side.shield = np.array([unit.status.shield if unit.status is not None else 0.0 for unit in units],
+                               dtype=float)
+
+        return side
+
+    def compress(self, keep: np.ndarray) -> None:
+        """
+        Drop finished battles from every array, the skills are shared by all battles
+
+        :param keep: Mask of battles that are still running, or indices of battles to keep in the given order
+        :return: None
+        """
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray):
+                setattr(self, name, value[keep])
+
+    def take(self, indices: np.ndarray) -> Side:
+        """
+        Get a copy of the side with the given battles, a battle may be repeated
+
+        :param indices: Indices of battles
+        :return: New side
+        """
+        side: Side = copy.copy(self)
+        side.compress(indices)
+
+        return side
+
+
+def round_tenths(values: np.ndarray) -> np.ndarray:
+    """
+    Round values the same way the hp and stamina getters of BaseUnit do
+
+    :param values: Raw values
+    :return: Values rounded to one decimal
+    """
+    return np.round(values, 1)
+
+
+def count_damage(attacker: Side, target: Side, acting: np.ndarray, rolls: np.ndarray) -> None:
+    """
+    Vectorized BaseUnit._count_damage, including the attacker's armor being used for the stamina cost of the target
+
+    :param attacker: Attacking side
+    :param target: Target side
+    :param acting: Mask of battles in which the attacker hits
+    :param rolls: Uniform [0, 1) draws for the weapon damage
+    :return: None
+    """
+    attack_damage: np.ndarray = (attacker.min_damage + (attacker.max_damage - attacker.min_damage) * rolls) \
+        * attacker.attack
+    hits: np.ndarray = acting & (target.defence < attack_damage)
+    absorbed: np.ndarray = hits & (round_tenths(target.stamina) > target.stamina_per_turn)
+
+    damage: np.ndarray = round_tenths(np.where(absorbed, attack_damage - target.defence, attack_damage))
+    target.stamina = np.where(absorbed, round_tenths(target.stamina) - attacker.stamina_per_turn, target.stamina)
+    attacker.stamina = np.where(hits, round_tenths(attacker.stamina) - attacker.stamina_per_hit, attacker.stamina)
+
+    if target.shield.any():
+        damage = absorb(target, hits & (damage > 0), damage)
+
+    wounded: np.ndarray = hits & (damage > 0)
+    target.hp = np.where(wounded, np.maximum(round_tenths(target.hp) - damage, 0), target.hp)
+
+
+def absorb(target: Side, acting: np.ndarray, damage: np.ndarray) -> np.ndarray:
+    """
+    Vectorized UnitStatus.absorb, take the damage from the shields of the target
+
+    :param target: Damaged side
+    :param acting: Mask of battles in which positive damage is dealt
+    :param damage: Incoming damage
+    :return: Damage left after the shields
+    """
+    shielded: np.ndarray = acting & (target.shield > 0)
+    absorbed: np.ndarray = np.where(shielded, np.minimum(target.shield, damage), 0.0)
+    target.shield = np.where(shielded, round_tenths(target.shield - absorbed), target.shield)
+
+    return np.where(shielded, round_tenths(damage - absorbed), damage)
+
+
+def use_skill(user: Side, target: Side, acting: np.ndarray, point: int = -1) -> None:
+    """
+    Vectorized Skill.use, the compiled function of every skill is applied to the arrays of all battles at once
+    and its result is taken where the skill is used. Shields start at once, the other status effects
+    are found from the point of use by get_status_totals
+
+    :param user: Side using the skill
+    :param target: Target side
+    :param acting: Mask of battles in which the skill is used
+    :param point: Point of the battle, clock * PHASES + phase, the timed effects are not started if not given
+    :return: None
+    """
+    if not acting.any():
+        return
+
+    user.is_skill_used = user.is_skill_used | acting
+    if point >= 0:
+        user.skill_point = np.where(acting, point, user.skill_point)
+    state: SkillState = SkillState(user_hp=round_tenths(user.hp), user_stamina=round_tenths(user.stamina),
+                                   user_max_health=user.max_health, user_max_stamina=user.max_stamina,
+                                   target_hp=round_tenths(target.hp), target_stamina=round_tenths(target.stamina))
+
+    for skill_index in np.unique(user.skill_index[acting]):
+        using: np.ndarray = acting & (user.skill_index == skill_index)
+        result: SkillState = user.skills[skill_index].apply(state)
+        # Unchanged values are returned as the same arrays and keep their unrounded values
+        if result.user_hp is not state.user_hp:
+            user.hp = np.where(using, result.user_hp, user.hp)
+        if result.user_stamina is not state.user_stamina:
+            user.stamina = np.where(using, result.user_stamina, user.stamina)
+        if result.target_hp is not state.target_hp:
+            target_hp: np.ndarray = result.target_hp
+            if target.shield.any():
+                damage: np.ndarray = state.target_hp - result.target_hp
+                shielded: np.ndarray = using & (damage > 0) & (target.shield > 0)
+                target_hp = np.where(shielded, state.target_hp - absorb(target, shielded, damage), target_hp)
+            target.hp = np.where(using, target_hp, target.hp)
+        if result.target_stamina is not state.target_stamina:
+            target.stamina = np.where(using, result.target_stamina, target.stamina)
+
+    for column in range(user.status_kind.shape[1]):
+        shielding: np.ndarray = acting & (user.status_kind[:, column] == STATUS_KINDS.index(SHIELD))
+        user.shield = np.where(shielding, round_tenths(np.maximum(user.shield + user.status_amount[:, column], 0)),
+                               user.shield)
+
+
+def regenerate_stamina(side: Side) -> None:
+    """
+    Vectorized Arena._stamina_regeneration
+
+    :param side: Side to regenerate
+    :return: None
+    """
+    stamina: np.ndarray = np.where(round_tenths(side.stamina) + Arena.STAMINA_PER_ROUND > side.max_stamina,
+                                   side.max_stamina, side.stamina)
+    side.stamina = round_tenths(stamina) + Arena.STAMINA_PER_ROUND
+
+
+def get_status_totals(user: Side, kind: str, point: int) -> np.ndarray:
+    """
+    Total of the active effects of the kind started by the skill of the side, on itself for shields and regeneration,
+    on the other side for damage over time and stuns. An effect started at clock turn t with duration d acts
+    from its start to the expiry phase of turn t + d, like on the EffectScheduler
+
+    :param user: Side whose skill started the effects
+    :param kind: DOT, STUN, SHIELD or REGEN
+    :param point: Point of the battle, clock * PHASES + phase
+    :return: Total amount of every battle, the number of effects for stuns
+    """
+    totals: np.ndarray = np.zeros(len(user.hp))
+    started: np.ndarray = (user.skill_point >= 0) & (user.skill_point < point)
+    if not started.any():
+        return totals
+
+    for column in range(user.status_kind.shape[1]):
+        expiry: np.ndarray = (user.skill_point // PHASES + user.status_duration[:, column]) * PHASES + EXPIRY_PHASE
+        active: np.ndarray = started & (user.status_kind[:, column] == STATUS_KINDS.index(kind)) & (point < expiry)
+        if active.any():
+            totals = round_tenths(totals + np.where(active, 1.0 if kind == STUN else user.status_amount[:, column], 0))
+
+    return totals
+
+
+def apply_status_effects(side: Side, other: Side, clock: int) -> None:
+    """
+    Vectorized Arena.apply_unit_effects, the damage over time started by the other side and the own regeneration
+
+    :param side: Affected side
+    :param other: Other side
+    :param clock: Turn of the effect clock
+    :return: None
+    """
+    point: int = clock * PHASES + APPLY_PHASE
+    dot: np.ndarray = get_status_totals(other, DOT, point)
+    regen: np.ndarray = get_status_totals(side, REGEN, point)
+
+    side.hp = np.where(dot != 0, np.maximum(round_tenths(side.hp) - dot, 0), side.hp)
+    hp: np.ndarray = round_tenths(side.hp)
+    healed: np.ndarray = (regen != 0) & (hp > 0) & (hp < side.max_health)
+    side.hp = np.where(healed, np.minimum(hp + regen, side.max_health), side.hp)
+
+
+def expire_shields(side: Side, clock: int) -> None:
+    """
+    Vectorized expiry of shields, an expiring shield removes at most its own amount from what is left
+
+    :param side: Side whose shields expire
+    :param clock: Turn of the effect clock
+    :return: None
+    """
+    used: np.ndarray = side.skill_point >= 0
+    for column in range(side.status_kind.shape[1]):
+        expiring: np.ndarray = used & (side.status_kind[:, column] == STATUS_KINDS.index(SHIELD)) \
+            & (side.skill_point // PHASES + side.status_duration[:, column] == clock)
+        if expiring.any():
+            side.shield = np.where(expiring, round_tenths(np.maximum(side.shield - side.status_amount[:, column], 0)),
+                                   side.shield)
+
+
+def get_outcome(player: Side, enemy: Side) -> np.ndarray:
+    """
+    Vectorized Arena._check_players_hp
+
+    :return: Outcome code for every battle
+    """
+    player_alive: np.ndarray = round_tenths(player.hp) > 0
+    enemy_alive: np.ndarray = round_tenths(enemy.hp) > 0
+
+    return np.select([player_alive & enemy_alive, player_alive, enemy_alive], [RUNNING, WIN, LOSS], DRAW)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create simulation functions
+def simulate_batch(players: Sequence[Build], enemies: Sequence[Build], seed: Optional[int] = None,
+                   max_turns: int = 1000, policy: Optional[EnemyPolicy] = None) -> SimulationResult:
+    """
+    Play len(players) battles in lockstep, the player always hits and the enemy follows EnemyUnit.hit.
+    The enemy policy chooses the actions of every running battle in one call per turn
+
+    :param players: Player build for every battle
+    :param enemies: Enemy build for every battle
+    :param seed: Seed of the random generator
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :param policy: Enemy policy, the random skill roll if not given
+    :return: Tallies and battle lengths
+    """
+    if len(players) != len(enemies):
+        raise ValueError("Players and enemies must have the same length")
+
+    policy = policy or default_policy
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    player: Side = Side(players)
+    enemy: Side = Side(enemies)
+
+    # The player never uses its skill, only the skill of the enemy starts status effects.
+    # They are looked up only until the last clock turn an effect started in any battle may act on
+    max_duration: int = int(enemy.status_duration.max(initial=0))
+    effects_until: int = -1
+
+    battle_ids: np.ndarray = np.arange(len(players))
+    outcomes: np.ndarray = np.full(len(players), TIMEOUT, dtype=np.int8)
+    turns: np.ndarray = np.full(len(players), max_turns, dtype=np.int64)
+
+    def finish(outcome: np.ndarray, turn: int) -> None:
+        nonlocal battle_ids
+        finished: np.ndarray = outcome != RUNNING
+        if finished.any():
+            outcomes[battle_ids[finished]] = outcome[finished]
+            turns[battle_ids[finished]] = turn
+            keep: np.ndarray = ~finished
+            battle_ids = battle_ids[keep]
+            player.compress(keep)
+            enemy.compress(keep)
+
+    for turn in range(1, max_turns + 1):
+        # Arena.player_hit
+        finish(get_outcome(player, enemy), turn - 1)
+        if not len(battle_ids):
+            break
+
+        hitting: np.ndarray = round_tenths(player.stamina) > player.stamina_per_hit
+        if turn - 1 <= effects_until:
+            hitting &= get_status_totals(enemy, STUN, (turn - 1) * PHASES + PLAYER_PHASE) == 0
+        count_damage(player, enemy, hitting, rng.random(len(battle_ids)))
+
+        # Arena.next_turn
+        finish(get_outcome(player, enemy), turn)
+        if not len(battle_ids):
+            break
+
+        regenerate_stamina(player)
+        regenerate_stamina(enemy)
+
+        # Arena._apply_status_effects, the enemy is never stunned and the player never shielded
+        if turn <= effects_until:
+            apply_status_effects(player, enemy, turn)
+            apply_status_effects(enemy, player, turn)
+            finish(get_outcome(player, enemy), turn)
+            if not len(battle_ids):
+                break
+
+        # EnemyUnit.hit
+        actions: np.ndarray = policy.choose_batch(enemy, player, rng)
+        skill: np.ndarray = (actions == SKILL_INDEX) & ~enemy.is_skill_used \
+            & (round_tenths(enemy.stamina) >= enemy.skill_stamina)
+        use_skill(enemy, player, skill, turn * PHASES + ENEMY_PHASE)
+        if max_duration and skill.any():
+            effects_until = turn + max_duration
+
+        weapon: np.ndarray = (actions == HIT_INDEX) & (round_tenths(enemy.stamina) > enemy.stamina_per_hit)
+        count_damage(enemy, player, weapon, rng.random(len(battle_ids)))
+
+        if turn <= effects_until:
+            expire_shields(enemy, turn)
+    else:
+        # Battles which died on the last enemy turn are only discovered by the next player turn
+        outcome: np.ndarray = get_outcome(player, enemy)
+        outcomes[battle_ids[outcome != RUNNING]] = outcome[outcome != RUNNING]
+
+    return _tally(outcomes, turns)
+
+
+def simulate(player: Build, enemy: Build, battles: int, seed: Optional[int] = None, max_turns: int = 1000,
+             policy: Optional[EnemyPolicy] = None) -> SimulationResult:
+    """
+    Play the same matchup many times in lockstep
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param battles: Number of battles
+    :param seed: Seed of the random generator
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :param policy: Enemy policy, the random skill roll if not given
+    :return: Tallies and battle lengths
+    """
+    return simulate_batch([player] * battles, [enemy] * battles, seed=seed, max_turns=max_turns, policy=policy)
+
+
+def simulate_reference(player: Build, enemy: Build, battles: int, seed: Optional[int] = None,
+                       max_turns: int = 1000, policy: Optional[EnemyPolicy] = None) -> SimulationResult:
+    """
+    Play the same matchup many times with the object-based Arena
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param battles: Number of battles
+    :param seed: Seed the battle seeds are drawn from
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :param policy: Enemy policy, the random skill roll if not given
+    :return: Tallies and battle lengths
+    """
+    seeds: random.Random = random.Random(seed)
+    outcomes: np.ndarray = np.full(battles, TIMEOUT, dtype=np.int8)
+    turns: np.ndarray = np.full(battles, max_turns, dtype=np.int64)
+    codes: dict = {"Игрок выиграл битву.": WIN, "Ничья.": DRAW, "Игрок проиграл битву.": LOSS}
+
+    for battle in range(battles):
+        player_unit: PlayerUnit = PlayerUnit(name="player", unit_class=player.unit_class)
+        player_unit.equip_weapon(player.weapon)
+        player_unit.equip_armor(player.armor)
+        enemy_unit: EnemyUnit = EnemyUnit(name="enemy", unit_class=enemy.unit_class, policy=policy)
+        enemy_unit.equip_weapon(enemy.weapon)
+        enemy_unit.equip_armor(enemy.armor)
+
+        arena: Arena = Arena()
+        arena.start_game(player_unit, enemy_unit, seed=seeds.getrandbits(64))
+
+        for turn in range(max_turns):
+            if arena._check_players_hp():
+                outcomes[battle], turns[battle] = codes[arena.battle_result], turn
+                break
+            arena.player_hit()
+            if not arena.game_is_running:
+                outcomes[battle], turns[battle] = codes[arena.battle_result], turn + 1
+                break
+        else:
+            if arena._check_players_hp():
+                outcomes[battle] = codes[arena.battle_result]
+
+    return _tally(outcomes, turns)
+
+
+def check_parity(player: Build, enemy: Build, battles: int = 2000, seed: Optional[int] = None,
+                 max_turns: int = 1000, policy: Optional[EnemyPolicy] = None) -> ParityReport:
+    """
+    Compare the vectorized engine with the object-based Arena on the same matchup.
+    Both engines draw different random streams, so the rates are compared within 4 standard errors
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param battles: Number of battles played by each engine
+    :param seed: Seed of both engines
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :param policy: Enemy policy of both engines, the random skill roll if not given
+    :return: Parity report
+    """
+    vectorized: SimulationResult = simulate(player, enemy, battles, seed=seed, max_turns=max_turns, policy=policy)
+    reference: SimulationResult = simulate_reference(player, enemy, battles, seed=seed, max_turns=max_turns,
+                                                     policy=policy)
+
+    tolerance: float = 4 * math.sqrt(0.25 / battles) * math.sqrt(2)
+    ok: bool = all(abs(getattr(vectorized, name) - getattr(reference, name)) / battles <= tolerance
+                   for name in ("wins", "draws", "losses", "timeouts"))
+
+    return ParityReport(vectorized=vectorized, reference=reference, tolerance=tolerance, ok=ok)
+
+
+def _tally(outcomes: np.ndarray, turns: np.ndarray) -> SimulationResult:
+    """
+    Count outcomes of finished battles
+
+    :param outcomes: Outcome code for every battle
+    :param turns: Length of every battle
+    :return: Simulation result
+    """
+    counts: np.ndarray = np.bincount(outcomes, minlength=TIMEOUT + 1)
+
+    return SimulationResult(wins=int(counts[WIN]),
+                            draws=int(counts[DRAW]),
+                            losses=int(counts[LOSS]),
+                            timeouts=int(counts[TIMEOUT]),
+                            turns=turns,
+                            outcomes=outcomes)
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from application.models.base import Arena
+from application.models.matchups import AttackProfile, DefenceProfile, get_attack_profile, get_defence_profile
+from application.models.policies import SKILL_ROLL_RANGE, SKILL_ROLL_THRESHOLD
+from application.simulation.engine import Build, SimulationResult, simulate_batch
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Estimator settings
+CACHE_SIZE: int = int(os.environ.get("ESTIMATE_CACHE_SIZE", 1024))
+MONTE_CARLO_BATTLES: int = 20000
+
+# Probability mass of battles still running after which the exact pass stops
+EPSILON: float = 1e-9
+
+# HP and damage are rounded to one decimal in BaseUnit, the exact pass counts them in tenths
+UNITS: int = 10
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create estimate dataclass
+@dataclass(frozen=True, slots=True)
+class Estimate:
+    """
+    Class representing the estimated outcome of a matchup, the player always hits \n
+    win: Probability that the player wins \n
+    draw: Probability of a draw \n
+    loss: Probability that the player loses \n
+    timeout: Probability that the battle lasts longer than max_turns \n
+    expected_turns: Expected battle length in player turns \n
+    method: "exact" for the dynamic-programming pass, "monte_carlo" for the simulation \n
+    battles: Number of simulated battles, 0 for the exact pass \n
+    standard_error: Standard error of the win probability, 0 for the exact pass
+    """
+    win: float
+    draw: float
+    loss: float
+    timeout: float
+    expected_turns: float
+    method: str
+    battles: int
+    standard_error: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create exact estimator
+def _damage_pmf(attacker: Build, defender: Build) -> np.ndarray:
+    """
+    Get the distribution of the damage of one weapon hit in tenths of HP while the defender absorbs hits.
+    The roll is uniform, so the probability of every rounded value is the length of its interval
+
+    :param attacker: Attacker build
+    :param defender: Defender build
+    :return: Array with the probability of every damage value, index is the damage in tenths
+    """
+    attack: AttackProfile = get_attack_profile(attacker.unit_class, attacker.weapon)
+    defence: DefenceProfile = get_defence_profile(defender.unit_class, defender.armor)
+    low, high = attack.min_damage - defence.defence, attack.max_damage - defence.defence
+
+    if high <= 0:
+        return np.ones(1)
+
+    if high == low:
+        pmf: np.ndarray = np.zeros(int(round(high * UNITS)) + 1)
+        pmf[-1] = 1.0
+        return pmf
+
+    values: np.ndarray = np.arange(int(math.floor(high * UNITS + 0.5)) + 1)
+    lower: np.ndarray = np.clip((values - 0.5) / UNITS, max(low, 0.0), high)
+    upper: np.ndarray = np.clip((values + 0.5) / UNITS, max(low, 0.0), high)
+    pmf = (upper - lower) / (high - low)
+    pmf[0] += max(-low, 0.0) / (high - low)
+
+    return pmf
+
+
+def _kill_turns(max_health: float, pmf: np.ndarray, max_turns: int,
+                skill_damage: float = 0.0, skill_chance: float = 0.0) -> np.ndarray:
+    """
+    Get the distribution of the number of hits needed to kill a unit
+
+    :param max_health: HP of the unit
+    :param pmf: Distribution of the damage of one hit in tenths
+    :param max_turns: Maximum number of hits
+    :param skill_damage: Damage of the attacker skill, used once instead of a hit
+    :param skill_chance: Chance of the attacker to use the skill on every hit until it is used
+    :return: Array of length max_turns + 1, index is the number of hits
+    """
+    size: int = int(round(max_health * UNITS))
+    skill_units: int = int(round(skill_damage * UNITS))
+    unused: np.ndarray = np.zeros(size)
+    unused[0] = 1.0
+    used: np.ndarray = np.zeros(size)
+    deaths: np.ndarray = np.zeros(max_turns + 1)
+    alive: float = 1.0
+
+    for turn in range(1, max_turns + 1):
+        skill: np.ndarray = np.zeros(size)
+        if skill_chance and skill_units < size:
+            skill[skill_units:] = unused[:size - skill_units] * skill_chance
+
+        used = np.convolve(used, pmf)[:size] + skill
+        unused = np.convolve(unused, pmf)[:size] * (1 - skill_chance)
+
+        still_alive: float = float(unused.sum() + used.sum())
+        deaths[turn] = alive - still_alive
+        alive = still_alive
+        if alive < EPSILON:
+            break
+
+    return deaths
+
+
+def _is_stamina_enough(player: Build, enemy: Build, turns: int, player_hits: bool, enemy_hits: bool) -> bool:
+    """
+    Check that neither unit can run out of stamina for hits, armor and the enemy skill in the given number of turns.
+    Every possible stamina cost is paid every turn, which is the lowest stamina a unit can have
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param turns: Number of turns
+    :param player_hits: True if the player hits can get through the enemy armor
+    :param enemy_hits: True if the enemy hits can get through the player armor
+    :return: True if stamina never limits the units
+    """
+    player_stamina: float = player.unit_class.max_stamina
+    enemy_stamina: float = enemy.unit_class.max_stamina - enemy.unit_class.skill.stamina
+    margin: float = 0.1
+
+    for _ in range(turns):
+        if player_stamina <= player.weapon.stamina_per_hit + margin:
+            return False
+        if player_hits:
+            if enemy_stamina <= enemy.armor.stamina_per_turn + margin:
+                return False
+            enemy_stamina -= player.armor.stamina_per_turn
+            player_stamina -= player.weapon.stamina_per_hit
+
+        player_stamina = min(player_stamina, player.unit_class.max_stamina) + Arena.STAMINA_PER_ROUND
+        enemy_stamina = min(enemy_stamina, enemy.unit_class.max_stamina) + Arena.STAMINA_PER_ROUND
+
+        if enemy_stamina < enemy.unit_class.skill.stamina + margin \
+                or enemy_stamina <= enemy.weapon.stamina_per_hit + margin:
+            return False
+        if enemy_hits:
+            if player_stamina <= player.armor.stamina_per_turn + margin:
+                return False
+            player_stamina -= enemy.armor.stamina_per_turn
+            enemy_stamina -= enemy.weapon.stamina_per_hit
+
+    return True
+
+
+def estimate_exact(player: Build, enemy: Build, max_turns: int = 1000) -> Optional[Estimate]:
+    """
+    Compute the outcome from the independent distributions of the number of hits each unit needs to kill the other.
+    They are independent only while stamina never limits hits and armor absorption, and while the enemy skill
+    starts no status effects, a stun or a shield changes the hits of the following turns
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :return: Estimate or None if the pass is not exact for the matchup
+    """
+    if enemy.unit_class.skill.has_statuses:
+        return None
+
+    player_pmf: np.ndarray = _damage_pmf(player, enemy)
+    enemy_pmf: np.ndarray = _damage_pmf(enemy, player)
+    skill_chance: float = SKILL_ROLL_THRESHOLD / SKILL_ROLL_RANGE
+
+    enemy_deaths: np.ndarray = _kill_turns(enemy.unit_class.max_health, player_pmf, max_turns)
+    player_deaths: np.ndarray = _kill_turns(player.unit_class.max_health, enemy_pmf, max_turns,
+                                            skill_damage=enemy.unit_class.skill.damage, skill_chance=skill_chance)
+
+    # Probability that a unit is still alive after the given number of hits
+    enemy_alive: np.ndarray = 1 - np.cumsum(enemy_deaths)
+    player_alive: np.ndarray = 1 - np.cumsum(player_deaths)
+
+    running: np.ndarray = enemy_alive * player_alive
+    horizon: int = int(np.argmax(running < EPSILON)) if (running < EPSILON).any() else max_turns
+    if not _is_stamina_enough(player, enemy, horizon, len(player_pmf) > 1, len(enemy_pmf) > 1):
+        return None
+
+    # The player hits first, so the t-th player hit lands before the t-th enemy action
+    turns: np.ndarray = np.arange(max_turns + 1)
+    wins: np.ndarray = enemy_deaths * np.concatenate(([1.0], player_alive[:-1]))
+    losses: np.ndarray = player_deaths * enemy_alive
+    win, loss = float(wins.sum()), float(losses.sum())
+    timeout: float = max(1.0 - win - loss, 0.0)
+
+    return Estimate(win=win, draw=0.0, loss=loss, timeout=timeout,
+                    expected_turns=float((turns * (wins + losses)).sum() + max_turns * timeout),
+                    method="exact", battles=0, standard_error=0.0)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create Monte Carlo estimator
+def _simulate_chunk(task: Tuple[Build, Build, int, int, int]) -> Tuple[List[int], int]:
+    """
+    Play a chunk of battles of the matchup
+
+    :param task: Player build, enemy build, number of battles, seed and max turns
+    :return: Counts of wins, draws, losses and timeouts and the total number of turns
+    """
+    player, enemy, battles, seed, max_turns = task
+    result: SimulationResult = simulate_batch([player] * battles, [enemy] * battles, seed=seed, max_turns=max_turns)
+
+    return [result.wins, result.draws, result.losses, result.timeouts], int(result.turns.sum())
+
+
+def estimate_monte_carlo(player: Build, enemy: Build, battles: int = MONTE_CARLO_BATTLES, seed: int = 0,
+                         max_turns: int = 1000, workers: int = 1) -> Estimate:
+    """
+    Estimate the outcome by playing battles with the vectorized engine, split between worker processes
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param battles: Number of battles
+    :param seed: Seed of the battles, every chunk gets its own stream
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :param workers: Number of worker processes, battles are played in this process if 1
+    :return: Estimate
+    """
+    chunks: int = max(workers, 1)
+    seeds: List[int] = [int(sequence.generate_state(1)[0]) for sequence in np.random.SeedSequence(seed).spawn(chunks)]
+    tasks: List[Tuple[Build, Build, int, int, int]] = [
+        (player, enemy, battles // chunks + (chunk < battles % chunks), seeds[chunk], max_turns)
+        for chunk in range(chunks)]
+
+    if chunks == 1:
+        results: List[Tuple[List[int], int]] = [_simulate_chunk(tasks[0])]
+    else:
+        with Pool(chunks) as pool:
+            results = pool.map(_simulate_chunk, tasks)
+
+    wins, draws, losses, timeouts = (sum(counts[index] for counts, _ in results) for index in range(4))
+    win: float = wins / battles
+
+    return Estimate(win=win, draw=draws / battles, loss=losses / battles, timeout=timeouts / battles,
+                    expected_turns=sum(turns for _, turns in results) / battles,
+                    method="monte_carlo", battles=battles, standard_error=math.sqrt(win * (1 - win) / battles))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create estimator
+@lru_cache(maxsize=CACHE_SIZE)
+def estimate(player: Build, enemy: Build, battles: int = MONTE_CARLO_BATTLES, max_turns: int = 1000,
+             workers: int = 1) -> Estimate:
+    """
+    Estimate the win probability and battle length of the matchup, exactly where stamina never limits the units
+    and by Monte Carlo otherwise. Results are memoized per matchup, builds hold the equipment values,
+    so a changed catalog gives new keys
+
+    :param player: Player build
+    :param enemy: Enemy build
+    :param battles: Number of battles for Monte Carlo
+    :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+    :param workers: Number of worker processes for Monte Carlo
+    :return: Estimate
+    """
+    exact: Optional[Estimate] = estimate_exact(player, enemy, max_turns=max_turns)
+
+    if exact is not None:
+        return exact
+
+    return estimate_monte_carlo(player, enemy, battles=battles, max_turns=max_turns, workers=workers)
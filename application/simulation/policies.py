@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import threading
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from application.models.policies import ACTIONS, HIT_INDEX, SKILL_INDEX, PASS_INDEX, EnemyPolicy, \
+    get_available_actions, register_policy
+from application.models.unit import BaseUnit
+from application.simulation.engine import LOSS, RUNNING, WIN, Side, count_damage, get_outcome, round_tenths, \
+    regenerate_stamina, use_skill
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Policy settings
+# Value of a won battle for the enemy, the HP difference of a running battle is between -1 and 1
+TERMINAL_VALUE: float = 2.0
+
+# Static side arrays identifying a matchup for the lookup table
+PARAMETERS: Tuple[str, ...] = ("max_health", "max_stamina", "attack", "min_damage", "max_damage", "stamina_per_hit",
+                               "defence", "stamina_per_turn", "skill_id", "skill_stamina", "skill_damage")
+
+TableKey = Tuple[Tuple[float, ...], Tuple[float, ...]]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create scoring policy class
+class ScoringPolicy(EnemyPolicy):
+    """
+    Policy scoring every action in every battle at once and choosing the best available one
+    """
+
+    @abstractmethod
+    def score_batch(self, enemy: Side, player: Side) -> np.ndarray:
+        """
+        Score the actions of the enemy in every battle, higher is better for the enemy
+
+        :param enemy: Enemy side
+        :param player: Player side
+        :return: Array of shape (battles, 3) in the order of ACTIONS
+        """
+        pass
+
+    def choose(self, enemy: BaseUnit, target: BaseUnit) -> str:
+        return ACTIONS[int(self.choose_batch(Side.from_units([enemy]), Side.from_units([target]), None)[0])]
+
+    def choose_batch(self, enemy: Side, player: Side, rng: Optional[np.random.Generator]) -> np.ndarray:
+        scores: np.ndarray = np.where(get_available_actions(enemy), self.score_batch(enemy, player), -np.inf)
+        return np.argmax(scores, axis=1)
+
+
+def _expected_hit_damage(attacker: Side, target: Side) -> np.ndarray:
+    """
+    Get the expected damage of a weapon hit from the uniform damage roll, ignoring the rounding to 0.1 HP
+
+    :param attacker: Attacking side
+    :param target: Target side
+    :return: Expected damage in every battle
+    """
+    low: np.ndarray = attacker.min_damage * attacker.attack
+    high: np.ndarray = attacker.max_damage * attacker.attack
+    spread: np.ndarray = high - low
+    through: np.ndarray = np.maximum(low, target.defence)
+
+    chance: np.ndarray = np.where(spread > 0, (high - through) / np.where(spread > 0, spread, 1.0), 1.0)
+    absorbed: np.ndarray = round_tenths(target.stamina) > target.stamina_per_turn
+    mean: np.ndarray = (through + high) / 2 - np.where(absorbed, target.defence, 0.0)
+
+    return np.where(high > target.defence, chance * mean, 0.0)
+
+
+def _evaluate(enemy: Side, player: Side) -> np.ndarray:
+    """
+    Value of the battles for the enemy: TERMINAL_VALUE for a win, its negation for a loss,
+    the difference of HP fractions otherwise
+
+    :param enemy: Enemy side
+    :param player: Player side
+    :return: Value of every battle
+    """
+    outcome: np.ndarray = get_outcome(player, enemy)
+    difference: np.ndarray = np.maximum(round_tenths(enemy.hp), 0) / enemy.max_health \
+        - np.maximum(round_tenths(player.hp), 0) / player.max_health
+
+    return np.select([outcome == LOSS, outcome == WIN], [TERMINAL_VALUE, -TERMINAL_VALUE], difference)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create policies
+class GreedyPolicy(ScoringPolicy):
+    """
+    Chooses the action with the highest expected damage this turn
+    """
+    name: str = "greedy"
+
+    def score_batch(self, enemy: Side, player: Side) -> np.ndarray:
+        return np.stack([_expected_hit_damage(enemy, player), enemy.skill_damage, np.zeros(len(enemy.hp))], axis=1)
+
+
+class ExpectimaxPolicy(ScoringPolicy):
+    """
+    Looks depth enemy turns ahead, the enemy maximizes the expected value over weapon rolls of both units
+    and the player always hits. Every roll is approximated by samples quantiles, all battles and all branches
+    of one search level are evaluated by the same array operations. The search pays off in batches:
+    a live battle decides alone and a turn costs about 1.5 ms against 70 us per battle of a batch of 1000,
+    the lookup policy keeps live turns under 0.4 ms with a cached depth 1 table
+    """
+    name: str = "expectimax"
+
+    def __init__(self, depth: int = 2, samples: int = 3, chunk_size: int = 1024):
+        """
+        Initialize the search
+
+        :param depth: Number of enemy turns to look ahead
+        :param samples: Number of quantiles approximating a weapon roll
+        :param chunk_size: Number of battles searched at once, bounds the memory of a search
+        """
+        self.depth: int = depth
+        self.samples: int = samples
+        self.chunk_size: int = chunk_size
+        self.rolls: np.ndarray = (np.arange(samples) + 0.5) / samples
+
+    def score_batch(self, enemy: Side, player: Side) -> np.ndarray:
+        battles: int = len(enemy.hp)
+        chunks: List[np.ndarray] = [self._get_action_values(enemy.take(indices), player.take(indices), self.depth)
+                                    for indices in np.array_split(np.arange(battles),
+                                                                  max(-(-battles // self.chunk_size), 1))]
+
+        return np.concatenate(chunks) if chunks else np.zeros((0, len(ACTIONS)))
+
+    def _get_action_values(self, enemy: Side, player: Side, depth: int) -> np.ndarray:
+        """
+        Get the expected value of every enemy action, unavailable actions are -inf
+
+        :param enemy: Enemy side before its action
+        :param player: Player side
+        :param depth: Number of enemy turns left to look ahead
+        :return: Array of shape (battles, 3) in the order of ACTIONS
+        """
+        battles: int = len(enemy.hp)
+        positions: np.ndarray = np.arange(battles)
+
+        # Children: every weapon roll of a hit, the skill and the pass
+        parents: np.ndarray = np.concatenate([np.repeat(positions, self.samples), positions, positions])
+        actions: np.ndarray = np.concatenate([np.full(battles * self.samples, HIT_INDEX),
+                                              np.full(battles, SKILL_INDEX), np.full(battles, PASS_INDEX)])
+        weights: np.ndarray = np.concatenate([np.full(battles * self.samples, 1 / self.samples),
+                                              np.ones(2 * battles)])
+        rolls: np.ndarray = np.concatenate([np.tile(self.rolls, battles), np.zeros(2 * battles)])
+
+        child_enemy: Side = enemy.take(parents)
+        child_player: Side = player.take(parents)
+        hit: np.ndarray = (actions == HIT_INDEX) & (round_tenths(child_enemy.stamina) > child_enemy.stamina_per_hit)
+        count_damage(child_enemy, child_player, hit, rolls)
+        use_skill(child_enemy, child_player, actions == SKILL_INDEX)
+
+        values: np.ndarray = self._get_reply_values(child_enemy, child_player, depth)
+        totals: np.ndarray = np.bincount(parents * len(ACTIONS) + actions, weights=weights * values,
+                                         minlength=battles * len(ACTIONS)).reshape(battles, len(ACTIONS))
+
+        return np.where(get_available_actions(enemy), totals, -np.inf)
+
+    def _get_reply_values(self, enemy: Side, player: Side, depth: int) -> np.ndarray:
+        """
+        Get the expected value after the enemy action: the player hits, both units regenerate stamina
+        and the enemy acts again while the search depth lasts
+
+        :param enemy: Enemy side after its action
+        :param player: Player side
+        :param depth: Number of enemy turns left to look ahead, including the one just made
+        :return: Value of every battle
+        """
+        values: np.ndarray = _evaluate(enemy, player)
+        running: np.ndarray = np.flatnonzero(get_outcome(player, enemy) == RUNNING)
+        if not len(running):
+            return values
+
+        parents: np.ndarray = np.repeat(running, self.samples)
+        reply_enemy: Side = enemy.take(parents)
+        reply_player: Side = player.take(parents)
+        count_damage(reply_player, reply_enemy, round_tenths(reply_player.stamina) > reply_player.stamina_per_hit,
+                     np.tile(self.rolls, len(running)))
+
+        replies: np.ndarray = _evaluate(reply_enemy, reply_player)
+        if depth > 1:
+            alive: np.ndarray = np.flatnonzero(get_outcome(reply_player, reply_enemy) == RUNNING)
+            if len(alive):
+                next_enemy: Side = reply_enemy.take(alive)
+                next_player: Side = reply_player.take(alive)
+                regenerate_stamina(next_enemy)
+                regenerate_stamina(next_player)
+                replies[alive] = self._get_action_values(next_enemy, next_player, depth - 1).max(axis=1)
+
+        values[running] = replies.reshape(len(running), self.samples).mean(axis=1)
+        return values
+
+
+class LookupTablePolicy(EnemyPolicy):
+    """
+    Plays the choices of the planner precomputed on a grid of HP and stamina buckets of both units.
+    The table of a matchup is built in one batch call of the planner on first use, after that a choice
+    is an array lookup. A one turn expectimax builds a table of 8 buckets in about 30 ms
+    """
+    name: str = "lookup"
+
+    def __init__(self, planner: ScoringPolicy, buckets: int = 8, max_tables: int = 512):
+        """
+        Initialize the policy without tables
+
+        :param planner: Policy scoring the grid states
+        :param buckets: Number of HP and stamina buckets of every unit
+        :param max_tables: Number of matchup tables kept, the least recently used one is dropped
+        """
+        self.planner: ScoringPolicy = planner
+        self.buckets: int = buckets
+        self.max_tables: int = max_tables
+        self._tables: OrderedDict[TableKey, np.ndarray] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def choose(self, enemy: BaseUnit, target: BaseUnit) -> str:
+        return ACTIONS[int(self.choose_batch(Side.from_units([enemy]), Side.from_units([target]), None)[0])]
+
+    def choose_batch(self, enemy: Side, player: Side, rng: Optional[np.random.Generator]) -> np.ndarray:
+        battles: int = len(enemy.hp)
+        states: np.ndarray = self._get_states(enemy, player)
+        orders: np.ndarray = np.empty((battles, len(ACTIONS)), dtype=np.int8)
+
+        # Battles of the same matchup share a table
+        matchups: np.ndarray = enemy.build_index * (int(player.build_index.max(initial=0)) + 1) + player.build_index
+        _, first, inverse = np.unique(matchups, return_index=True, return_inverse=True)
+        groups: List[np.ndarray] = np.split(np.argsort(inverse, kind="stable"),
+                                            np.cumsum(np.bincount(inverse))[:-1])
+
+        for row, group in zip(first, groups):
+            orders[group] = self._get_table(enemy, player, int(row))[states[group]]
+
+        # The best action of the bucket may be unavailable at the exact stamina, the next one is taken then
+        available: np.ndarray = np.take_along_axis(get_available_actions(enemy), orders.astype(np.int64), axis=1)
+        return orders[np.arange(battles), np.argmax(available, axis=1)]
+
+    def _get_buckets(self, values: np.ndarray, maximum: np.ndarray) -> np.ndarray:
+        return np.clip((values / maximum * self.buckets).astype(np.int64), 0, self.buckets - 1)
+
+    def _get_states(self, enemy: Side, player: Side) -> np.ndarray:
+        """
+        Get the table row of every battle
+
+        :param enemy: Enemy side
+        :param player: Player side
+        :return: Row indices
+        """
+        state: np.ndarray = self._get_buckets(round_tenths(enemy.hp), enemy.max_health)
+        state = state * self.buckets + self._get_buckets(round_tenths(enemy.stamina), enemy.max_stamina)
+        state = state * 2 + enemy.is_skill_used
+        state = state * self.buckets + self._get_buckets(round_tenths(player.hp), player.max_health)
+
+        return state * self.buckets + self._get_buckets(round_tenths(player.stamina), player.max_stamina)
+
+    def _get_table(self, enemy: Side, player: Side, row: int) -> np.ndarray:
+        """
+        Get the table of the matchup of the battle, building it if needed
+
+        :param enemy: Enemy side
+        :param player: Player side
+        :param row: Battle index
+        :return: Actions of every grid state ordered from the best to the worst
+        """
+        key: TableKey = (tuple(float(getattr(enemy, name)[row]) for name in PARAMETERS),
+                         tuple(float(getattr(player, name)[row]) for name in PARAMETERS))
+
+        with self._lock:
+            table: Optional[np.ndarray] = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+
+        table = self._build_table(enemy, player, row)
+
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+
+        return table
+
+    def _build_table(self, enemy: Side, player: Side, row: int) -> np.ndarray:
+        """
+        Score the centers of all grid buckets of the matchup with the planner
+
+        :param enemy: Enemy side
+        :param player: Player side
+        :param row: Battle index
+        :return: Actions of every grid state ordered from the best to the worst
+        """
+        centers: np.ndarray = (np.arange(self.buckets) + 0.5) / self.buckets
+        enemy_hp, enemy_stamina, skill_used, player_hp, player_stamina = (
+            grid.ravel() for grid in np.meshgrid(centers, centers, (False, True), centers, centers, indexing="ij"))
+
+        grid_enemy: Side = enemy.take(np.full(len(enemy_hp), row))
+        grid_player: Side = player.take(np.full(len(enemy_hp), row))
+        grid_enemy.hp = round_tenths(enemy_hp * grid_enemy.max_health)
+        grid_enemy.stamina = round_tenths(enemy_stamina * grid_enemy.max_stamina)
+        grid_enemy.is_skill_used = skill_used.astype(bool)
+        grid_player.hp = round_tenths(player_hp * grid_player.max_health)
+        grid_player.stamina = round_tenths(player_stamina * grid_player.max_stamina)
+
+        scores: np.ndarray = np.where(get_available_actions(grid_enemy),
+                                      self.planner.score_batch(grid_enemy, grid_player), -np.inf)
+        return np.argsort(-scores, axis=1, kind="stable").astype(np.int8)
+
+
+greedy_policy: GreedyPolicy = register_policy(GreedyPolicy())
+expectimax_policy: ExpectimaxPolicy = register_policy(ExpectimaxPolicy())
+lookup_policy: LookupTablePolicy = register_policy(LookupTablePolicy(ExpectimaxPolicy(depth=1)))
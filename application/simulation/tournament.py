@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import time
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from application.models.classes import unit_classes
+from application.models.equipment import Equipment
+from application.simulation.engine import Build, SimulationResult, WIN, DRAW, LOSS, TIMEOUT, simulate_batch
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Builds shared with the worker processes
+_builds: List[Build] = []
+
+
+def get_builds() -> List[Build]:
+    """
+    Get every combination of unit class, weapon and armor
+
+    :return: List of builds
+    """
+    equipment: Equipment = Equipment()
+
+    return [Build(unit_class=unit_class, weapon=weapon, armor=armor)
+            for unit_class, weapon, armor in itertools.product(unit_classes.values(),
+                                                               equipment.equipment.weapons,
+                                                               equipment.equipment.armors)]
+
+
+def build_label(build: Build) -> str:
+    """
+    Get a readable name of the build
+
+    :param build: Build
+    :return: Build name
+    """
+    return f"{build.unit_class.name}/{build.weapon.name}/{build.armor.name}"
+
+
+def _init_worker() -> None:
+    """
+    Load builds once per worker process
+
+    :return: None
+    """
+    global _builds
+    _builds = get_builds()
+
+
+def _play_chunk(task: Tuple[int, int, List[Tuple[int, int]], int, int]) -> Tuple[int, List[Tuple[int, int, list]]]:
+    """
+    Play all repetitions of a chunk of matchups in a single batch
+
+    :param task: Chunk index, base seed, list of (player, enemy) build indexes, repetitions and max turns
+    :return: Chunk index and outcome counts of every matchup
+    """
+    chunk, seed, matchups, repetitions, max_turns = task
+    players: List[Build] = [_builds[player] for player, _ in matchups for _ in range(repetitions)]
+    enemies: List[Build] = [_builds[enemy] for _, enemy in matchups for _ in range(repetitions)]
+    chunk_seed: int = int(np.random.SeedSequence([seed, chunk]).generate_state(1)[0])
+
+    result: SimulationResult = simulate_batch(players, enemies, seed=chunk_seed, max_turns=max_turns)
+    outcomes: np.ndarray = result.outcomes.reshape(len(matchups), repetitions)
+
+    counts: List[Tuple[int, int, list]] = []
+    for (player, enemy), row in zip(matchups, outcomes):
+        tally: np.ndarray = np.bincount(row, minlength=TIMEOUT + 1)
+        counts.append((player, enemy, [int(tally[WIN]), int(tally[DRAW]), int(tally[LOSS]), int(tally[TIMEOUT])]))
+
+    return chunk, counts
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create tournament class
+class Tournament:
+    """
+    Round-robin tournament of every build against every build, resumable from a checkpoint file
+    """
+
+    def __init__(self, repetitions: int, seed: int = 0, chunk_size: int = 64, max_turns: int = 1000,
+                 checkpoint: Optional[str] = None):
+        """
+        Initialize empty tournament or resume it from the checkpoint
+
+        :param repetitions: Number of battles per matchup
+        :param seed: Base seed, every chunk derives its own seed from it
+        :param chunk_size: Number of matchups played by a worker in one batch
+        :param max_turns: Maximum number of player turns before a battle is counted as a timeout
+        :param checkpoint: Path of the checkpoint file
+        """
+        self.builds: List[Build] = get_builds()
+        self.labels: List[str] = [build_label(build) for build in self.builds]
+        self.repetitions: int = repetitions
+        self.seed: int = seed
+        self.max_turns: int = max_turns
+        self.checkpoint: Optional[str] = checkpoint
+
+        matchups: List[Tuple[int, int]] = list(itertools.product(range(len(self.builds)), repeat=2))
+        self.chunks: List[List[Tuple[int, int]]] = [matchups[start:start + chunk_size]
+                                                    for start in range(0, len(matchups), chunk_size)]
+
+        # Outcome counts indexed by [player build, enemy build, outcome] with outcomes win, draw, loss, timeout
+        self.counts: np.ndarray = np.zeros((len(self.builds), len(self.builds), 4), dtype=np.int64)
+        self.done: set = set()
+
+        if checkpoint and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    @property
+    def settings(self) -> dict:
+        return {"seed": self.seed,
+                "repetitions": self.repetitions,
+                "max_turns": self.max_turns,
+                "chunks": len(self.chunks),
+                "builds": self.labels}
+
+    @property
+    def win_rates(self) -> np.ndarray:
+        """
+        Get the win rate of the player build (rows) against the enemy build (columns)
+
+        :return: Win rate matrix
+        """
+        played: np.ndarray = self.counts.sum(axis=2)
+        return np.divide(self.counts[:, :, 0], played, out=np.zeros(played.shape), where=played > 0)
+
+    def run(self, workers: Optional[int] = None, checkpoint_every: int = 10) -> None:
+        """
+        Play all chunks not finished yet in a process pool, merging results as they arrive
+
+        :param workers: Number of worker processes, defaults to the number of CPUs
+        :param checkpoint_every: Number of finished chunks between checkpoint writes
+        :return: None
+        """
+        tasks: list = [(chunk, self.seed, matchups, self.repetitions, self.max_turns)
+                       for chunk, matchups in enumerate(self.chunks) if chunk not in self.done]
+
+        with Pool(processes=workers, initializer=_init_worker) as pool:
+            for finished, (chunk, counts) in enumerate(pool.imap_unordered(_play_chunk, tasks), start=1):
+                for player, enemy, tally in counts:
+                    self.counts[player, enemy] += tally
+                self.done.add(chunk)
+
+                if self.checkpoint and finished % checkpoint_every == 0:
+                    self._save_checkpoint()
+
+        if self.checkpoint:
+            self._save_checkpoint()
+
+    def to_dict(self) -> dict:
+        return {**self.settings,
+                "win_rates": np.round(self.win_rates, 4).tolist()}
+
+    def _save_checkpoint(self) -> None:
+        """
+        Atomically write finished chunks and outcome counts to the checkpoint file
+
+        :return: None
+        """
+        data: dict = {**self.settings, "done": sorted(self.done), "counts": self.counts.tolist()}
+        temp_path: str = f"{self.checkpoint}.tmp"
+
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(data, checkpoint_file, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint)
+
+    def _load_checkpoint(self) -> None:
+        """
+        Restore finished chunks and outcome counts from the checkpoint file
+
+        :return: None
+        """
+        with open(self.checkpoint, encoding="utf-8") as checkpoint_file:
+            data: dict = json.load(checkpoint_file)
+
+        if any(data.get(key) != value for key, value in self.settings.items()):
+            raise ValueError("Checkpoint was created with different tournament settings")
+
+        self.done = set(data["done"])
+        self.counts = np.array(data["counts"], dtype=np.int64)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Run tournament
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Round-robin tournament of every class/weapon/armor build")
+    parser.add_argument("--repetitions", type=int, default=1000, help="battles per matchup")
+    parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to CPU count")
+    parser.add_argument("--chunk-size", type=int, default=64, help="matchups per worker batch")
+    parser.add_argument("--max-turns", type=int, default=1000, help="turns before a battle is a timeout")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file to resume from and write to")
+    parser.add_argument("--output", default=None, help="JSON file for the win-rate matrix")
+    args = parser.parse_args(argv)
+
+    tournament: Tournament = Tournament(repetitions=args.repetitions, seed=args.seed, chunk_size=args.chunk_size,
+                                        max_turns=args.max_turns, checkpoint=args.checkpoint)
+
+    started: float = time.perf_counter()
+    tournament.run(workers=args.workers)
+    elapsed: float = time.perf_counter() - started
+
+    battles: int = int(tournament.counts.sum())
+    print(f"{len(tournament.builds)} builds, {battles} battles, {elapsed:.1f} s")
+    for label, win_rate in zip(tournament.labels, tournament.win_rates.mean(axis=1)):
+        print(f"{label}: {win_rate:.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(tournament.to_dict(), output_file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
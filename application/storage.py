@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Storage settings
+FLUSH_INTERVAL: float = float(os.environ.get("BATTLE_STORE_FLUSH_INTERVAL", 0.05))
+
+# Seconds between the removals of the revisions of battles not seen within the TTL
+PRUNE_INTERVAL: float = 60.0
+
+# Serialized battle and its revision, the revision grows with every change of the battle
+Record = Tuple[str, int]
+
+# Serializes a dirty battle at flush time
+Serializer = Callable[[], Record]
+
+# Serializer of a dirty battle and the stored revision its changes are based on, no serializer for deleted battles
+PendingWrite = Tuple[Optional[Serializer], Optional[int]]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create battle store classes
+class BattleStore:
+    """
+    Store of serialized battles keyed by battle id. The base store keeps nothing, so battles live
+    only in the memory of the worker
+    """
+
+    def load(self, battle_id: str, max_age: float) -> Optional[Record]:
+        """
+        Load the serialized battle
+
+        :param battle_id: Battle id
+        :param max_age: Seconds since the last save after which the battle is considered expired
+        :return: Serialized battle with its revision or None if it is not stored or expired
+        """
+        return None
+
+    def is_outdated(self, battle_id: str, revision: int) -> bool:
+        """
+        Check if another worker changed the battle, answered from memory, so it is cheap on every request
+
+        :param battle_id: Battle id
+        :param revision: Revision of the battle in memory
+        :return: True if the stored battle is newer or the last write of this worker lost to another worker
+        """
+        return False
+
+    def mark_dirty(self, battle_id: str, serializer: Serializer, base_revision: int) -> None:
+        """
+        Schedule the battle to be written on the next flush
+
+        :param battle_id: Battle id
+        :param serializer: Function returning the serialized battle and its revision at flush time
+        :param base_revision: Stored revision the change is based on, the write is dropped if the stored one differs
+        :return: None
+        """
+
+    def delete(self, battle_id: str) -> None:
+        """
+        Schedule the battle to be deleted on the next flush
+
+        :param battle_id: Battle id
+        :return: None
+        """
+
+    def start(self) -> None:
+        """
+        Start the background work of the store in this process, called again in every forked worker
+
+        :return: None
+        """
+        pass
+
+    def flush(self) -> None:
+        """
+        Write all pending changes
+
+        :return: None
+        """
+
+
+class SQLiteBattleStore(BattleStore):
+    """
+    Battle store in a local SQLite file shared by the workers. Changed battles are remembered
+    and written behind the requests by a daemon thread in one transaction per flush.
+    A write only replaces the revision it was based on, so two workers never overwrite each other.
+    Every written row gets the next change number, after each flush the thread reads the rows changed since
+    the last one, so requests learn about changes of other workers without reading the database
+    """
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL, ttl: float = 1800.0):
+        """
+        Initialize the store, the database is opened on first use in the process using it,
+        so a connection is never inherited by forked workers
+
+        :param path: Path of the SQLite file
+        :param flush_interval: Seconds between flushes
+        :param ttl: Seconds after which stored battles are deleted
+        """
+        self.path: str = path
+        self.flush_interval: float = flush_interval
+        self.ttl: float = ttl
+        self._pending: Dict[str, PendingWrite] = {}
+        self._pending_lock: threading.Lock = threading.Lock()
+        self._connection_lock: threading.Lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        # Stored revisions seen by this process with the time they were seen, and the battles whose write lost
+        self._revisions: Dict[str, Tuple[int, float]] = {}
+        self._conflicts: Set[str] = set()
+        self._change: int = 0
+        self._pruned: float = time.monotonic()
+        self._writer: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Get the connection of this process, opening the database if needed. Must be called with the connection lock
+
+        :return: SQLite connection
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection: sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            connection.execute("CREATE TABLE IF NOT EXISTS battle_snapshots (id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                               "revision INTEGER NOT NULL, change INTEGER NOT NULL, updated_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS battle_snapshots_change ON battle_snapshots (change)")
+            connection.execute("CREATE INDEX IF NOT EXISTS battle_snapshots_updated_at "
+                               "ON battle_snapshots (updated_at)")
+            # Battles are loaded through this connection, so changes older than it are already seen by the loads
+            self._change = connection.execute("SELECT COALESCE(MAX(change), 0) FROM battle_snapshots").fetchone()[0]
+            self._connection, self._connection_pid = connection, os.getpid()
+
+        return self._connection
+
+    def start(self) -> None:
+        """
+        Start the writer thread, threads do not survive fork, so it is started again in every worker
+
+        :return: None
+        """
+        if self._writer is not None and self._writer.is_alive():
+            return
+
+        self._writer = threading.Thread(target=self._flush_forever, name="battle-store-writer", daemon=True)
+        self._writer.start()
+
+    def load(self, battle_id: str, max_age: float) -> Optional[Record]:
+        with self._pending_lock:
+            is_pending: bool = battle_id in self._pending
+            serializer: Optional[Serializer] = self._pending[battle_id][0] if is_pending else None
+
+        if is_pending:
+            return serializer() if serializer is not None else None
+
+        with self._connection_lock:
+            row: Optional[tuple] = self.connection.execute("SELECT data, revision FROM battle_snapshots "
+                                                           "WHERE id = ? AND updated_at > ?",
+                                                           (battle_id, time.time() - max_age)).fetchone()
+
+        with self._pending_lock:
+            self._conflicts.discard(battle_id)
+            if row is not None:
+                self._revisions[battle_id] = (row[1], time.monotonic())
+
+        return row
+
+    def is_outdated(self, battle_id: str, revision: int) -> bool:
+        with self._pending_lock:
+            if battle_id in self._pending:
+                return False
+            if battle_id in self._conflicts:
+                return True
+            stored: Optional[Tuple[int, float]] = self._revisions.get(battle_id)
+
+        return stored is not None and stored[0] > revision
+
+    def mark_dirty(self, battle_id: str, serializer: Serializer, base_revision: int) -> None:
+        with self._pending_lock:
+            # Later changes before the flush are based on the same stored revision as the first one
+            pending: Optional[PendingWrite] = self._pending.get(battle_id)
+            if pending is not None and pending[0] is not None:
+                base_revision = pending[1]
+            self._pending[battle_id] = (serializer, base_revision)
+
+    def delete(self, battle_id: str) -> None:
+        with self._pending_lock:
+            self._pending[battle_id] = (None, None)
+            self._revisions.pop(battle_id, None)
+            self._conflicts.discard(battle_id)
+
+    def flush(self) -> None:
+        with self._pending_lock:
+            pending: Dict[str, PendingWrite] = self._pending
+            self._pending = {}
+
+        if not pending:
+            return
+
+        now: float = time.time()
+        conflicts: List[str] = []
+
+        with self._connection_lock:
+            connection: sqlite3.Connection = self.connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for battle_id, (serializer, base_revision) in pending.items():
+                    if serializer is None:
+                        connection.execute("DELETE FROM battle_snapshots WHERE id = ?", (battle_id,))
+                    elif not self._write(connection, battle_id, *serializer(), base_revision, now):
+                        conflicts.append(battle_id)
+                connection.execute("DELETE FROM battle_snapshots WHERE updated_at < ?", (now - self.ttl,))
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                with self._pending_lock:
+                    for battle_id, write in pending.items():
+                        self._pending.setdefault(battle_id, write)
+                raise
+
+        if conflicts:
+            logger.warning("%d battles were changed by another worker, their changes are dropped", len(conflicts))
+
+        # The battle in memory is now a copy diverged from the stored one, changes made to it since are dropped too
+        with self._pending_lock:
+            self._conflicts.update(conflicts)
+            for battle_id in conflicts:
+                self._pending.pop(battle_id, None)
+
+    def _write(self, connection: sqlite3.Connection, battle_id: str, data: str, revision: int,
+               base_revision: Optional[int], now: float) -> bool:
+        """
+        Replace the stored battle if it still has the base revision, or insert it if it is not stored.
+        Must be called in the write transaction, which makes the change numbers grow in commit order
+
+        :param connection: SQLite connection
+        :param battle_id: Battle id
+        :param data: Serialized battle
+        :param revision: New revision
+        :param base_revision: Stored revision the change is based on
+        :param now: Write time
+        :return: True if the battle was written
+        """
+        change: int = connection.execute("SELECT COALESCE(MAX(change), 0) + 1 FROM battle_snapshots").fetchone()[0]
+        cursor: sqlite3.Cursor = connection.execute("UPDATE battle_snapshots SET data = ?, revision = ?, change = ?, "
+                                                    "updated_at = ? WHERE id = ? AND revision = ?",
+                                                    (data, revision, change, now, battle_id, base_revision))
+        if cursor.rowcount == 0:
+            cursor = connection.execute("INSERT INTO battle_snapshots (id, data, revision, change, updated_at) "
+                                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO NOTHING",
+                                        (battle_id, data, revision, change, now))
+
+        if cursor.rowcount:
+            with self._pending_lock:
+                self._revisions[battle_id] = (revision, time.monotonic())
+
+        return cursor.rowcount > 0
+
+    def poll(self) -> None:
+        """
+        Read the revisions of the battles changed since the last poll, and forget the ones not seen within the TTL
+
+        :return: None
+        """
+        with self._connection_lock:
+            rows: List[tuple] = self.connection.execute("SELECT id, revision, change FROM battle_snapshots "
+                                                        "WHERE change > ?", (self._change,)).fetchall()
+
+        now: float = time.monotonic()
+        with self._pending_lock:
+            for battle_id, revision, change in rows:
+                self._revisions[battle_id] = (revision, now)
+                self._change = max(self._change, change)
+
+            if now - self._pruned > PRUNE_INTERVAL:
+                self._pruned = now
+                self._revisions = {battle_id: (revision, seen) for battle_id, (revision, seen)
+                                   in self._revisions.items() if now - seen <= self.ttl}
+                self._conflicts &= self._revisions.keys()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self.poll()
+            except sqlite3.Error:
+                logger.exception("Failed to sync battles with %s", self.path)
+
+
+def create_store(path: Optional[str], ttl: float) -> BattleStore:
+    """
+    Create the battle store for the given path
+
+    :param path: Path of the SQLite file, battles are kept only in memory if empty
+    :param ttl: Seconds after which stored battles expire
+    :return: Battle store
+    """
+    if not path:
+        return BattleStore()
+
+    return SQLiteBattleStore(path, ttl=ttl)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import queue
+import threading
+from typing import Optional, Set
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Streaming settings
+# A sync worker serves one request at a time and an open stream never ends, so the WSGI application streams
+# only when it runs on workers that serve many connections (gevent, eventlet). The ASGI application always streams
+ENABLED: bool = os.environ.get("EVENT_STREAMING", "0") != "0"
+QUEUE_SIZE: int = 100
+HEARTBEAT_INTERVAL: float = 15.0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create subscription classes
+class Subscription:
+    """
+    Bounded queue of events for a client served by a worker thread. Pushing never blocks,
+    the oldest event is dropped if the client does not keep up
+    """
+
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.queue: queue.Queue = queue.Queue(maxsize)
+
+    def push(self, event: dict) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float = HEARTBEAT_INTERVAL) -> Optional[dict]:
+        """
+        Wait for the next event
+
+        :param timeout: Seconds to wait
+        :return: Event or None on timeout
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """
+    Bounded queue of events for a client served by an event loop, events can be pushed from any thread
+    """
+
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def push(self, event: dict) -> None:
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: dict) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float = HEARTBEAT_INTERVAL) -> Optional[dict]:
+        """
+        Wait for the next event
+
+        :param timeout: Seconds to wait
+        :return: Event or None on timeout
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create battle channel class
+class BattleChannel:
+    """
+    Fan-out of the turn events of one battle to its subscribers
+    """
+    __slots__ = ("_subscribers", "_lock")
+
+    def __init__(self):
+        self._subscribers: Set[Subscription | AsyncSubscription] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+    def subscribe(self, subscription: Subscription | AsyncSubscription) -> None:
+        with self._lock:
+            self._subscribers.add(subscription)
+
+    def unsubscribe(self, subscription: Subscription | AsyncSubscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: dict) -> None:
+        """
+        Push the event to every subscriber without blocking
+
+        :param event: Turn event
+        :return: None
+        """
+        with self._lock:
+            subscribers: list = list(self._subscribers)
+
+        for subscription in subscribers:
+            subscription.push(event)
+
+
+def format_event(event: Optional[dict]) -> str:
+    """
+    Format the event as a server-sent event, or a heartbeat comment if there is no event
+
+    :param event: Turn event or None
+    :return: Server-sent event text
+    """
+    if event is None:
+        return ": heartbeat\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
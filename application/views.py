@@ -0,0 +1,358 @@
+import time
+from typing import Any, Mapping, MutableMapping, Optional, Tuple, Type
+from uuid import uuid4
+
+from werkzeug.exceptions import abort
+from werkzeug.datastructures import ETags
+
+from application import metrics
+from application.assets import BUILD_DIR
+from application import game
+from application.game import auto_battle, battles, create_enemy, create_unit, equipment, get_estimate, \
+    get_ticket_state, join_queue, leave_queue, matchmaker
+from application.matchmaking import Ticket
+from application.models.battle import Battle
+from application.models.unit import BaseUnit, EnemyUnit, PlayerUnit
+from application.pages import Page, pages
+from application.streaming import BattleChannel
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Route logic shared by the WSGI and ASGI applications. The functions never touch the request or the framework,
+# they take the session and the submitted data and raise werkzeug HTTP errors that both frameworks answer,
+# app.py and asgi.py only read the request, look up the battle and turn the results into responses.
+# Views that change a battle save it, so reading a battle never writes it to the store
+Session = MutableMapping[str, Any]
+
+HERO_TYPES: Mapping[str, Type[BaseUnit]] = {"player": PlayerUnit, "enemy": EnemyUnit}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create request helpers
+def get_battle_id(session: Session) -> str:
+    """
+    Get the battle id of the user session, creating a new one if needed
+
+    :param session: User session
+    :return: Battle id
+    """
+    battle_id: Optional[str] = session.get("battle_id")
+
+    if battle_id is None:
+        battle_id = session["battle_id"] = uuid4().hex
+
+    return battle_id
+
+
+def get_page(template_name: str) -> Tuple[int, Optional[Page]]:
+    """
+    Get a page that is the same for every user. The version is read before the context is built,
+    so a page rendered during a reload is stored under the old version
+
+    :param template_name: Template name
+    :return: Catalog version and the rendered page or None if it has to be rendered with this version
+    """
+    version: int = equipment.version
+    return version, pages.get(template_name, version)
+
+
+def get_page_response(response_class: type, page: Page, if_none_match: ETags):
+    """
+    Answer the cached page, or 304 if the browser has it
+
+    :param response_class: Response class of the application
+    :param page: Rendered page
+    :param if_none_match: ETags sent by the browser
+    :return: Response
+    """
+    if if_none_match.contains(page.etag):
+        response = response_class(status=304)
+    else:
+        response = response_class(page.body, mimetype="text/html")
+
+    response.set_etag(page.etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def cache_built_assets(path: str, response) -> None:
+    """
+    Let browsers cache content-hashed assets forever
+
+    :param path: Request path
+    :param response: Response to the request
+    :return: None
+    """
+    if path.startswith(f"/static/{BUILD_DIR}/") and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+
+
+def observe_request(route: Optional[str], method: str, started: Optional[float]) -> None:
+    """
+    Record the latency of the request when metrics are enabled
+
+    :param route: Matched URL rule, None for unknown URLs
+    :param method: Request method
+    :param started: Value of time.perf_counter at the start of the request
+    :return: None
+    """
+    if route is not None and started is not None:
+        metrics.registry.histogram("http_request_duration_seconds",
+                                   route=route, method=method).observe(time.perf_counter() - started)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create game views
+def estimate(query: Mapping[str, str]) -> dict:
+    """
+    Win probability and expected battle length of two hero configurations
+
+    :param query: Query arguments of get_estimate
+    :return: Estimate
+    """
+    try:
+        return get_estimate(query)
+    except ValueError as error:
+        abort(400, str(error))
+
+
+def start_fight(battle: Battle) -> Optional[dict]:
+    """
+    Start the battle of the chosen heroes
+
+    :param battle: Battle of the session
+    :return: Heroes or None if they are not chosen yet
+    """
+    with battle.lock:
+        if not battle.heroes.get("player") or not battle.heroes.get("enemy"):
+            return None
+
+        battle.arena.start_game(battle.heroes.get("player"), battle.heroes.get("enemy"))
+        heroes: dict = dict(battle.heroes)
+
+    battles.save(battle)
+    return heroes
+
+
+def play_turn(battle: Battle, action: str) -> Tuple[dict, str]:
+    """
+    Perform a turn of the player
+
+    :param battle: Battle of the session
+    :param action: hit, use-skill or pass-turn
+    :return: Heroes and the turn result
+    """
+    with battle.lock:
+        result: str = battle.play_turn(action)
+        heroes: dict = dict(battle.heroes)
+
+    battles.save(battle)
+    return heroes, result
+
+
+def play_api_turn(battle: Battle, action: str) -> dict:
+    """
+    Perform a turn and get only the changed part of the fight page. The state is always returned,
+    the event stream only shows the turn step by step and may be served by another worker
+
+    :param battle: Battle of the session
+    :param action: hit, use-skill or pass-turn
+    :return: Turn state
+    """
+    if action not in Battle.ACTIONS:
+        abort(404)
+
+    with battle.lock:
+        if battle.arena.player is None:
+            abort(409, "Battle is not started")
+
+        state: dict = battle.get_turn_state(battle.play_turn(action))
+
+    battles.save(battle)
+    return state
+
+
+def auto_fight(battle: Battle, form: Mapping[str, str]) -> dict:
+    """
+    Play the battle to the end with a player policy
+
+    :param battle: Battle of the session
+    :param form: Form or query with optional policy
+    :return: Final state and the compressed replay log
+    """
+    with battle.lock:
+        if not battle.heroes.get("player") or not battle.heroes.get("enemy"):
+            abort(409, "Heroes are not chosen")
+
+        try:
+            state: dict = auto_battle(battle, form)
+        except ValueError as error:
+            abort(400, str(error))
+
+    battles.save(battle)
+    return state
+
+
+def subscribe(battle: Battle, subscription) -> BattleChannel:
+    """
+    Subscribe to the turn events of the battle
+
+    :param battle: Battle of the session
+    :param subscription: Subscription or AsyncSubscription
+    :return: Channel to unsubscribe from when the stream is closed
+    """
+    with battle.lock:
+        channel: BattleChannel = battle.get_channel()
+        channel.subscribe(subscription)
+
+    return channel
+
+
+def get_log(battle: Battle) -> str:
+    """
+    Replay log of the battle
+
+    :param battle: Battle of the session
+    :return: Log as JSON
+    """
+    with battle.lock:
+        if battle.arena.log is None:
+            abort(409, "Battle is not started")
+
+        return battle.arena.log.dumps()
+
+
+def end_fight(session: Session) -> None:
+    """
+    Forget the battle of the session
+
+    :param session: User session
+    :return: None
+    """
+    battle_id: Optional[str] = session.pop("battle_id", None)
+
+    if battle_id is not None:
+        battles.discard(battle_id)
+
+
+def create_hero(role: str, form: Mapping[str, str]) -> BaseUnit:
+    """
+    Create a hero from the hero choosing form
+
+    :param role: player or enemy
+    :param form: Submitted form
+    :return: Unit
+    """
+    try:
+        return create_enemy(form) if role == "enemy" else create_unit(HERO_TYPES[role], form)
+    except ValueError as error:
+        abort(400, str(error))
+
+
+def set_hero(battle: Battle, role: str, unit: BaseUnit) -> None:
+    """
+    Store the created hero in the battle of the user and save it
+
+    :param battle: Battle of the user
+    :param role: player or enemy
+    :param unit: Created hero
+    :return: None
+    """
+    with battle.lock:
+        battle.heroes[role] = unit
+
+    battles.save(battle)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create player-versus-player views
+def check_matchmaking() -> None:
+    """
+    Refuse player-versus-player requests when several worker processes serve the application,
+    the queue and the duels live in the memory of one of them
+
+    :return: None
+    """
+    if not game.matchmaking_enabled:
+        abort(503, "Matchmaking needs a single worker process")
+
+
+def join_pvp_queue(session: Session, battle: Battle) -> dict:
+    """
+    Put the hero chosen on /choose-hero/ into the matchmaking queue
+
+    :param session: User session
+    :param battle: Battle of the session holding the chosen hero
+    :return: Ticket state
+    """
+    check_matchmaking()
+    with battle.lock:
+        player: Optional[PlayerUnit] = battle.heroes.get("player")
+
+    if player is None:
+        abort(409, "Hero is not chosen")
+
+    leave_queue(session.pop("pvp_ticket", ""))
+
+    try:
+        ticket: Ticket = join_queue(player)
+    except ValueError as error:
+        abort(400, str(error))
+
+    session["pvp_ticket"] = ticket.id
+    return get_ticket_state(ticket)
+
+
+def poll_pvp_queue(session: Session) -> dict:
+    """
+    Matchmaking status, pairs the player if an opponent is found
+
+    :param session: User session
+    :return: Ticket state
+    """
+    check_matchmaking()
+    ticket: Optional[Ticket] = matchmaker.poll(session.get("pvp_ticket", ""))
+
+    if ticket is None:
+        abort(404, "Not in the queue")
+
+    return get_ticket_state(ticket)
+
+
+def leave_pvp_queue(session: Session) -> None:
+    """
+    Remove the ticket of the user from the matchmaking queue
+
+    :param session: User session
+    :return: None
+    """
+    check_matchmaking()
+    leave_queue(session.pop("pvp_ticket", ""))
+
+
+def play_pvp_turn(session: Session, action: str) -> dict:
+    """
+    Perform the turn of the player in the duel
+
+    :param session: User session
+    :param action: hit, use-skill or pass-turn
+    :return: Duel as seen by the player
+    """
+    check_matchmaking()
+    if action not in Battle.ACTIONS:
+        abort(404)
+
+    ticket: Optional[Ticket] = matchmaker.poll(session.get("pvp_ticket", ""))
+
+    if ticket is None or ticket.match is None:
+        abort(409, "Duel is not started")
+
+    with ticket.match.lock:
+        try:
+            ticket.match.act(ticket.role, action)
+        except ValueError as error:
+            abort(409, str(error))
+
+        return ticket.match.get_state(ticket.role)
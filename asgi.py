@@ -0,0 +1,261 @@
+import os
+import time
+from typing import Callable, Optional
+
+from quart import Quart, request, redirect, url_for, session, jsonify, g, make_response
+from quart import render_template as quart_render_template
+
+from application import metrics, views
+from application.game import battles, get_hero_choosing_page_context, get_matchups, load_shared_state
+from application.models.battle import Battle
+from application.pages import create_bytecode_cache, pages
+from application.streaming import AsyncSubscription, BattleChannel, format_event
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create application quart instance, the routes only adapt application.views to Quart. Turns take microseconds
+# and run on the event loop, but loading a battle may read the SQLite battle store and estimates may simulate
+# thousands of battles, both run in a thread so the loop keeps serving the other battles
+app = Quart(__name__)
+app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(32)
+app.json.ensure_ascii = False
+app.jinja_options = {**app.jinja_options, "bytecode_cache": create_bytecode_cache(is_async=True)}
+app.jinja_env.globals["streaming"] = True
+
+
+async def render_template(template_name: str, **context) -> str:
+    """
+    Render the template, timing it when metrics are enabled
+    """
+    with metrics.timer("template_render_duration_seconds", template=template_name):
+        return await quart_render_template(template_name, **context)
+
+
+async def render_cached_page(template_name: str, get_context: Callable[[], dict] = dict):
+    """
+    Render a page that is the same for every user once per catalog version and answer 304 if the browser has it
+    """
+    version, page = views.get_page(template_name)
+
+    if page is None:
+        page = pages.put(template_name, version, await render_template(template_name, **get_context()))
+
+    return views.get_page_response(app.response_class, page, request.if_none_match)
+
+
+@app.before_serving
+async def preload():
+    """
+    Load the equipment catalog, the matchup table and the compiled templates before the first request
+    """
+    load_shared_state()
+
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+
+
+if metrics.ENABLED:
+    @app.before_request
+    async def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    async def record_request_latency(response):
+        views.observe_request(request.url_rule and request.url_rule.rule, request.method, g.get("request_started"))
+        return response
+
+
+@app.after_request
+async def cache_built_assets(response):
+    """
+    Let browsers cache content-hashed assets forever
+    """
+    views.cache_built_assets(request.path, response)
+    return response
+
+
+async def get_battle() -> Battle:
+    """
+    Get the battle of the current user session, creating a new one if needed.
+    A battle that is not in memory or was changed by another worker is read from the store in a thread
+
+    :return: Battle object
+    """
+    battle_id: str = views.get_battle_id(session)
+    return battles.find(battle_id) or await app.ensure_async(battles.get)(battle_id)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create routes for game
+@app.route("/")
+async def menu_page():
+    """
+    Main start page
+    """
+    return await render_cached_page("index.html")
+
+
+@app.route("/metrics")
+async def metrics_page():
+    """
+    Prometheus metrics aggregated across workers
+    """
+    return app.response_class(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/matchups")
+async def matchups_page():
+    """
+    Expected damage per turn of every attacker and defender pairing, filtered by attacker, weapon, defender, armor
+    """
+    return jsonify(get_matchups(request.args))
+
+
+@app.route("/estimate")
+async def estimate_page():
+    """
+    Win probability and expected battle length of two hero configurations
+    """
+    return jsonify(await app.ensure_async(views.estimate)(request.args))
+
+
+@app.route("/fight/")
+async def start_fight():
+    """
+    Arena start page
+    """
+    heroes: Optional[dict] = views.start_fight(await get_battle())
+
+    if heroes is None:
+        return redirect(url_for("choose_hero"))
+
+    return await render_template("fight.html", heroes=heroes)
+
+
+@app.route("/fight/<any('hit', 'use-skill', 'pass-turn'):action>")
+async def fight_turn(action: str):
+    """
+    Hit, skill and pass turn buttons with game logic
+    """
+    heroes, result = views.play_turn(await get_battle(), action)
+    return await render_template("fight.html", heroes=heroes, result=result)
+
+
+@app.route("/fight/api/<action>", methods=["POST"])
+async def fight_api(action: str):
+    """
+    Perform a turn and return only the changed part of the fight page as JSON
+    """
+    return jsonify(views.play_api_turn(await get_battle(), action))
+
+
+@app.route("/fight/auto", methods=["POST"])
+async def auto_fight():
+    """
+    Play the battle to the end with a player policy and return the final state and the compressed replay log
+    """
+    return jsonify(views.auto_fight(await get_battle(), await request.values))
+
+
+@app.route("/fight/events")
+async def fight_events():
+    """
+    Stream turn events of the current battle as server-sent events
+    """
+    subscription: AsyncSubscription = AsyncSubscription()
+    channel: BattleChannel = views.subscribe(await get_battle(), subscription)
+
+    async def stream():
+        try:
+            yield b": connected\n\n"
+            while True:
+                yield format_event(await subscription.get()).encode()
+        finally:
+            channel.unsubscribe(subscription)
+
+    response = await make_response(stream(), {"Content-Type": "text/event-stream",
+                                              "Cache-Control": "no-cache",
+                                              "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+
+@app.route("/fight/log")
+async def fight_log():
+    """
+    Replay log of the current battle
+    """
+    return app.response_class(views.get_log(await get_battle()), mimetype="application/json")
+
+
+@app.route("/fight/end-fight")
+async def end_fight():
+    """
+    End game button with game logic
+    """
+    views.end_fight(session)
+    return await render_cached_page("index.html")
+
+
+@app.route("/choose-hero/", methods=['POST', 'GET'])
+async def choose_hero():
+    """
+    Start screen with player creation
+    """
+    if request.method == "GET":
+        return await render_cached_page("hero_choosing.html", get_hero_choosing_page_context)
+
+    views.set_hero(await get_battle(), "player", views.create_hero("player", await request.form))
+    return redirect(url_for("choose_enemy"), 301)
+
+
+@app.route("/choose-enemy/", methods=['POST', 'GET'])
+async def choose_enemy():
+    """
+    Start screen with enemy creation
+    """
+    if request.method == "GET":
+        return await render_cached_page("hero_choosing.html", get_hero_choosing_page_context)
+
+    views.set_hero(await get_battle(), "enemy", views.create_hero("enemy", await request.form))
+    return redirect(url_for("start_fight"), 301)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create routes for player-versus-player battles
+@app.route("/pvp/queue", methods=["POST"])
+async def join_pvp_queue():
+    """
+    Put the hero chosen on /choose-hero/ into the matchmaking queue
+    """
+    return jsonify(views.join_pvp_queue(session, await get_battle()))
+
+
+@app.route("/pvp/queue")
+async def poll_pvp_queue():
+    """
+    Matchmaking status, pairs the player if an opponent is found
+    """
+    return jsonify(views.poll_pvp_queue(session))
+
+
+@app.route("/pvp/queue", methods=["DELETE"])
+async def leave_pvp_queue():
+    """
+    Leave the queue, or the duel, which the opponent then wins
+    """
+    views.leave_pvp_queue(session)
+    return "", 204
+
+
+@app.route("/pvp/duel/<action>", methods=["POST"])
+async def pvp_turn(action: str):
+    """
+    Perform the turn of the player in the duel
+    """
+    return jsonify(views.play_pvp_turn(session, action))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Run game
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Line of the -X importtime report: "import time:      self [us] |  cumulative | imported package"
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create import time report
+@dataclass(slots=True)
+class ImportTime:
+    """
+    Class representing one module of the import time report \n
+    module: Module name \n
+    self_us: Microseconds spent in the module itself \n
+    cumulative_us: Microseconds spent in the module and its imports \n
+    level: Nesting level, 0 for imports of the measured statement
+    """
+    module: str
+    self_us: int
+    cumulative_us: int
+    level: int
+
+
+def measure(statement: str) -> List[ImportTime]:
+    """
+    Run the statement in a fresh interpreter with -X importtime. Background tasks are not started,
+    the report covers the import alone
+
+    :param statement: Python statement, for example "import app"
+    :return: Modules in import order
+    """
+    environment: Dict[str, str] = dict(os.environ, START_BACKGROUND_TASKS="0")
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                             capture_output=True, text=True, env=environment)
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    modules: List[ImportTime] = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules.append(ImportTime(module=match[4], self_us=int(match[1]), cumulative_us=int(match[2]),
+                                      level=(len(match[3]) - 1) // 2))
+
+    return modules
+
+
+def get_total(modules: List[ImportTime]) -> int:
+    return sum(module.cumulative_us for module in modules if module.level == 0)
+
+
+def report(statement: str, repeat: int, top: int) -> dict:
+    """
+    Measure the import several times and keep the fastest run, the first one also fills the bytecode caches
+
+    :param statement: Python statement to measure
+    :param repeat: Number of runs
+    :param top: Number of the slowest modules to report
+    :return: Total time, slowest top-level imports and slowest modules by self time
+    """
+    modules: List[ImportTime] = min((measure(statement) for _ in range(repeat)), key=get_total)
+
+    return {"statement": statement,
+            "total_ms": round(get_total(modules) / 1000, 1),
+            "modules": len(modules),
+            "top_level": [(module.module, round(module.cumulative_us / 1000, 1))
+                          for module in sorted((module for module in modules if module.level == 0),
+                                               key=lambda module: module.cumulative_us, reverse=True)[:top]],
+            "slowest": [(module.module, round(module.self_us / 1000, 1))
+                        for module in sorted(modules, key=lambda module: module.self_us, reverse=True)[:top]]}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Import time of the application, per module")
+    parser.add_argument("--statement", default="import app", help="statement to measure, e.g. 'import asgi'")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the fastest one is reported")
+    parser.add_argument("--top", type=int, default=15, help="number of the slowest modules to show")
+    parser.add_argument("--budget-ms", type=float, default=None, help="exit with an error above this total")
+    args = parser.parse_args(argv)
+
+    result: dict = report(args.statement, args.repeat, args.top)
+
+    print(f"{result['statement']}: {result['total_ms']} ms, {result['modules']} modules")
+    print("\nSlowest imports with their dependencies, ms:")
+    for module, milliseconds in result["top_level"]:
+        print(f"  {milliseconds:8.1f}  {module}")
+    print("\nSlowest modules by own time, ms:")
+    for module, milliseconds in result["slowest"]:
+        print(f"  {milliseconds:8.1f}  {module}")
+
+    if args.budget_ms is not None and result["total_ms"] > args.budget_ms:
+        sys.exit(f"Import time {result['total_ms']} ms is over the budget of {args.budget_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
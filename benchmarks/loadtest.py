@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Forms used by every virtual player
+HERO_FORM: Dict[str, str] = {"name": "Игрок", "unit_class": "Воин", "weapon": "топорик", "armor": "кожаная броня"}
+ENEMY_FORM: Dict[str, str] = {"name": "Враг", "unit_class": "Маг", "weapon": "магический посох",
+                              "armor": "магическая роба"}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create minimal HTTP/1.1 client with keep-alive and cookies
+class Client:
+    """
+    HTTP client of one virtual player, reconnecting when the server closes the connection
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host: str = host
+        self.port: int = port
+        self.cookies: Dict[str, str] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, form: Optional[dict] = None) -> Tuple[int, bytes]:
+        """
+        Send a request and read the whole response
+
+        :param method: HTTP method
+        :param path: Request path
+        :param form: Form fields sent url-encoded
+        :return: Status code and body
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        body: bytes = urlencode(form).encode() if form else b""
+        headers: List[str] = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                              f"Content-Length: {len(body)}"]
+        if form:
+            headers.append("Content-Type: application/x-www-form-urlencoded")
+        if self.cookies:
+            headers.append("Cookie: " + "; ".join(f"{key}={value}" for key, value in self.cookies.items()))
+
+        self._writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+        await self._writer.drain()
+
+        status_line: bytes = await self._reader.readline()
+        status: int = int(status_line.split()[1])
+        response_headers: Dict[str, str] = {}
+        while (line := await self._reader.readline()) not in (b"\r\n", b""):
+            key, _, value = line.decode("latin-1").partition(":")
+            key, value = key.strip().lower(), value.strip()
+            if key == "set-cookie":
+                name, _, cookie = value.split(";")[0].partition("=")
+                self.cookies[name] = cookie
+            response_headers[key] = value
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            data: bytes = b""
+            while size := int((await self._reader.readline()).strip(), 16):
+                data += await self._reader.readexactly(size + 2)
+                data = data[:-2]
+            await self._reader.readline()
+        elif "content-length" in response_headers:
+            data = await self._reader.readexactly(int(response_headers["content-length"]))
+        else:
+            data = await self._reader.read()
+
+        if response_headers.get("connection", "").lower() == "close" or "content-length" not in response_headers \
+                and response_headers.get("transfer-encoding") != "chunked":
+            await self.close()
+
+        return status, data
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create virtual player
+async def play(client: Client, latencies: List[float], think_time: float, deadline: float) -> int:
+    """
+    Play fights one after another until the deadline
+
+    :param client: HTTP client of the player
+    :param latencies: List collecting request latencies in seconds
+    :param think_time: Pause between turns, the time a player holds the fight page open
+    :param deadline: Monotonic time to stop at
+    :return: Number of finished fights
+    """
+    async def timed(method: str, path: str, form: Optional[dict] = None) -> bytes:
+        started: float = time.perf_counter()
+        status, data = await client.request(method, path, form)
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        return data
+
+    fights: int = 0
+    while time.monotonic() < deadline:
+        await timed("POST", "/choose-hero/", HERO_FORM)
+        await timed("POST", "/choose-enemy/", ENEMY_FORM)
+        await timed("GET", "/fight/")
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(think_time)
+            turn: dict = json.loads(await timed("POST", "/fight/api/hit"))
+            if turn["battle_over"]:
+                fights += 1
+                break
+
+    return fights
+
+
+async def run(url: str, players: int, duration: float, think_time: float) -> dict:
+    """
+    Run concurrent virtual players against the server
+
+    :param url: Base URL of the server
+    :param players: Number of concurrent players
+    :param duration: Test duration in seconds
+    :param think_time: Pause between turns
+    :return: Throughput and latency statistics
+    """
+    address = urlsplit(url)
+    clients: List[Client] = [Client(address.hostname, address.port or 80) for _ in range(players)]
+    latencies: List[float] = []
+    deadline: float = time.monotonic() + duration
+
+    started: float = time.perf_counter()
+    results: list = await asyncio.gather(*(play(client, latencies, think_time, deadline) for client in clients),
+                                         return_exceptions=True)
+    elapsed: float = time.perf_counter() - started
+
+    for client in clients:
+        await client.close()
+
+    errors: List[str] = [repr(result) for result in results if isinstance(result, BaseException)]
+    latencies.sort()
+
+    return {"url": url,
+            "players": players,
+            "fights": sum(result for result in results if isinstance(result, int)),
+            "requests": len(latencies),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+            "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else None,
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Concurrent fights load test, e.g. sync gunicorn vs async hypercorn")
+    parser.add_argument("--url", action="append", required=True, help="server base URL, can be repeated")
+    parser.add_argument("--players", type=int, default=200, help="concurrent players")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per server")
+    parser.add_argument("--think-time", type=float, default=0.5, help="seconds between turns of a player")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results: List[dict] = []
+    for url in args.url:
+        result: dict = asyncio.run(run(url, args.players, args.duration, args.think_time))
+        results.append(result)
+        print(json.dumps(result, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
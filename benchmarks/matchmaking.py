@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from application.matchmaking import Matchmaker, Ticket
+from application.simulation.tournament import get_builds
+from benchmarks.loadtest import Client
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create statistics helpers
+def summarize(latencies: List[float]) -> dict:
+    """
+    Get latency percentiles
+
+    :param latencies: Latencies in seconds
+    :return: Count, p50 and p99 in microseconds
+    """
+    if not latencies:
+        return {"count": 0}
+
+    latencies = sorted(latencies)
+    return {"count": len(latencies),
+            "p50_us": round(statistics.median(latencies) * 1e6, 2),
+            "p99_us": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1e6, 2)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# In-process load: the matchmaker alone with tens of thousands of queued players
+def run_in_process(players: int, spread: int, seed: int) -> dict:
+    """
+    Join, poll and leave with a queue growing to tens of thousands of players.
+    Ratings are drawn from 0 to spread, a wide spread keeps most players waiting
+
+    :param players: Number of players joining
+    :param spread: Highest rating
+    :param seed: Seed of the ratings
+    :return: Latencies of every operation and queue sizes
+    """
+    matchmaker: Matchmaker = Matchmaker(lambda first, second: (first.id, second.id))
+    rng: random.Random = random.Random(seed)
+    tickets: List[Ticket] = [Ticket(id=str(index), rating=rng.randint(0, spread), unit=None)
+                             for index in range(players)]
+
+    joins: List[float] = []
+    for ticket in tickets:
+        ticket.queued_at = time.monotonic()
+        started: float = time.perf_counter()
+        matchmaker.join(ticket)
+        joins.append(time.perf_counter() - started)
+    waiting: int = matchmaker.waiting
+
+    polls: List[float] = []
+    for ticket in rng.sample(tickets, min(players, 10000)):
+        started = time.perf_counter()
+        matchmaker.poll(ticket.id)
+        polls.append(time.perf_counter() - started)
+
+    leaves: List[float] = []
+    for ticket in rng.sample(tickets, min(players, 10000)):
+        started = time.perf_counter()
+        matchmaker.leave(ticket.id)
+        leaves.append(time.perf_counter() - started)
+
+    return {"players": players,
+            "spread": spread,
+            "waiting_after_join": waiting,
+            "matched": sum(ticket.match is not None for ticket in tickets),
+            "join": summarize(joins),
+            "join_last_10000": summarize(joins[-10000:]),
+            "poll": summarize(polls),
+            "leave": summarize(leaves)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# HTTP load: virtual players queueing and playing duels against a running server
+async def play(client: Client, form: Dict[str, str], latencies: List[float], waits: List[float],
+               poll_interval: float, deadline: float) -> int:
+    """
+    Queue, wait for an opponent and play the duel, again and again until the deadline
+
+    :param client: HTTP client of the player
+    :param form: Hero choosing form
+    :param latencies: List collecting request latencies in seconds
+    :param waits: List collecting times to match in seconds
+    :param poll_interval: Seconds between polls
+    :param deadline: Monotonic time to stop at
+    :return: Number of finished duels
+    """
+    async def timed(method: str, path: str, data: Optional[dict] = None) -> dict:
+        started: float = time.perf_counter()
+        status, body = await client.request(method, path, data)
+        latencies.append(time.perf_counter() - started)
+        if status >= 400 and status != 409:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        return json.loads(body) if body and status < 300 else {}
+
+    duels: int = 0
+    await timed("POST", "/choose-hero/", form)
+
+    while time.monotonic() < deadline:
+        queued: float = time.monotonic()
+        state: dict = await timed("POST", "/pvp/queue")
+        while state.get("status") != "matched" and time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            state = await timed("GET", "/pvp/queue")
+        if state.get("status") != "matched":
+            break
+        waits.append(time.monotonic() - queued)
+
+        duel: dict = state["duel"]
+        while not duel["battle_over"] and time.monotonic() < deadline:
+            if duel["your_turn"]:
+                duel = await timed("POST", "/pvp/duel/hit") or duel
+            else:
+                await asyncio.sleep(poll_interval)
+                duel = (await timed("GET", "/pvp/queue")).get("duel", duel)
+        duels += duel["battle_over"]
+
+    await timed("DELETE", "/pvp/queue")
+    return duels
+
+
+async def run_http(url: str, players: int, duration: float, poll_interval: float, seed: int) -> dict:
+    """
+    Run concurrent virtual players with random builds against the server
+
+    :param url: Base URL of the server
+    :param players: Number of concurrent players
+    :param duration: Test duration in seconds
+    :param poll_interval: Seconds between polls
+    :param seed: Seed of the builds
+    :return: Throughput, latency and time to match statistics
+    """
+    address = urlsplit(url)
+    rng: random.Random = random.Random(seed)
+    builds = get_builds()
+    forms: List[Dict[str, str]] = [{"name": f"Игрок {index}", "unit_class": build.unit_class.name,
+                                    "weapon": build.weapon.name, "armor": build.armor.name}
+                                   for index, build in enumerate(rng.choice(builds) for _ in range(players))]
+    clients: List[Client] = [Client(address.hostname, address.port or 80) for _ in range(players)]
+    latencies: List[float] = []
+    waits: List[float] = []
+    deadline: float = time.monotonic() + duration
+
+    started: float = time.perf_counter()
+    results: list = await asyncio.gather(*(play(client, form, latencies, waits, poll_interval, deadline)
+                                           for client, form in zip(clients, forms)), return_exceptions=True)
+    elapsed: float = time.perf_counter() - started
+
+    for client in clients:
+        await client.close()
+
+    errors: List[str] = [repr(result) for result in results if isinstance(result, BaseException)]
+    waits.sort()
+
+    return {"url": url,
+            "players": players,
+            "duel_sides_finished": sum(result for result in results if isinstance(result, int)),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "requests": summarize(latencies),
+            "time_to_match_p50_s": round(statistics.median(waits), 3) if waits else None,
+            "time_to_match_p99_s": round(waits[max(int(len(waits) * 0.99) - 1, 0)], 3) if waits else None,
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Matchmaking load generator, in-process or against a server")
+    parser.add_argument("--players", type=int, default=50000, help="players joining the queue")
+    parser.add_argument("--spread", type=int, default=100000000, help="highest rating of in-process players")
+    parser.add_argument("--url", default=None, help="server base URL, runs virtual players over HTTP")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of the HTTP test")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="seconds between polls of a player")
+    parser.add_argument("--seed", type=int, default=0, help="seed of ratings and builds")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        result: dict = asyncio.run(run_http(args.url, args.players, args.duration, args.poll_interval, args.seed))
+    else:
+        result = run_in_process(args.players, args.spread, args.seed)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import gc
+import tracemalloc
+from typing import List, Optional
+from uuid import uuid4
+
+from application.models.battle import Battle, BattleRegistry
+from application.models.classes import unit_classes
+from application.models.equipment import Equipment
+from application.models.unit import PlayerUnit, EnemyUnit
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create memory benchmark
+def create_battle(registry: BattleRegistry, equipment: Equipment) -> Battle:
+    """
+    Create a started battle the same way the choose-hero, choose-enemy and fight routes do
+
+    :param registry: Battle registry
+    :param equipment: Equipment catalog
+    :return: Battle object
+    """
+    battle: Battle = registry.get(uuid4().hex)
+
+    player: PlayerUnit = PlayerUnit(name="Игрок", unit_class=unit_classes["Воин"])
+    player.equip_weapon(equipment.get_weapon("топорик"))
+    player.equip_armor(equipment.get_armor("панцирь"))
+    enemy: EnemyUnit = EnemyUnit(name="Враг", unit_class=unit_classes["Маг"])
+    enemy.equip_weapon(equipment.get_weapon("магический посох"))
+    enemy.equip_armor(equipment.get_armor("магическая роба"))
+
+    battle.heroes["player"] = player
+    battle.heroes["enemy"] = enemy
+    battle.arena.start_game(player, enemy)
+    battle.arena.player_hit()
+
+    return battle
+
+
+def measure(battles: int) -> float:
+    """
+    Measure the memory held by live battles
+
+    :param battles: Number of battles to create
+    :return: Bytes per live battle
+    """
+    equipment: Equipment = Equipment()
+    registry: BattleRegistry = BattleRegistry(max_battles=battles)
+
+    gc.collect()
+    tracemalloc.start()
+    before: int = tracemalloc.get_traced_memory()[0]
+
+    for _ in range(battles):
+        create_battle(registry, equipment)
+
+    gc.collect()
+    after: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / battles
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Memory used per live battle")
+    parser.add_argument("--battles", type=int, default=10000, help="number of live battles")
+    args = parser.parse_args(argv)
+
+    print(f"{measure(args.battles):.0f} bytes per live battle ({args.battles} battles)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from application.analytics import EventBuffer, EventExporter
+from application.models.base import Arena
+from application.models.classes import unit_classes
+from application.models.effects import StatusEffect, DOT
+from application.models.equipment import Equipment
+from application.models.policies import EnemyPolicy, PlayerPolicy, get_player_policy, get_policy
+from application.models.rng import BattleRandom
+from application.models.skills import SkillState
+from application.models.team import TeamArena
+from application.models.unit import PlayerUnit, EnemyUnit
+from application.simulation.engine import Side
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Registered benchmarks: name -> factory returning the function to time
+BENCHMARKS: Dict[str, Callable[[], Callable[[], None]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    def register(factory: Callable[[], Callable[[], None]]) -> Callable[[], Callable[[], None]]:
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+def create_units(equipment: Equipment) -> tuple:
+    """
+    Create the player and enemy used by every combat benchmark
+
+    :param equipment: Equipment catalog
+    :return: Player and enemy units
+    """
+    player: PlayerUnit = PlayerUnit(name="Игрок", unit_class=unit_classes["Воин"])
+    player.equip_weapon(equipment.get_weapon("топорик"))
+    player.equip_armor(equipment.get_armor("кожаная броня"))
+    enemy: EnemyUnit = EnemyUnit(name="Враг", unit_class=unit_classes["Маг"])
+    enemy.equip_weapon(equipment.get_weapon("магический посох"))
+    enemy.equip_armor(equipment.get_armor("магическая роба"))
+
+    return player, enemy
+
+
+def create_arena(equipment: Equipment, seed: int = 0) -> Arena:
+    arena: Arena = Arena()
+    arena.start_game(*create_units(equipment), seed=seed)
+    return arena
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Combat benchmarks
+@benchmark("unit.count_damage")
+def bench_count_damage() -> Callable[[], None]:
+    arena: Arena = create_arena(Equipment())
+
+    def run() -> None:
+        arena.player.hp = arena.player.stamina = arena.enemy.hp = arena.enemy.stamina = 1000
+        arena.player._count_damage(arena.enemy)
+
+    return run
+
+
+@benchmark("arena.player_hit")
+def bench_player_hit() -> Callable[[], None]:
+    equipment: Equipment = Equipment()
+    arena: Arena = create_arena(equipment)
+
+    def run() -> None:
+        nonlocal arena
+        if not arena.game_is_running:
+            arena = create_arena(equipment)
+        arena.player_hit()
+
+    return run
+
+
+@benchmark("arena.next_turn")
+def bench_next_turn() -> Callable[[], None]:
+    equipment: Equipment = Equipment()
+    arena: Arena = create_arena(equipment)
+
+    def run() -> None:
+        nonlocal arena
+        if not arena.game_is_running:
+            arena = create_arena(equipment)
+        arena.next_turn()
+
+    return run
+
+
+@benchmark("arena.full_battle")
+def bench_full_battle() -> Callable[[], None]:
+    equipment: Equipment = Equipment()
+    seed: int = 0
+
+    def run() -> None:
+        nonlocal seed
+        seed += 1
+        arena: Arena = create_arena(equipment, seed=seed)
+        while arena.game_is_running:
+            arena.player_hit()
+
+    return run
+
+
+@benchmark("effects.turn_1000_stacked")
+def bench_effects_turn() -> Callable[[], None]:
+    arena: Arena = create_arena(Equipment())
+    rng: random.Random = random.Random(0)
+    for _ in range(1000):
+        arena.enemy.status.add(StatusEffect(kind=DOT, amount=0.1, duration=rng.randint(1, 50)))
+
+    def run() -> None:
+        arena.enemy.hp = 1000
+        arena._apply_status_effects()
+        # Keep 1000 effects stacked, every expired one is started again
+        for _ in range(arena.effects.expire()):
+            arena.enemy.status.add(StatusEffect(kind=DOT, amount=0.1, duration=rng.randint(1, 50)))
+
+    return run
+
+
+@benchmark("skill.use")
+def bench_skill_use() -> Callable[[], None]:
+    arena: Arena = create_arena(Equipment())
+
+    def run() -> None:
+        arena.player.stamina = arena.enemy.hp = 1000
+        arena.player.unit_class.skill.use(arena.player, arena.enemy)
+        # The status effects of the skill expire, so they do not pile up on the heap
+        arena.effects.advance()
+        arena.effects.expire()
+
+    return run
+
+
+@benchmark("skill.apply_batch_1000")
+def bench_skill_apply_batch() -> Callable[[], None]:
+    player, enemy = create_units(Equipment())
+    state: SkillState = SkillState(user_hp=np.full(1000, player.hp), user_stamina=np.full(1000, player.stamina),
+                                   user_max_health=np.full(1000, player.unit_class.max_health),
+                                   user_max_stamina=np.full(1000, player.unit_class.max_stamina),
+                                   target_hp=np.full(1000, enemy.hp), target_stamina=np.full(1000, enemy.stamina))
+    return lambda: player.unit_class.skill.apply(state)
+
+
+@benchmark("team.turn_100v100")
+def bench_team_turn() -> Callable[[], None]:
+    equipment: Equipment = Equipment()
+    seed: int = 0
+
+    def create_team_arena() -> TeamArena:
+        nonlocal seed
+        seed += 1
+        squads: List[list] = [[], []]
+        for _ in range(100):
+            for squad, unit in zip(squads, create_units(equipment)):
+                squad.append(unit)
+        arena: TeamArena = TeamArena()
+        arena.start_game(*squads, seed=seed)
+        return arena
+
+    arena: TeamArena = create_team_arena()
+
+    def run() -> None:
+        nonlocal arena
+        if not arena.game_is_running:
+            arena = create_team_arena()
+        arena.play_turn()
+
+    return run
+
+
+@benchmark("arena.auto_battle")
+def bench_auto_battle() -> Callable[[], None]:
+    equipment: Equipment = Equipment()
+    policy: PlayerPolicy = get_player_policy("conserve")
+    seed: int = 0
+
+    def run() -> None:
+        nonlocal seed
+        seed += 1
+        create_arena(equipment, seed=seed).auto_battle(policy)
+
+    return run
+
+
+@benchmark("arena.auto_battle_exported")
+def bench_auto_battle_exported() -> Callable[[], None]:
+    # The writer is not started, only the cost of recording the events on the request path is measured
+    equipment: Equipment = Equipment()
+    policy: PlayerPolicy = get_player_policy("conserve")
+    buffer: EventBuffer = EventExporter(tempfile.mkdtemp()).create_buffer("benchmark")
+    seed: int = 0
+
+    def run() -> None:
+        nonlocal seed
+        seed += 1
+        arena: Arena = create_arena(equipment, seed=seed)
+        arena.listeners.append(buffer.record)
+        arena.auto_battle(policy)
+
+    return run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Equipment benchmarks
+@benchmark("equipment.load")
+def bench_equipment_load() -> Callable[[], None]:
+    return Equipment
+
+
+@benchmark("equipment.lookup")
+def bench_equipment_lookup() -> Callable[[], None]:
+    equipment: Equipment = Equipment()
+
+    def run() -> None:
+        equipment.get_weapon("магический посох")
+        equipment.get_armor("магическая роба")
+        equipment.get_weapons_names()
+        equipment.get_armors_names()
+
+    return run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Enemy policy benchmarks: one choice in the Arena and the choices of 1000 battles in one batch call
+def bench_policy(name: str, battles: int = 0) -> Callable[[], Callable[[], None]]:
+    def factory() -> Callable[[], None]:
+        policy: EnemyPolicy = get_policy(name)
+        player, enemy = create_units(Equipment())
+        player.rng = enemy.rng = BattleRandom(0)
+
+        if not battles:
+            return lambda: policy.choose(enemy, player)
+
+        enemy_side: Side = Side.from_units([enemy] * battles)
+        player_side: Side = Side.from_units([player] * battles)
+        rng: np.random.Generator = np.random.default_rng(0)
+        # Spread HP and stamina so the batch covers many states
+        enemy_side.hp = np.round(rng.uniform(1, enemy_side.max_health), 1)
+        enemy_side.stamina = np.round(rng.uniform(0, enemy_side.max_stamina), 1)
+        player_side.hp = np.round(rng.uniform(1, player_side.max_health), 1)
+        return lambda: policy.choose_batch(enemy_side, player_side, rng)
+
+    return factory
+
+
+for policy_name in ("random", "greedy", "expectimax", "lookup"):
+    benchmark(f"policy.{policy_name}.choose")(bench_policy(policy_name))
+    benchmark(f"policy.{policy_name}.choose_batch_1000")(bench_policy(policy_name, battles=1000))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Request benchmarks
+def bench_route(path: str, method: str = "GET") -> Callable[[], Callable[[], None]]:
+    def factory() -> Callable[[], None]:
+        from app import app
+
+        client = app.test_client()
+
+        def start() -> None:
+            client.post("/choose-hero/", data={"name": "Игрок", "unit_class": "Воин",
+                                               "weapon": "топорик", "armor": "кожаная броня"})
+            client.post("/choose-enemy/", data={"name": "Враг", "unit_class": "Маг",
+                                                "weapon": "магический посох", "armor": "магическая роба"})
+            client.get("/fight/")
+
+        start()
+        turns: int = 0
+
+        def run() -> None:
+            nonlocal turns
+            turns += 1
+            if turns % 20 == 0:
+                start()
+            client.open(path, method=method)
+
+        return run
+
+    return factory
+
+
+@benchmark("route.POST /fight/auto")
+def bench_auto_route() -> Callable[[], None]:
+    from app import app
+
+    client = app.test_client()
+
+    def run() -> None:
+        # A new hero pair for every battle, the auto battle starts it and plays it to the end in one request
+        client.post("/choose-hero/", data={"name": "Игрок", "unit_class": "Воин",
+                                           "weapon": "топорик", "armor": "кожаная броня"})
+        client.post("/choose-enemy/", data={"name": "Враг", "unit_class": "Маг",
+                                            "weapon": "магический посох", "armor": "магическая роба"})
+        client.post("/fight/auto", data={"policy": "conserve"})
+
+    return run
+
+
+for route_path, route_method in (("/fight/hit", "GET"), ("/fight/use-skill", "GET"), ("/fight/pass-turn", "GET"),
+                                 ("/fight/api/hit", "POST"), ("/", "GET"), ("/choose-hero/", "GET")):
+    benchmark(f"route.{route_method} {route_path}")(bench_route(route_path, route_method))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Run benchmarks
+def measure(run: Callable[[], None], min_time: float, repeats: int) -> dict:
+    """
+    Time the function in repeats of batches lasting at least min_time seconds each
+
+    :param run: Function to time
+    :param min_time: Minimal duration of one repeat
+    :param repeats: Number of repeats
+    :return: Timing statistics in microseconds per call
+    """
+    number: int = 1
+    while True:
+        started: int = time.perf_counter_ns()
+        for _ in range(number):
+            run()
+        if (time.perf_counter_ns() - started) / 1e9 >= min_time / 10:
+            break
+        number *= 2
+
+    number = max(1, int(number * min_time / max((time.perf_counter_ns() - started) / 1e9, 1e-9)))
+    timings: List[float] = []
+    for _ in range(repeats):
+        started = time.perf_counter_ns()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter_ns() - started) / number / 1000)
+
+    return {"min_us": round(min(timings), 3),
+            "median_us": round(statistics.median(timings), 3),
+            "calls": number * repeats}
+
+
+def calibrate() -> float:
+    """
+    Time a fixed pure Python workload, the speed of the machine the results are compared with
+
+    :return: Fastest time of the workload in microseconds
+    """
+    def run() -> None:
+        total: int = 0
+        for value in range(1000):
+            total += value * value % 7
+
+    return measure(run, 0.2, 5)["min_us"]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Compare the fastest timings with a stored baseline. When both runs have a calibration timing,
+    the baseline is scaled by the speed of this machine, so a baseline recorded elsewhere can be used
+
+    :param results: Current results
+    :param baseline: Baseline results
+    :param threshold: Allowed relative slowdown
+    :return: Names of regressed benchmarks
+    """
+    regressions: List[str] = []
+    scale: float = 1.0
+    if results.get("calibration_us") and baseline.get("calibration_us"):
+        scale = results["calibration_us"] / baseline["calibration_us"]
+        print(f"machine speed x{1 / scale:.2f} of the baseline machine")
+
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        ratio: float = result["min_us"] / (baseline["benchmarks"][name]["min_us"] * scale)
+        status: str = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{name:35} {baseline['benchmarks'][name]['min_us']:>12.2f} -> {result['min_us']:>12.2f} us "
+              f"x{ratio:.2f} {status}")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the combat and request hot paths")
+    parser.add_argument("--filter", default="", help="run only benchmarks containing this string")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--repeats", type=int, default=5, help="repeats per benchmark")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown for --compare")
+    args = parser.parse_args(argv)
+
+    results: dict = {"python": platform.python_version(), "platform": platform.platform(),
+                     "calibration_us": calibrate(), "benchmarks": {}}
+
+    for name, factory in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results["benchmarks"][name] = measure(factory(), args.min_time, args.repeats)
+        if not args.compare:
+            print(f"{name:35} min {results['benchmarks'][name]['min_us']:>10.2f} us, "
+                  f"median {results['benchmarks'][name]['median_us']:>10.2f} us")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline: dict = json.load(baseline_file)
+        return 1 if compare(results, baseline, args.threshold) else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
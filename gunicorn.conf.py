@@ -0,0 +1,100 @@
+import atexit
+import gc
+import os
+import shutil
+import tempfile
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Gunicorn settings, read from the working directory by every gunicorn command
+# Import the application once in the master, forked workers inherit the loaded catalog,
+# the matchup table and the compiled templates copy-on-write
+preload_app = True
+
+# Threads started in the master would not run in the workers, every worker starts its own in post_fork.
+# START_BACKGROUND_TASKS=0 set by the user keeps them off in the workers too
+worker_background_tasks: bool = os.environ.get("START_BACKGROUND_TASKS", "1") != "0"
+os.environ.setdefault("START_BACKGROUND_TASKS", "0")
+
+# Pid of the running master, set in on_starting after gunicorn has daemonized
+master_pid: int = 0
+
+
+def remove_metrics_dir(path: str) -> None:
+    """
+    Remove the metrics folder created for the master, forked workers inherit the exit handler and skip it
+    """
+    if os.getpid() == master_pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+# Workers write their metrics to a shared folder, so /metrics shows the totals of all of them, not of the worker
+# that happened to answer. Without METRICS_DIR every master gets its own folder, so servers running side by side
+# never clear or merge each other's metrics. It is removed at exit after the last flush of the master,
+# exit handlers run in reverse order and the metrics register theirs when the application is imported
+if "METRICS_DIR" not in os.environ:
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="skywars-metrics-")
+    atexit.register(remove_metrics_dir, os.environ["METRICS_DIR"])
+
+# Objects freed in the master leave holes in memory pages that the workers would copy, collect nothing until
+# the loaded state is frozen before the first fork
+gc.disable()
+
+
+def on_starting(server) -> None:
+    """
+    Start the metrics of this run from zero
+    """
+    from application import metrics
+
+    global master_pid
+
+    master_pid = os.getpid()
+    metrics.clear(os.environ["METRICS_DIR"])
+
+
+def when_ready(server) -> None:
+    """
+    Load the shared state in the master after the application is imported and before workers are forked
+    """
+    from app import preload
+
+    preload()
+    server.log.info("Shared state preloaded")
+
+
+def pre_fork(server, worker) -> None:
+    """
+    Move every object of the master to the permanent generation, so collections in the workers
+    never write to the pages they share with the master, then collect again in the master
+    """
+    gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker) -> None:
+    """
+    Start the background tasks of the worker, the matchmaking queue only works with one worker
+    """
+    from application.game import configure_workers, start_background_tasks
+
+    configure_workers(server.cfg.workers)
+    if worker_background_tasks:
+        start_background_tasks()
+
+
+def worker_exit(server, worker) -> None:
+    """
+    Write the last metrics of the worker before it exits
+    """
+    from application import metrics
+
+    metrics.registry.flush()
+
+
+def child_exit(server, worker) -> None:
+    """
+    Add the totals of the exited worker to the metrics archive in the master, so they outlive its file
+    """
+    from application import metrics
+
+    metrics.retire_worker(worker.pid)
@@ -0,0 +1,39 @@
+import os
+import random
+from typing import Callable
+
+import pytest
+
+from application.models.classes import unit_classes
+from application.models.equipment import Equipment, EquipmentCatalog
+from application.models.unit import BaseUnit
+
+# Tests importing the game module do not start its watcher and writer threads
+os.environ.setdefault("START_BACKGROUND_TASKS", "0")
+
+
+@pytest.fixture(scope="session")
+def equipment() -> Equipment:
+    return Equipment()
+
+
+@pytest.fixture(scope="session")
+def catalog(equipment: Equipment) -> EquipmentCatalog:
+    return equipment.catalog
+
+
+@pytest.fixture
+def create_unit(catalog: EquipmentCatalog) -> Callable[..., BaseUnit]:
+    """
+    Factory of equipped units, the class and the equipment are drawn from a seeded generator
+    """
+    rng: random.Random = random.Random(0)
+
+    def create(unit_type: type, class_name: str = "", weapon: str = "", armor: str = "") -> BaseUnit:
+        class_name = class_name or rng.choice(list(unit_classes))
+        unit: BaseUnit = unit_type(name=unit_type.__name__, unit_class=unit_classes[class_name])
+        unit.equip_weapon(catalog.get_weapon(weapon or rng.choice(catalog.get_weapons_names())))
+        unit.equip_armor(catalog.get_armor(armor or rng.choice(catalog.get_armors_names())))
+        return unit
+
+    return create
@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+from typing import List
+
+from application.analytics import OPEN_SUFFIX, EventBuffer, EventExporter
+
+
+def read_events(directory: Path, pattern: str) -> List[dict]:
+    return [json.loads(line) for path in sorted(directory.glob(pattern))
+            for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_full_buffer_drops_the_oldest_events(tmp_path: Path):
+    exporter: EventExporter = EventExporter(str(tmp_path))
+    buffer: EventBuffer = EventBuffer("battle", exporter, size=3)
+    for number in range(5):
+        buffer.record({"type": "player_action", "text": "Удар", "number": number})
+
+    assert len(buffer) == 3
+    assert exporter.flush() == 3
+    exporter.close()
+
+    events: List[dict] = read_events(tmp_path, "*.jsonl")
+    assert [event["number"] for event in events] == [2, 3, 4]
+    assert [event["seq"] for event in events] == [3, 4, 5]
+    assert all("text" not in event and event["battle"] == "battle" for event in events)
+    assert (exporter.exported, exporter.dropped) == (3, 2)
+
+
+def test_buffer_is_exported_once_per_flush(tmp_path: Path):
+    exporter: EventExporter = EventExporter(str(tmp_path))
+    buffer: EventBuffer = exporter.create_buffer("session-secret")
+    buffer.record({"type": "player_action"})
+    buffer.record({"type": "enemy_action"})
+
+    assert exporter.flush() == 2
+    assert exporter.flush() == 0
+    buffer.record({"type": "battle_end"})
+    assert exporter.flush() == 1
+    exporter.close()
+
+    events: List[dict] = read_events(tmp_path, "*.jsonl")
+    assert [event["seq"] for event in events] == [1, 2, 3]
+    assert {event["battle"] for event in events} == {buffer.battle_id} != {"session-secret"}
+
+
+def test_file_is_rotated_at_the_size_limit(tmp_path: Path):
+    exporter: EventExporter = EventExporter(str(tmp_path), max_file_bytes=200, max_file_age=3600)
+    buffer: EventBuffer = EventBuffer("battle", exporter)
+
+    for batch in range(3):
+        for number in range(3):
+            buffer.record({"type": "player_action", "number": batch * 3 + number})
+        exporter.flush()
+        assert len(list(tmp_path.glob(f"*{OPEN_SUFFIX}"))) == 1
+
+    rotated: List[Path] = sorted(tmp_path.glob("*.jsonl"))
+    assert len(rotated) == 2
+    assert all(path.stat().st_size >= 200 for path in rotated)
+
+    exporter.close()
+    assert not list(tmp_path.glob(f"*{OPEN_SUFFIX}"))
+    assert [event["number"] for event in read_events(tmp_path, "*.jsonl")] == list(range(9))
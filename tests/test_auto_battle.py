@@ -0,0 +1,79 @@
+import random
+from typing import Callable, Sequence
+
+import pytest
+from werkzeug.exceptions import BadRequest, Conflict
+
+from application import views
+from application.models.base import Arena
+from application.models.battle import Battle
+from application.models.equipment import EquipmentCatalog
+from application.models.policies import get_player_policy, get_player_policy_names
+from application.models.replay import BattleLog
+from application.models.unit import BaseUnit, EnemyUnit, PlayerUnit
+
+RESULTS = ("Игрок выиграл битву.", "Игрок проиграл битву.", "Ничья.")
+
+
+def create_battle(create_unit: Callable[..., BaseUnit], seed: int, weapons: Sequence[str] = ()) -> Battle:
+    """
+    Battle with both heroes chosen and started, the weapons are drawn from the given ones if any
+    """
+    rng: random.Random = random.Random(seed)
+    battle: Battle = Battle(f"auto-{seed}")
+    battle.heroes["player"] = create_unit(PlayerUnit, weapon=rng.choice(weapons) if weapons else "")
+    battle.heroes["enemy"] = create_unit(EnemyUnit, weapon=rng.choice(weapons) if weapons else "")
+    battle.arena.start_game(battle.heroes["player"], battle.heroes["enemy"], seed=seed)
+    return battle
+
+
+def test_player_policies_are_registered():
+    assert set(get_player_policy_names()) >= {"hit", "skill", "conserve"}
+
+
+@pytest.mark.parametrize("policy", ["hit", "skill", "conserve"])
+def test_auto_battle_is_played_to_the_end(catalog: EquipmentCatalog, create_unit: Callable[..., BaseUnit],
+                                          policy: str):
+    # Bare hands may not get through the armor of either unit, such battles never end
+    weapons: Sequence[str] = [name for name in catalog.get_weapons_names() if name != "ладошки"]
+
+    for seed in range(30):
+        state: dict = views.auto_fight(create_battle(create_unit, seed, weapons), {"policy": policy})
+
+        assert state["battle_over"]
+        assert state["result"] in RESULTS
+        assert state["turns"] == len(BattleLog.from_dict(state["log"]).actions)
+
+
+@pytest.mark.parametrize("policy", ["hit", "skill", "conserve"])
+def test_auto_battle_log_replays_to_the_final_state(catalog: EquipmentCatalog,
+                                                    create_unit: Callable[..., BaseUnit], policy: str):
+    battle: Battle = create_battle(create_unit, 3)
+    state: dict = views.auto_fight(battle, {"policy": policy})
+
+    replayed: Arena = Arena.replay(BattleLog.from_dict(state["log"]), catalog)
+
+    assert replayed.battle_result == battle.arena.battle_result
+    assert replayed.game_is_running == (not state["battle_over"])
+    for role in ("player", "enemy"):
+        unit: BaseUnit = getattr(replayed, role)
+        assert {"hp": unit.hp, "stamina": unit.stamina} == state[role]
+
+
+def test_stalemate_stops_at_the_turn_limit(create_unit: Callable[..., BaseUnit]):
+    arena: Arena = Arena()
+    arena.start_game(create_unit(PlayerUnit, "Вор", "ладошки", "панцирь"),
+                     create_unit(EnemyUnit, "Вор", "ладошки", "панцирь"), seed=1)
+
+    assert arena.auto_battle(get_player_policy("hit"), max_turns=200) == ""
+    assert arena.game_is_running and len(arena.log.actions) == 200
+
+
+def test_unknown_policy_is_a_bad_request(create_unit: Callable[..., BaseUnit]):
+    with pytest.raises(BadRequest):
+        views.auto_fight(create_battle(create_unit, 0), {"policy": "berserk"})
+
+
+def test_auto_battle_needs_both_heroes():
+    with pytest.raises(Conflict):
+        views.auto_fight(Battle("empty"), {"policy": "hit"})
@@ -0,0 +1,251 @@
+import json
+from dataclasses import replace
+from typing import Callable, Dict, List
+
+import numpy as np
+import pytest
+
+from application.models.base import Arena
+from application.models.classes import UnitClass, unit_classes
+from application.models.effects import DOT, REGEN, SHIELD, STUN, EffectScheduler, StatusEffect, UnitStatus
+from application.models.policies import HIT_INDEX, PASS_INDEX, SKILL_INDEX, EnemyPolicy
+from application.models.equipment import EquipmentCatalog
+from application.models.replay import HIT, PASS, SKILL
+from application.models.skills import SkillRegistry, load_skills
+from application.models.unit import BaseUnit, EnemyUnit, PlayerUnit
+from application.simulation.engine import ENEMY_PHASE, Build, ParityReport, Side, check_parity, count_damage, \
+    expire_shields, use_skill
+
+
+class SkillFirstPolicy(EnemyPolicy):
+    """
+    Uses the skill as soon as it can, hits otherwise
+    """
+    name: str = "skill-first"
+
+    def choose(self, enemy: BaseUnit, target: BaseUnit) -> str:
+        if not enemy._is_skill_used and enemy.unit_class.skill.is_stamina_enough(enemy.stamina):
+            return SKILL
+        return HIT
+
+    def choose_batch(self, enemy, player, rng) -> np.ndarray:
+        ready: np.ndarray = ~enemy.is_skill_used & (np.round(enemy.stamina, 1) >= enemy.skill_stamina)
+        return np.where(ready, SKILL_INDEX, HIT_INDEX)
+
+
+class PassPolicy(EnemyPolicy):
+    name: str = "pass"
+
+    def choose(self, enemy: BaseUnit, target: BaseUnit) -> str:
+        return PASS
+
+    def choose_batch(self, enemy, player, rng) -> np.ndarray:
+        return np.full(len(enemy.hp), PASS_INDEX)
+
+
+# Skills of the test classes, the shipped class skills start no status effects
+STATUS_SKILLS: dict = {"skills": [
+    {"id": 1, "name": "Оглушающий пинок", "stamina": 6.0,
+     "effects": [{"type": "damage", "amount": 9.0}, {"type": "stun", "amount": 0.0, "duration": 1}]},
+    {"id": 2, "name": "Отравленный укол", "stamina": 5.0,
+     "effects": [{"type": "damage", "amount": 9.0}, {"type": "dot", "amount": 2.0, "duration": 3}]},
+    {"id": 3, "name": "Каменная кожа", "stamina": 15.0,
+     "effects": [{"type": "damage", "amount": 24.0}, {"type": "shield", "amount": 8.0, "duration": 3},
+                 {"type": "regen", "amount": 2.0, "duration": 3}]},
+]}
+
+
+@pytest.fixture(scope="module")
+def status_classes(tmp_path_factory) -> Dict[str, UnitClass]:
+    """
+    Unit classes whose skills start the status effects: the warrior stuns, the thief poisons,
+    the mage shields and regenerates
+    """
+    path = tmp_path_factory.mktemp("skills") / "skills.json"
+    path.write_text(json.dumps(STATUS_SKILLS, ensure_ascii=False), encoding="utf-8")
+    skills: SkillRegistry = load_skills(path)
+
+    return {"Воин": replace(unit_classes["Воин"], skill=skills.get("Оглушающий пинок")),
+            "Вор": replace(unit_classes["Вор"], skill=skills.get("Отравленный укол")),
+            "Маг": replace(unit_classes["Маг"], skill=skills.get("Каменная кожа"))}
+
+
+@pytest.fixture
+def create_arena(catalog: EquipmentCatalog, status_classes: Dict[str, UnitClass]) -> Callable[..., Arena]:
+    def create_unit(unit_type: type, class_name: str) -> BaseUnit:
+        unit: BaseUnit = unit_type(name=unit_type.__name__, unit_class=status_classes[class_name])
+        unit.equip_weapon(catalog.get_weapon("ножик"))
+        unit.equip_armor(catalog.get_armor("футболка"))
+        return unit
+
+    def create(player_class: str, enemy_class: str, policy: EnemyPolicy = None) -> Arena:
+        enemy: BaseUnit = create_unit(EnemyUnit, enemy_class)
+        if policy is not None:
+            enemy.policy = policy
+        arena: Arena = Arena()
+        arena.start_game(create_unit(PlayerUnit, player_class), enemy, seed=3)
+        return arena
+
+    return create
+
+
+def test_status_skills_start_every_status_kind(status_classes: Dict[str, UnitClass]):
+    kinds = {effect.kind for unit_class in status_classes.values()
+             for effect in unit_class.skill.user_statuses + unit_class.skill.target_statuses}
+
+    assert kinds == {DOT, STUN, SHIELD, REGEN}
+
+
+def test_class_skills_start_no_status_effects():
+    assert not any(unit_class.skill.has_statuses for unit_class in unit_classes.values())
+
+
+def test_effects_expire_after_their_last_turn():
+    scheduler: EffectScheduler = EffectScheduler()
+    status: UnitStatus = scheduler.track()
+    for amount, duration in ((1.0, 3), (0.5, 1), (0.2, 2), (0.1, 1)):
+        status.add(StatusEffect(kind=DOT, amount=amount, duration=duration))
+
+    totals: List[float] = []
+    expired: List[int] = []
+    for _ in range(4):
+        scheduler.advance()
+        totals.append(status.dot)
+        expired.append(scheduler.expire())
+
+    assert totals == [1.8, 1.2, 1.0, 0.0]
+    assert expired == [2, 1, 1, 0]
+    assert len(scheduler) == 0
+
+
+def test_restored_effects_expire_in_the_same_order():
+    scheduler: EffectScheduler = EffectScheduler()
+    statuses: List[UnitStatus] = [scheduler.track(), scheduler.track()]
+    for turn in range(6):
+        statuses[turn % 2].add(StatusEffect(kind=SHIELD, amount=turn + 1.0, duration=turn % 3 + 1))
+        statuses[turn % 2].absorb(1.5)
+        scheduler.advance()
+        scheduler.expire()
+    restored, restored_statuses = EffectScheduler.load(scheduler.dump(statuses))
+
+    for _ in range(4):
+        for clock, clock_statuses in ((scheduler, statuses), (restored, restored_statuses)):
+            clock_statuses[0].absorb(0.7)
+            clock.advance()
+            clock.expire()
+        assert restored.dump(restored_statuses) == scheduler.dump(statuses)
+
+    assert [status.shield for status in statuses] == [0.0, 0.0]
+
+
+def test_restored_scheduler_orders_new_effects_like_the_original():
+    scheduler: EffectScheduler = EffectScheduler()
+    status: UnitStatus = scheduler.track()
+    status.add(StatusEffect(kind=REGEN, amount=1.0, duration=3))
+    status.add(StatusEffect(kind=STUN, amount=0.0, duration=1))
+    scheduler.advance()
+    scheduler.expire()
+    restored, (restored_status,) = EffectScheduler.load(scheduler.dump([status]))
+
+    status.add(StatusEffect(kind=DOT, amount=1.0, duration=2))
+    restored_status.add(StatusEffect(kind=DOT, amount=1.0, duration=2))
+
+    assert restored.dump([restored_status]) == scheduler.dump([status])
+
+
+def test_stun_skips_one_enemy_turn(create_arena: Callable[..., Arena]):
+    arena: Arena = create_arena("Воин", "Вор")
+
+    result: str = arena.player_use_skill()
+    assert "оглушен и пропускает ход" in result
+    assert arena.enemy.last_action == STUN
+
+    arena.pass_turn()
+    assert arena.enemy.last_action != STUN
+
+
+def test_stun_skips_one_player_turn(create_arena: Callable[..., Arena]):
+    arena: Arena = create_arena("Вор", "Воин", SkillFirstPolicy())
+    arena.pass_turn()
+    assert arena.enemy.last_action == SKILL
+    enemy_hp: float = arena.enemy.hp
+
+    assert "оглушен и пропускает ход" in arena.player_hit()
+    assert arena.player.last_action == STUN and arena.enemy.hp == enemy_hp
+
+    arena.player_hit()
+    assert arena.player.last_action == HIT
+
+
+def test_damage_over_time_acts_for_its_duration(create_arena: Callable[..., Arena]):
+    arena: Arena = create_arena("Вор", "Маг", PassPolicy())
+    results: List[str] = [arena.player_use_skill()] + [arena.pass_turn() for _ in range(4)]
+
+    assert sum("получает 2.0 урона от эффектов" in result for result in results) == 3
+    assert arena.enemy.status.dot == 0
+
+
+def test_damage_over_time_stops_at_zero_hp(create_arena: Callable[..., Arena]):
+    arena: Arena = create_arena("Вор", "Маг", PassPolicy())
+    arena.enemy.hp = 10.5
+
+    result: str = arena.player_use_skill()
+
+    assert "получает 2.0 урона от эффектов" in result
+    assert arena.enemy.hp == 0
+    assert not arena.game_is_running and arena.battle_result == "Игрок выиграл битву."
+
+
+def test_shield_absorbs_damage_until_it_expires(create_arena: Callable[..., Arena]):
+    arena: Arena = create_arena("Маг", "Воин", PassPolicy())
+    arena.player_use_skill()
+    assert arena.player.status.shield == 8.0
+    assert arena.player.status.regen == 2.0
+
+    assert arena.player.absorb(5.0) == 0.0
+    assert arena.player.status.shield == 3.0
+
+    for action in (PASS, PASS, PASS):
+        arena.play_action(action)
+    assert (arena.player.status.shield, arena.player.status.regen) == (0.0, 0.0)
+
+
+@pytest.mark.parametrize("player_class,enemy_class", [("Маг", "Воин"), ("Воин", "Вор"), ("Вор", "Маг")])
+def test_vectorized_engine_plays_status_effects_like_the_arena(catalog, status_classes: Dict[str, UnitClass],
+                                                               player_class: str, enemy_class: str):
+    player: Build = Build(unit_class=status_classes[player_class], weapon=catalog.get_weapon("ножик"),
+                          armor=catalog.get_armor("футболка"))
+    enemy: Build = Build(unit_class=status_classes[enemy_class], weapon=catalog.get_weapon("ножик"),
+                         armor=catalog.get_armor("футболка"))
+
+    report: ParityReport = check_parity(player, enemy, battles=1000, seed=0, policy=SkillFirstPolicy())
+
+    assert report.ok
+    assert abs(report.vectorized.turns.mean() - report.reference.turns.mean()) < 0.5
+
+
+def test_vectorized_shield_absorbs_hits_until_it_expires(catalog, status_classes: Dict[str, UnitClass]):
+    mage: Build = Build(unit_class=status_classes["Маг"], weapon=catalog.get_weapon("ножик"),
+                        armor=catalog.get_armor("футболка"))
+    thief: Build = Build(unit_class=status_classes["Вор"], weapon=catalog.get_weapon("топорик"),
+                         armor=catalog.get_armor("футболка"))
+    hit: np.ndarray = np.array([True])
+    rolls: np.ndarray = np.array([0.5])
+
+    unshielded: Side = Side([mage])
+    count_damage(Side([thief]), unshielded, hit, rolls)
+    damage: float = float(unshielded.max_health[0] - unshielded.hp[0])
+
+    enemy: Side = Side([mage])
+    use_skill(enemy, Side([thief]), hit, ENEMY_PHASE)
+    assert enemy.shield.tolist() == [8.0]
+    hp: float = float(enemy.hp[0])
+    count_damage(Side([thief]), enemy, hit, rolls)
+
+    assert round(hp - float(enemy.hp[0]), 1) == max(round(damage - 8.0, 1), 0.0)
+    assert float(enemy.shield[0]) == max(round(8.0 - damage, 1), 0.0)
+
+    expire_shields(enemy, 2)
+    assert float(enemy.shield[0]) == max(round(8.0 - damage, 1), 0.0)
+    expire_shields(enemy, 3)
+    assert enemy.shield.tolist() == [0.0]
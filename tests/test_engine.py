@@ -0,0 +1,29 @@
+import pytest
+
+from application.models.classes import unit_classes
+from application.models.equipment import EquipmentCatalog
+from application.simulation.engine import Build, ParityReport, check_parity, simulate_batch
+
+MATCHUPS = [(("Воин", "топорик", "панцирь"), ("Маг", "магический посох", "футболка")),
+            (("Маг", "топорик", "футболка"), ("Воин", "топорик", "футболка")),
+            (("Маг", "магический посох", "магическая роба"), ("Вор", "топорик", "панцирь")),
+            (("Вор", "топорик", "кожаная броня"), ("Маг", "топорик", "кожаная броня"))]
+
+
+def get_build(catalog: EquipmentCatalog, class_name: str, weapon: str, armor: str) -> Build:
+    return Build(unit_class=unit_classes[class_name], weapon=catalog.get_weapon(weapon),
+                 armor=catalog.get_armor(armor))
+
+
+@pytest.mark.parametrize("player,enemy", MATCHUPS)
+def test_vectorized_engine_matches_the_arena(catalog: EquipmentCatalog, player: tuple, enemy: tuple):
+    report: ParityReport = check_parity(get_build(catalog, *player), get_build(catalog, *enemy), battles=1000, seed=1)
+
+    assert report.ok, report
+
+
+def test_batch_needs_an_enemy_for_every_player(catalog: EquipmentCatalog):
+    build: Build = get_build(catalog, *MATCHUPS[0][0])
+
+    with pytest.raises(ValueError):
+        simulate_batch([build, build], [build])
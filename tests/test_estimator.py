@@ -0,0 +1,47 @@
+import pytest
+
+from application.models.classes import unit_classes
+from application.models.equipment import EquipmentCatalog
+from application.simulation.engine import Build
+from application.simulation.estimator import Estimate, estimate, estimate_exact, estimate_monte_carlo
+
+# Matchups where stamina never limits the units, from one-sided to even
+EXACT_MATCHUPS = [(("Вор", "топорик", "футболка"), ("Вор", "топорик", "футболка")),
+                  (("Вор", "магический посох", "футболка"), ("Маг", "топорик", "кожаная броня")),
+                  (("Маг", "магический посох", "футболка"), ("Вор", "топорик", "кожаная броня")),
+                  (("Маг", "магический посох", "панцирь"), ("Маг", "ладошки", "футболка"))]
+
+
+def get_build(catalog: EquipmentCatalog, class_name: str, weapon: str, armor: str) -> Build:
+    return Build(unit_class=unit_classes[class_name], weapon=catalog.get_weapon(weapon),
+                 armor=catalog.get_armor(armor))
+
+
+@pytest.mark.parametrize("player,enemy", EXACT_MATCHUPS)
+def test_exact_estimate_agrees_with_monte_carlo(catalog: EquipmentCatalog, player: tuple, enemy: tuple):
+    player_build, enemy_build = get_build(catalog, *player), get_build(catalog, *enemy)
+    exact: Estimate = estimate_exact(player_build, enemy_build)
+    simulated: Estimate = estimate_monte_carlo(player_build, enemy_build, battles=20000, seed=1)
+
+    assert exact is not None and exact.method == "exact"
+    assert exact.win + exact.draw + exact.loss + exact.timeout == pytest.approx(1.0)
+    assert simulated.timeout == 0 and exact.timeout == pytest.approx(0.0, abs=1e-6)
+    assert abs(exact.win - simulated.win) <= 4 * simulated.standard_error
+    assert abs(exact.loss - simulated.loss) <= 4 * simulated.standard_error
+    assert exact.expected_turns == pytest.approx(simulated.expected_turns, rel=0.02)
+
+
+def test_estimate_is_exact_where_possible(catalog: EquipmentCatalog):
+    player, enemy = get_build(catalog, *EXACT_MATCHUPS[0][0]), get_build(catalog, *EXACT_MATCHUPS[0][1])
+
+    assert estimate(player, enemy) == estimate_exact(player, enemy)
+    assert estimate(player, enemy) is estimate(player, enemy)
+
+
+def test_estimate_falls_back_to_monte_carlo_when_stamina_runs_out(catalog: EquipmentCatalog):
+    player, enemy = get_build(catalog, "Вор", "ладошки", "панцирь"), get_build(catalog, "Воин", "топорик", "панцирь")
+    result: Estimate = estimate(player, enemy, battles=2000)
+
+    assert estimate_exact(player, enemy) is None
+    assert result.method == "monte_carlo" and result.battles == 2000
+    assert result.win + result.draw + result.loss + result.timeout == pytest.approx(1.0)
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+from typing import List, Tuple
+
+import pytest
+
+from application import matchmaking
+from application.matchmaking import BUCKET_WIDTH, WIDEN_INTERVAL, Matchmaker, Ticket
+
+
+class Clock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock: Clock = Clock()
+    monkeypatch.setattr(matchmaking, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+def matches() -> List[Tuple[Ticket, Ticket]]:
+    return []
+
+
+@pytest.fixture
+def matchmaker(matches: List[Tuple[Ticket, Ticket]]) -> Matchmaker:
+    def start_match(first: Ticket, second: Ticket) -> dict:
+        matches.append((first, second))
+        return {"running": True}
+
+    return Matchmaker(start_match, ttl=60.0, is_running=lambda match: match["running"])
+
+
+def join(matchmaker: Matchmaker, clock: Clock, ticket_id: str, rating: int) -> Ticket:
+    return matchmaker.join(Ticket(id=ticket_id, rating=rating, unit=None, queued_at=clock.now))
+
+
+def test_nearest_rating_is_paired(matchmaker: Matchmaker, clock: Clock, matches: List[Tuple[Ticket, Ticket]]):
+    far: Ticket = join(matchmaker, clock, "far", 0)
+    near: Ticket = join(matchmaker, clock, "near", 10 * BUCKET_WIDTH)
+    player: Ticket = join(matchmaker, clock, "player", 10 * BUCKET_WIDTH + 1)
+
+    assert matches == [(near, player)]
+    assert (near.opponent, player.opponent) == (player, near)
+    assert far.match is None and matchmaker.waiting == 1
+
+
+def test_search_radius_widens_with_waiting(matchmaker: Matchmaker, clock: Clock):
+    first: Ticket = join(matchmaker, clock, "first", 0)
+    second: Ticket = join(matchmaker, clock, "second", 3 * BUCKET_WIDTH)
+    assert matchmaker.poll("first").match is None
+
+    clock.now += 2 * WIDEN_INTERVAL
+    assert matchmaker.poll("second").match is not None
+    assert first.match is second.match
+    assert matchmaker.waiting == 0
+
+
+def test_left_ticket_is_not_paired(matchmaker: Matchmaker, clock: Clock):
+    join(matchmaker, clock, "left", 0)
+    matchmaker.leave("left")
+
+    assert join(matchmaker, clock, "player", 0).match is None
+    assert matchmaker.poll("left") is None
+
+
+def test_idle_tickets_expire(matchmaker: Matchmaker, clock: Clock):
+    join(matchmaker, clock, "idle", 0)
+    clock.now += 30
+    join(matchmaker, clock, "active", 20 * BUCKET_WIDTH)
+    clock.now += 40
+    matchmaker.poll("active")
+
+    join(matchmaker, clock, "player", 0)
+
+    assert matchmaker.poll("idle") is None
+    assert matchmaker.poll("player").match is None
+    assert matchmaker.waiting == 2
+
+
+def test_running_match_keeps_the_waiting_opponent(matchmaker: Matchmaker, clock: Clock):
+    first: Ticket = join(matchmaker, clock, "first", 0)
+    join(matchmaker, clock, "second", 0)
+
+    for _ in range(3):
+        clock.now += 50
+        matchmaker.poll("second")
+    join(matchmaker, clock, "other", 40 * BUCKET_WIDTH)
+    assert matchmaker.poll("first") is first
+
+    first.match["running"] = False
+    for _ in range(2):
+        clock.now += 50
+        matchmaker.poll("second")
+    join(matchmaker, clock, "another", 40 * BUCKET_WIDTH)
+    assert matchmaker.poll("first") is None
+
+
+def test_poll_does_not_pair_an_expired_ticket(matchmaker: Matchmaker, clock: Clock,
+                                              matches: List[Tuple[Ticket, Ticket]]):
+    join(matchmaker, clock, "idle", 0)
+    clock.now += 1
+    join(matchmaker, clock, "player", 3 * BUCKET_WIDTH)
+
+    # Both radii have widened past the distance, but the idle ticket is older than the TTL
+    clock.now += 60
+    assert matchmaker.poll("player").match is None
+    assert matches == [] and matchmaker.waiting == 1
+    assert matchmaker.poll("idle") is None
@@ -0,0 +1,86 @@
+import itertools
+import math
+import statistics
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from application.models.classes import unit_classes
+from application.models.equipment import Armor, EquipmentCatalog, EquipmentData, Weapon
+from application.models.matchups import BASE_RATING, RATING_SCALE, AttackProfile, DefenceProfile, Matchup, \
+    MatchupTable
+
+# Fixed rolls and defences right at the ends of the roll ranges
+EDGE_CATALOG: EquipmentCatalog = EquipmentCatalog(EquipmentData(
+    weapons=[Weapon(id=1, name="камень", min_damage=2.0, max_damage=2.0, stamina_per_hit=1.0),
+             Weapon(id=2, name="палка", min_damage=1.0, max_damage=3.0, stamina_per_hit=1.0),
+             Weapon(id=3, name="перо", min_damage=0.0, max_damage=0.5, stamina_per_hit=0.5)],
+    armors=[Armor(id=1, name="рубаха", defence=0.0, stamina_per_turn=0.0),
+            Armor(id=2, name="щит", defence=1.0, stamina_per_turn=1.0),
+            Armor(id=3, name="латы", defence=2.0, stamina_per_turn=2.0),
+            Armor(id=4, name="стена", defence=5.0, stamina_per_turn=3.0)]))
+
+
+def get_brute_force_ratings(catalog: EquipmentCatalog) -> Dict[Tuple[str, int, int], int]:
+    """
+    Ratings from the expected damage of every single pairing
+    """
+    table: MatchupTable = MatchupTable(catalog)
+    weapons: List[Weapon] = catalog.equipment.weapons
+    armors: List[Armor] = catalog.equipment.armors
+    dealt: Dict[Tuple[str, int], List[float]] = defaultdict(list)
+    taken: Dict[Tuple[str, int], List[float]] = defaultdict(list)
+
+    for attacker, weapon, defender, armor in itertools.product(unit_classes.values(), weapons,
+                                                               unit_classes.values(), armors):
+        damage: float = table.get(attacker, weapon, defender, armor).expected_damage
+        dealt[(attacker.name, weapon.id)].append(damage)
+        taken[(defender.name, armor.id)].append(damage)
+
+    average_health: float = sum(unit_class.max_health for unit_class in unit_classes.values()) / len(unit_classes)
+    ratings: Dict[Tuple[str, int, int], int] = {}
+
+    for unit_class, weapon, armor in itertools.product(unit_classes.values(), weapons, armors):
+        damage_dealt: float = max(statistics.fmean(dealt[(unit_class.name, weapon.id)]), 1e-3)
+        damage_taken: float = max(statistics.fmean(taken[(unit_class.name, armor.id)]), 1e-3)
+        strength: float = (unit_class.max_health / damage_taken) / (average_health / damage_dealt)
+        ratings[(unit_class.name, weapon.id, armor.id)] = round(BASE_RATING + RATING_SCALE * math.log10(strength))
+
+    return ratings
+
+
+@pytest.mark.parametrize("edge", [False, True])
+def test_ratings_match_the_brute_force_ratings(catalog: EquipmentCatalog, edge: bool):
+    catalog = EDGE_CATALOG if edge else catalog
+    table: MatchupTable = MatchupTable(catalog)
+
+    for (class_name, weapon_id, armor_id), rating in get_brute_force_ratings(catalog).items():
+        assert table.get_rating(unit_classes[class_name], catalog.get_weapon_by_id(weapon_id),
+                                catalog.get_armor_by_id(armor_id)) == rating
+
+
+@pytest.mark.parametrize("low,high,defence", [(2.5, 4.1, 0.0), (2.5, 4.1, 2.5), (2.5, 4.1, 3.2), (2.5, 4.1, 4.1),
+                                              (2.5, 4.1, 6.0), (0.0, 0.5, 0.25), (1.0, 3.0, 1.5)])
+def test_matchup_matches_the_integrated_roll(low: float, high: float, defence: float):
+    matchup: Matchup = Matchup.create(unit_classes["Воин"], Weapon(1, "палка", low, high, 1.0),
+                                      unit_classes["Вор"], Armor(1, "щит", defence, 1.0),
+                                      AttackProfile(1.0, low, high, 1.0), DefenceProfile(defence, 1.0))
+    # Midpoints of equal parts of the roll range
+    rolls: np.ndarray = low + (np.arange(200000) + 0.5) * (high - low) / 200000
+
+    assert matchup.hit_chance == pytest.approx(np.mean(rolls > defence), abs=1e-5)
+    assert matchup.expected_damage == pytest.approx(np.mean(np.maximum(rolls - defence, 0)), abs=1e-6)
+    assert matchup.expected_damage_unabsorbed == pytest.approx(np.mean(np.where(rolls > defence, rolls, 0)),
+                                                               abs=1e-6)
+
+
+def test_find_filters_by_every_given_name(catalog: EquipmentCatalog):
+    table: MatchupTable = MatchupTable(catalog)
+
+    assert len(table.find()) == len(table)
+    assert len(table.find(attacker="Маг", armor="панцирь")) == len(unit_classes) * len(catalog.get_weapons_names())
+    assert table.find(weapon="рогатка") == []
+    assert all(matchup.attacker == "Маг" and matchup.weapon == "ножик"
+               for matchup in table.find(attacker="Маг", weapon="ножик"))
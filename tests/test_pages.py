@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from flask.testing import FlaskClient
+
+from app import app
+from application.game import equipment
+from application.models.equipment import EQUIPMENT_PATH
+from application.pages import Page, PageCache
+
+
+@pytest.fixture
+def client() -> FlaskClient:
+    return app.test_client()
+
+
+@pytest.fixture
+def equipment_path(tmp_path: Path) -> Iterator[Path]:
+    """
+    Copy of the equipment file the game catalog is reloaded from, the shipped catalog is loaded back afterwards
+    """
+    path: Path = tmp_path / "equipment.json"
+    path.write_text(EQUIPMENT_PATH.read_text(encoding="utf-8"), encoding="utf-8")
+    shipped_path: Path = equipment.path
+    equipment.path = path
+    yield path
+    equipment.path = shipped_path
+    equipment.reload()
+
+
+def test_page_is_rendered_once_per_version():
+    cache: PageCache = PageCache()
+    page: Page = cache.put("index.html", 1, "<p>Арена</p>")
+
+    assert cache.get("index.html", 1) is page
+    assert cache.get("index.html", 2) is None
+    assert page.body == "<p>Арена</p>".encode("utf-8")
+
+    cache.put("index.html", 2, "<p>Арена</p>")
+    assert cache.get("index.html", 1) is None
+    assert cache.get("index.html", 2).etag == page.etag
+
+
+@pytest.mark.parametrize("url", ["/", "/choose-hero/"])
+def test_known_page_is_not_modified(client: FlaskClient, url: str):
+    response = client.get(url)
+    etag: str = response.headers["ETag"]
+
+    assert response.status_code == 200 and response.data
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and not cached.data
+    assert cached.headers["ETag"] == etag
+
+    assert client.get(url, headers={"If-None-Match": "\"stale\""}).status_code == 200
+
+
+def test_catalog_reload_changes_the_etag(client: FlaskClient, equipment_path: Path):
+    etag: str = client.get("/choose-hero/").headers["ETag"]
+
+    data: dict = json.loads(equipment_path.read_text(encoding="utf-8"))
+    data["weapons"].append({"id": 99, "name": "рогатка", "min_damage": 1.0, "max_damage": 2.0,
+                            "stamina_per_hit": 1.0})
+    equipment_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    equipment.reload()
+
+    response = client.get("/choose-hero/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "рогатка" in response.get_data(as_text=True)
@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+
+from application.models import battle as battle_module
+from application.models.battle import Battle, BattleRegistry
+from application.storage import BattleStore, Record
+
+
+class Clock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SlowStore(BattleStore):
+    """
+    Store without battles that takes a while to answer, so concurrent requests miss the registry together
+    """
+
+    def load(self, battle_id: str, max_age: float) -> Optional[Record]:
+        time.sleep(0.01)
+        return None
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock: Clock = Clock()
+    monkeypatch.setattr(battle_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_battle_is_kept_per_session():
+    registry: BattleRegistry = BattleRegistry()
+    battle: Battle = registry.get("first")
+
+    assert registry.get("first") is battle
+    assert registry.find("first") is battle
+    assert registry.get("second") is not battle
+    assert len(registry) == 2
+
+
+def test_idle_battle_expires(clock: Clock):
+    registry: BattleRegistry = BattleRegistry(ttl=60.0)
+    battle: Battle = registry.get("idle")
+    registry.get("active")
+
+    clock.now += 45
+    registry.get("active")
+    assert registry.find("idle") is battle
+
+    clock.now += 61
+    registry.get("active")
+    assert len(registry) == 1
+    assert registry.find("idle") is None
+    assert registry.get("idle") is not battle
+
+
+def test_least_recently_used_battle_is_evicted_at_the_cap(clock: Clock):
+    registry: BattleRegistry = BattleRegistry(max_battles=2)
+    for battle_id in ("first", "second", "first", "third"):
+        clock.now += 1
+        registry.get(battle_id)
+
+    assert len(registry) == 2
+    assert registry.find("second") is None
+    assert registry.find("first") is not None and registry.find("third") is not None
+
+
+def test_discarded_battle_starts_again():
+    registry: BattleRegistry = BattleRegistry()
+    battle: Battle = registry.get("ended")
+    registry.discard("ended")
+
+    assert len(registry) == 0
+    assert registry.get("ended") is not battle
+
+
+def test_concurrent_requests_get_the_same_battle():
+    registry: BattleRegistry = BattleRegistry(store=SlowStore())
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        battles: List[Battle] = list(executor.map(registry.get, ["shared"] * 8))
+
+    assert all(battle is battles[0] for battle in battles)
+    assert len(registry) == 1
+
+
+def test_battles_are_locked_separately():
+    registry: BattleRegistry = BattleRegistry()
+    first, second = registry.get("first"), registry.get("second")
+    locked: List[bool] = []
+
+    def lock_both() -> None:
+        locked.append(first.lock.acquire(timeout=0.05))
+        locked.append(second.lock.acquire(timeout=0.05))
+        second.lock.release()
+
+    with first.lock:
+        thread: threading.Thread = threading.Thread(target=lock_both)
+        thread.start()
+        thread.join()
+
+    assert locked == [False, True]
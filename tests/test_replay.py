@@ -0,0 +1,56 @@
+import random
+from typing import Callable, List
+
+import pytest
+
+from application.models.base import Arena
+from application.models.equipment import EquipmentCatalog
+from application.models.policies import get_policy
+from application.models.replay import HIT, PASS, SKILL, BattleLog, compress_actions, decompress_actions
+from application.models.unit import BaseUnit, EnemyUnit, PlayerUnit
+
+
+def play(arena: Arena, actions: List[str]) -> List[str]:
+    return [arena.play_action(action) for action in actions if arena.game_is_running]
+
+
+@pytest.fixture
+def battle(create_unit: Callable[..., BaseUnit]) -> Arena:
+    enemy: BaseUnit = create_unit(EnemyUnit)
+    enemy.policy = get_policy("greedy")
+    arena: Arena = Arena()
+    arena.start_game(create_unit(PlayerUnit), enemy, seed=42)
+    return arena
+
+
+@pytest.mark.parametrize("actions", [[], [HIT], [HIT, HIT, SKILL, PASS, PASS, PASS, HIT], [SKILL] * 5])
+def test_compressed_actions_round_trip(actions: List[str]):
+    assert decompress_actions(compress_actions(actions)) == actions
+
+
+def test_replay_reproduces_the_battle(battle: Arena, catalog: EquipmentCatalog):
+    rng: random.Random = random.Random(1)
+    play(battle, [rng.choice([HIT, SKILL, PASS]) for _ in range(20)])
+
+    replayed: Arena = Arena.replay(BattleLog.loads(battle.log.dumps()), catalog)
+
+    assert replayed.dump_state() == battle.dump_state()
+    assert (replayed.player.hp, replayed.enemy.hp) == (battle.player.hp, battle.enemy.hp)
+    assert replayed.enemy.policy is get_policy("greedy")
+
+
+def test_restored_battle_continues_like_the_original(battle: Arena, catalog: EquipmentCatalog):
+    play(battle, [HIT, PASS, SKILL])
+    restored: Arena = Arena.restore(battle.dump_state(), catalog)
+
+    actions: List[str] = [HIT, HIT, PASS, HIT, SKILL, HIT, PASS, HIT] * 3
+    assert play(restored, actions) == play(battle, actions)
+    assert restored.dump_state() == battle.dump_state()
+
+
+def test_restore_rejects_invalid_state(battle: Arena, catalog: EquipmentCatalog):
+    state: dict = battle.dump_state()
+    del state["units"]
+
+    with pytest.raises(ValueError):
+        Arena.restore(state, catalog)
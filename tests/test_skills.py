@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from application.models.classes import unit_classes
+from application.models.skills import EffectData, Skill, SkillData, SkillRegistry, SkillState, compile_skill, \
+    load_skills
+
+SKILL: dict = {"id": 1, "name": "Проба", "stamina": 5.0,
+               "effects": [{"type": "damage", "amount": 4.0}, {"type": "stamina_damage", "amount": 3.0},
+                           {"type": "heal", "amount": 2.0}, {"type": "restore_stamina", "amount": 1.0}]}
+
+
+def write_skills(path: Path, data) -> Path:
+    skills_path: Path = path / "skills.json"
+    skills_path.write_text(data if isinstance(data, str) else json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return skills_path
+
+
+def test_shipped_skills_are_loaded():
+    skills: SkillRegistry = load_skills()
+
+    assert set(skills.get_names()) == {unit_class.skill.name for unit_class in unit_classes.values()}
+    for name in skills.get_names():
+        skill: Skill = skills.get(name)
+        assert skills.get_by_id(skill.id).name == name
+        assert skill.stamina > 0 and skill.damage > 0
+
+
+def test_skill_effects_are_applied_in_order(tmp_path: Path):
+    skill: Skill = load_skills(write_skills(tmp_path, {"skills": [SKILL]})).get("Проба")
+    state: SkillState = SkillState(user_hp=20.0, user_stamina=10.0, user_max_health=21.0, user_max_stamina=30.0,
+                                   target_hp=15.0, target_stamina=2.0)
+
+    assert skill.apply(state) == SkillState(user_hp=21.0, user_stamina=6.0, user_max_health=21.0,
+                                            user_max_stamina=30.0, target_hp=11.0, target_stamina=0)
+
+
+def test_compiled_skill_is_a_pure_function():
+    skill: Skill = compile_skill(SkillData(id=1, name="Проба", stamina=5.0,
+                                           effects=[EffectData(**effect) for effect in SKILL["effects"]]))
+    state: SkillState = SkillState(user_hp=np.array([20.0, 5.0]), user_stamina=np.array([10.0, 6.0]),
+                                   user_max_health=np.array([21.0, 30.0]), user_max_stamina=np.array([30.0, 30.0]),
+                                   target_hp=np.array([15.0, 3.0]), target_stamina=np.array([2.0, 8.0]))
+    copies: list = [field.copy() for field in state]
+
+    first: SkillState = skill.apply(state)
+    second: SkillState = skill.apply(state)
+
+    for before, after in zip(copies, state):
+        assert np.array_equal(before, after)
+    for first_field, second_field in zip(first, second):
+        assert np.array_equal(first_field, second_field)
+    assert first.user_max_health is state.user_max_health
+
+
+def test_unknown_effect_type_is_rejected(tmp_path: Path):
+    skill: dict = dict(SKILL, effects=[{"type": "fireball", "amount": 1.0}])
+
+    with pytest.raises(ValueError, match="Unknown skill effect: fireball"):
+        load_skills(write_skills(tmp_path, {"skills": [skill]}))
+
+
+@pytest.mark.parametrize("data", [
+    "{\"skills\": [",
+    {"skills": [{key: value for key, value in SKILL.items() if key != "stamina"}]},
+    {"skills": [dict(SKILL, effects=[{"type": "damage"}])]},
+    {"skills": [dict(SKILL, stamina="много")]},
+    {"skills": [SKILL, dict(SKILL, name="Копия")]},
+    {"skills": [dict(SKILL, effects=[{"type": "dot", "amount": 1.0}])]},
+])
+def test_malformed_skill_data_is_rejected(tmp_path: Path, data):
+    with pytest.raises(ValueError):
+        load_skills(write_skills(tmp_path, data))
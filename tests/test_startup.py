@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from benchmarks.importtime import get_total, measure
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+
+# Import time budgets, about three times the local import time, so CI runners have headroom
+BUDGETS_MS: Dict[str, float] = {"import app": 1500, "import asgi": 2000}
+
+# Reports what an import of the application loaded and started
+LOADED_STATE: str = """
+import json
+import threading
+
+import {module}
+from application import game
+from application.models import matchups
+
+print(json.dumps({{"catalog": game.equipment.is_loaded,
+                  "matchups": matchups._latest_table is not None,
+                  "threads": threading.active_count()}}))
+"""
+
+
+@pytest.mark.parametrize("module", ["app", "asgi"])
+def test_import_loads_nothing_and_starts_no_threads(module: str):
+    process = subprocess.run([sys.executable, "-c", LOADED_STATE.format(module=module)], cwd=ROOT,
+                             capture_output=True, text=True, check=True,
+                             env=dict(os.environ, START_BACKGROUND_TASKS="0"))
+
+    assert json.loads(process.stdout) == {"catalog": False, "matchups": False, "threads": 1}
+
+
+@pytest.mark.parametrize("statement,budget_ms", BUDGETS_MS.items())
+def test_import_time_is_within_budget(monkeypatch, statement: str, budget_ms: float):
+    monkeypatch.chdir(ROOT)
+    # The fastest of three runs, the first one also fills the bytecode caches
+    total_ms: float = min(get_total(measure(statement)) for _ in range(3)) / 1000
+
+    assert total_ms <= budget_ms
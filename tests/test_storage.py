@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from application.models.battle import Battle, BattleRegistry
+from application.models.equipment import Equipment, EquipmentCatalog
+from application.models.unit import BaseUnit, EnemyUnit, PlayerUnit
+from application.storage import SQLiteBattleStore
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> str:
+    return str(tmp_path / "battles.db")
+
+
+def create_registry(path: str, equipment: Equipment) -> BattleRegistry:
+    """
+    Registry of one worker process, every worker has its own store connection
+    """
+    return BattleRegistry(store=SQLiteBattleStore(path), equipment=equipment)
+
+
+def get_state(battle: Battle) -> dict:
+    """
+    Serialized battle, whole numbers may be stored as int or float
+    """
+    return json.loads(battle.dumps())
+
+
+def start_battle(registry: BattleRegistry, create_unit: Callable[..., BaseUnit]) -> Battle:
+    battle: Battle = registry.get("battle")
+    battle.heroes["player"] = create_unit(PlayerUnit, "Воин")
+    battle.heroes["enemy"] = create_unit(EnemyUnit, "Маг")
+    battle.arena.start_game(battle.heroes["player"], battle.heroes["enemy"], seed=7)
+    battle.play_turn("hit")
+    registry.save(battle)
+    return battle
+
+
+def test_battle_round_trip(create_unit: Callable[..., BaseUnit], catalog: EquipmentCatalog):
+    battle: Battle = start_battle(BattleRegistry(), create_unit)
+    restored: Battle = Battle.loads(battle.dumps(), catalog)
+
+    assert get_state(restored) == get_state(battle)
+    assert restored.heroes["player"] is restored.arena.player
+
+
+def test_saved_battle_is_restored_by_another_worker(path: str, equipment: Equipment,
+                                                    create_unit: Callable[..., BaseUnit]):
+    first: BattleRegistry = create_registry(path, equipment)
+    battle: Battle = start_battle(first, create_unit)
+    first.store.flush()
+
+    restored: Battle = create_registry(path, equipment).get("battle")
+
+    assert restored is not battle
+    assert restored.revision == battle.revision
+    assert get_state(restored) == get_state(battle)
+
+
+def test_battle_changed_by_another_worker_is_reloaded(path: str, equipment: Equipment,
+                                                      create_unit: Callable[..., BaseUnit]):
+    first: BattleRegistry = create_registry(path, equipment)
+    second: BattleRegistry = create_registry(path, equipment)
+    battle: Battle = start_battle(first, create_unit)
+    first.store.flush()
+
+    changed: Battle = second.get("battle")
+    changed.play_turn("pass-turn")
+    second.save(changed)
+    second.store.flush()
+
+    assert first.find("battle") is battle
+    first.store.poll()
+    assert first.find("battle") is None
+    assert get_state(first.get("battle")) == get_state(changed)
+
+
+def test_concurrent_change_does_not_overwrite_the_stored_one(path: str, equipment: Equipment,
+                                                             create_unit: Callable[..., BaseUnit]):
+    first: BattleRegistry = create_registry(path, equipment)
+    second: BattleRegistry = create_registry(path, equipment)
+    start_battle(first, create_unit)
+    first.store.flush()
+
+    winner: Battle = first.get("battle")
+    loser: Battle = second.get("battle")
+    winner.play_turn("hit")
+    first.save(winner)
+    loser.play_turn("pass-turn")
+    second.save(loser)
+    first.store.flush()
+    second.store.flush()
+
+    assert second.find("battle") is None
+    assert get_state(second.get("battle")) == get_state(winner)
+    assert first.find("battle") is winner
+
+
+def test_discarded_battle_is_deleted(path: str, equipment: Equipment, create_unit: Callable[..., BaseUnit]):
+    registry: BattleRegistry = create_registry(path, equipment)
+    start_battle(registry, create_unit)
+    registry.store.flush()
+
+    registry.discard("battle")
+    registry.store.flush()
+
+    assert create_registry(path, equipment).get("battle").arena.log is None
@@ -0,0 +1,108 @@
+import math
+from typing import Callable, List, Tuple
+
+import pytest
+
+from application.models.base import Arena
+from application.models.policies import get_player_policy
+from application.models.team import HIGHEST_THREAT, SIDES, STALE_ENTRIES_FACTOR, Squad, TeamArena
+from application.models.unit import BaseUnit, EnemyUnit, PlayerUnit
+
+# Evenly matched classes with the same weapon and armor
+MATCHUPS: List[Tuple[str, str, str, str]] = [("Вор", "Маг", "топорик", "кожаная броня"),
+                                             ("Маг", "Воин", "топорик", "футболка"),
+                                             ("Маг", "Вор", "ножик", "панцирь")]
+
+
+@pytest.fixture
+def squad(create_unit: Callable[..., BaseUnit]) -> Squad:
+    units: List[BaseUnit] = [create_unit(PlayerUnit, "Воин", weapon, "футболка")
+                             for weapon in ("ножик", "магический посох", "топорик")]
+    for unit, hp in zip(units, (10.0, 20.0, 30.0)):
+        unit.hp = hp
+    return Squad(units)
+
+
+def test_lowest_hp_target_skips_dead_and_changed_units(squad: Squad):
+    assert squad.get_lowest_hp() == 0
+
+    squad.units[0].hp = 0
+    squad.update(0)
+    assert squad.get_lowest_hp() == 1 and len(squad) == 2
+
+    squad.units[2].hp = 5.0
+    squad.update(2)
+    assert squad.get_lowest_hp() == 2
+
+    squad.units[2].hp = 25.0
+    squad.update(2)
+    assert squad.get_lowest_hp() == 1
+
+
+def test_highest_threat_target_skips_dead_units(squad: Squad):
+    assert squad.get_highest_threat() == 1
+
+    squad.units[1].hp = 0
+    squad.update(1)
+    assert squad.get_highest_threat() == 2
+
+    squad.units[2].hp = 0
+    squad.update(2)
+    assert squad.get_highest_threat() == 0
+
+
+def test_stale_hp_entries_are_dropped(squad: Squad):
+    for hp in range(1, 100):
+        squad.units[1].hp = float(hp)
+        squad.update(1)
+        squad.get_lowest_hp()
+
+    assert len(squad._by_hp) <= STALE_ENTRIES_FACTOR * (len(squad) + 1)
+    assert squad.get_lowest_hp() == 0
+
+
+def test_defeated_squad_has_no_target(squad: Squad):
+    for index, unit in enumerate(squad.units):
+        unit.hp = 0
+        squad.update(index)
+
+    assert squad.is_defeated
+    assert squad.get_lowest_hp() is None and squad.get_highest_threat() is None
+
+
+@pytest.mark.parametrize("weak_side,result", [("enemy", "Игрок выиграл битву."), ("player", "Игрок проиграл битву.")])
+def test_battle_ends_when_a_squad_is_defeated(create_unit: Callable[..., BaseUnit], weak_side: str, result: str):
+    players: List[BaseUnit] = [create_unit(PlayerUnit, "Воин", "топорик", "панцирь") for _ in range(3)]
+    enemies: List[BaseUnit] = [create_unit(EnemyUnit, "Воин", "топорик", "панцирь") for _ in range(3)]
+    for unit in players[1:] if weak_side == "player" else enemies[1:]:
+        unit.hp = 0.5
+
+    arena: TeamArena = TeamArena(targeting=HIGHEST_THREAT)
+    arena.start_game(players, enemies, seed=7)
+
+    assert arena.play() == result
+    assert not arena.game_is_running
+    assert arena.squads[weak_side].is_defeated
+    assert not arena.squads[SIDES[1] if weak_side == SIDES[0] else SIDES[0]].is_defeated
+    assert arena.play_turn() == result
+
+
+@pytest.mark.parametrize("player_class,enemy_class,weapon,armor", MATCHUPS)
+def test_one_on_one_team_battle_plays_like_the_arena(create_unit: Callable[..., BaseUnit], player_class: str,
+                                                     enemy_class: str, weapon: str, armor: str):
+    battles: int = 300
+    wins: List[int] = [0, 0]
+    for seed in range(battles):
+        arena: Arena = Arena()
+        arena.start_game(create_unit(PlayerUnit, player_class, weapon, armor),
+                         create_unit(EnemyUnit, enemy_class, weapon, armor), seed=seed)
+        team_arena: TeamArena = TeamArena()
+        team_arena.start_game([create_unit(PlayerUnit, player_class, weapon, armor)],
+                              [create_unit(EnemyUnit, enemy_class, weapon, armor)], seed=seed)
+
+        wins[0] += arena.auto_battle(get_player_policy("hit")) == "Игрок выиграл битву."
+        wins[1] += team_arena.play() == "Игрок выиграл битву."
+
+    # The team arena regenerates the stamina of a unit at the start of its own turn, the same battles
+    # may end differently, so the win rates are compared within 4 standard errors like check_parity does
+    assert abs(wins[0] - wins[1]) / battles <= 4 * math.sqrt(0.25 / battles) * math.sqrt(2)